@@ -0,0 +1,577 @@
+"""
+Application factory shared by the development server (main.py) and the
+serverless entry point (api/index.py).
+
+The YouTube, LLM and batch services pull in youtube-transcript-api and httpx,
+so they are imported and created on first use instead of at import time. A
+serverless cold start then only pays for what its first request needs;
+scripts/measure_import_time.py keeps track of that.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional
+
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from pydantic import BaseModel
+
+from config import Config
+from utils.admission import Overloaded, client_key, format_admission
+from utils.compression import CompressionMiddleware
+from utils.fastjson import FastJSONResponse
+from utils.jobstore import get_job_store
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, InFlightMiddleware, render_metrics
+from utils.preformat import fast_format, fast_format_events, preformat_transcript
+from utils.progress import format_progress
+from utils.segments import SegmentStore
+from utils.sse import sse_response, sse_error
+from utils.static_assets import StaticAssetStore
+from utils.transcript import parse_segment_store, serialize_segments
+
+if TYPE_CHECKING:
+    from utils.batch import BatchJobManager
+    from utils.llm import LLMFormatter
+    from utils.youtube import YouTubeTranscriptFetcher
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+
+# Endpoints whose (possibly large) JSON responses are compressed for clients that accept it
+COMPRESSED_PATHS = ("/api/transcript", "/api/format")
+
+NO_API_KEY_ERROR = "No API key available. Please configure OPENROUTER_API_KEY or provide API key in settings."
+
+
+# Pydantic models for request/response
+class SegmentRange(BaseModel):
+    # Part of the transcript to use, all optional: the segments on screen between
+    # start_time and end_time (seconds) and/or segments start_segment..end_segment-1
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+    start_segment: Optional[int] = None
+    end_segment: Optional[int] = None
+
+    def has_range(self) -> bool:
+        return any(value is not None for value in (self.start_time, self.end_time, self.start_segment, self.end_segment))
+
+    def select(self, segments: SegmentStore) -> SegmentStore:
+        """The segments in the requested range (ValueError if it is empty or invalid)"""
+        return segments.select(self.start_time, self.end_time, self.start_segment, self.end_segment)
+
+class TranscriptRequest(SegmentRange):
+    youtube_url: str
+    # "json" (pretty-printed segment list) or "text" (one segment per line, far fewer bytes and tokens)
+    transcript_format: Literal["json", "text"] = "json"
+    include_timestamps: bool = False  # json: "start"/"duration" per segment; text: "[mm:ss] " line prefixes
+    # Caption languages, most preferred first (default en, en-US); manual captions beat auto-generated ones
+    languages: Optional[List[str]] = None
+
+class TranscriptResponse(BaseModel):
+    success: bool
+    transcript: Optional[str] = None
+    error: Optional[str] = None
+    total_segments: Optional[int] = None  # segments in the whole transcript, to pick ranges from
+    duration: Optional[float] = None  # seconds until the last caption ends, when timings are known
+    language: Optional[str] = None  # language code of the caption track served
+    generated: Optional[bool] = None  # whether that track is auto-generated
+    available_languages: Optional[List[str]] = None  # language codes of all the video's tracks
+
+class FormatRequest(SegmentRange):
+    raw_transcript: str
+    model: Optional[str] = None  # OpenRouter model ID, or "auto" to route to the fastest healthy model
+    api_key: Optional[str] = None
+    bypass_cache: bool = False  # skip the formatted-chunk cache and re-run the LLM
+    job_id: Optional[str] = None  # resume a failed or interrupted job (raw_transcript is then ignored)
+    previous_job_id: Optional[str] = None  # job of an earlier version of this transcript: re-format only edited chunks
+    mode: Literal["llm", "fast"] = "llm"  # "fast": clean up and paragraph locally, with no LLM call
+    preformat: Optional[bool] = None  # clean up captions before the LLM (defaults to PREFORMAT_ENABLED)
+
+class FormatResponse(BaseModel):
+    success: bool
+    formatted_transcript: Optional[str] = None
+    error: Optional[str] = None
+    job_id: Optional[str] = None  # set for multi-chunk jobs; pass it back to resume after a failure
+    routing: Optional[List[Dict[str, Any]]] = None  # model "auto": the model that served each chunk
+    continuations: Optional[int] = None  # follow-up requests for output cut off at max_tokens
+    reused_chunks: Optional[int] = None  # with previous_job_id: chunks whose output was carried over
+
+class FormatJobResponse(BaseModel):
+    success: bool
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+    model: Optional[str] = None
+    total_chunks: Optional[int] = None
+    completed_chunks: Optional[int] = None
+    error: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    youtube_urls: List[str]
+    model: Optional[str] = None
+    api_key: Optional[str] = None
+    transcript_format: Literal["json", "text"] = "json"
+    format: bool = True  # also format each transcript with the LLM
+
+class BatchResponse(BaseModel):
+    success: bool
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+    total: Optional[int] = None
+    counts: Optional[Dict[str, int]] = None
+    items: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
+
+
+class Services:
+    """The app's service objects, each imported and created when first used"""
+
+    def __init__(self):
+        self.static_assets = StaticAssetStore(STATIC_DIR)
+        self._youtube_fetcher: Optional["YouTubeTranscriptFetcher"] = None
+        self._llm_formatter: Optional["LLMFormatter"] = None
+        self._batch_jobs: Optional["BatchJobManager"] = None
+
+    @property
+    def youtube_fetcher(self) -> "YouTubeTranscriptFetcher":
+        if self._youtube_fetcher is None:
+            from utils.youtube import YouTubeTranscriptFetcher
+            self._youtube_fetcher = YouTubeTranscriptFetcher()
+        return self._youtube_fetcher
+
+    @property
+    def llm_formatter(self) -> "LLMFormatter":
+        if self._llm_formatter is None:
+            from utils.llm import LLMFormatter
+            self._llm_formatter = LLMFormatter()
+        return self._llm_formatter
+
+    def request_formatter(self, api_key: Optional[str], model: Optional[str]) -> "LLMFormatter":
+        """
+        Return the formatter for a request. A per-request formatter is used when the
+        request overrides the key or model, so concurrent requests never change the
+        shared formatter mid-job.
+        """
+        if not api_key and not model:
+            return self.llm_formatter
+
+        from utils.llm import LLMFormatter
+        formatter = LLMFormatter()
+        if api_key:
+            formatter.api_key = api_key
+        if model:
+            formatter.model = model
+            logger.info(f"Using custom model: {model}")
+        return formatter
+
+    async def batch_jobs(self) -> "BatchJobManager":
+        """The batch job manager, with its workers started on first use"""
+        if self._batch_jobs is None:
+            from utils.batch import BatchJobManager
+            # start() does not yield, so concurrent first calls cannot start two managers
+            batch_jobs = BatchJobManager(self.youtube_fetcher)
+            await batch_jobs.start()
+            self._batch_jobs = batch_jobs
+        return self._batch_jobs
+
+    async def start(self) -> None:
+        """
+        Load the static assets, open the connection pool and start the batch
+        workers ahead of the first request
+        """
+        self.static_assets.load()
+        from utils.http import open_http_client
+        await open_http_client()
+        await self.batch_jobs()
+
+    async def stop(self) -> None:
+        """Stop the batch workers and release the connection pool and fetch threads"""
+        if self._batch_jobs is not None:
+            await self._batch_jobs.stop()
+            self._batch_jobs = None
+        from utils.http import close_http_client
+        await close_http_client()
+        if self._youtube_fetcher is not None:
+            from utils.youtube import shutdown_fetch_executor
+            shutdown_fetch_executor()
+
+
+def build_router(services: Services, max_transcript_length: Optional[int] = None) -> APIRouter:
+    """
+    The application's routes. Transcripts longer than max_transcript_length
+    characters are refused by /api/format and /api/format/stream when it is set.
+    """
+    router = APIRouter()
+
+    def requested_transcript(request: FormatRequest) -> str:
+        """
+        The raw transcript of a format request, cut to its range and cleaned up
+        for the LLM when preformatting is on (ValueError if the range is invalid)
+        """
+        if request.job_id:
+            return request.raw_transcript
+        raw_transcript = request.raw_transcript
+        if request.has_range():
+            raw_transcript = serialize_segments(request.select(parse_segment_store(raw_transcript)), "text")
+        preformat = Config.PREFORMAT_ENABLED if request.preformat is None else request.preformat
+        if preformat and request.mode == "llm":
+            raw_transcript = preformat_transcript(raw_transcript)
+        return raw_transcript
+
+    def length_error(raw_transcript: str) -> Optional[str]:
+        """The error for a transcript over max_transcript_length, if it is set"""
+        if max_transcript_length is not None and len(raw_transcript) > max_transcript_length:
+            return f"Transcript too long. Maximum length is {max_transcript_length} characters."
+        return None
+
+    def overloaded_response(error: Overloaded) -> FastJSONResponse:
+        """A 429 or 503 for a request turned away by admission control"""
+        return FastJSONResponse(
+            FormatResponse(success=False, error=str(error)).model_dump(),
+            status_code=error.status_code,
+            headers={"Retry-After": str(error.retry_after)}
+        )
+
+    @router.get("/", response_class=HTMLResponse)
+    async def read_root(request: Request):
+        """Serve the main HTML page from memory"""
+        response = services.static_assets.response(request, "index.html")
+        if response is None:
+            return HTMLResponse(content="<h1>Static files not found</h1>", status_code=404)
+        return response
+
+    @router.post("/api/transcript", response_model=TranscriptResponse)
+    async def get_transcript(request: TranscriptRequest):
+        """Fetch transcript from YouTube video"""
+        logger.info(f"Received transcript request for URL: {request.youtube_url}")
+
+        try:
+            youtube_fetcher = services.youtube_fetcher
+            # Extract video ID
+            video_id = youtube_fetcher.extract_video_id(request.youtube_url)
+            logger.info(f"Extracted video ID: {video_id}")
+
+            if not video_id:
+                logger.warning(f"Could not extract video ID from URL: {request.youtube_url}")
+                return TranscriptResponse(
+                    success=False,
+                    error="Invalid YouTube URL. Please provide a valid YouTube video URL."
+                )
+
+            # Fetch transcript
+            captions, error = await youtube_fetcher.get_captions_async(video_id, request.languages)
+
+            if error:
+                logger.error(f"Transcript fetch failed: {error}")
+                return TranscriptResponse(success=False, error=error)
+
+            segments = captions.segments
+            info = {
+                "total_segments": len(segments),
+                "duration": segments.starts[-1] + segments.durations[-1] if segments.has_timings and len(segments) else None,
+                "language": captions.track.language_code,
+                "generated": captions.track.is_generated,
+                "available_languages": list(dict.fromkeys(track.language_code for track in captions.tracks)),
+            }
+            try:
+                segments = request.select(segments)
+            except ValueError as e:
+                return TranscriptResponse(success=False, error=str(e), **info)
+
+            logger.info("Transcript fetched successfully")
+            transcript = serialize_segments(segments, request.transcript_format, request.include_timestamps)
+            return TranscriptResponse(success=True, transcript=transcript, **info)
+
+        except Exception as e:
+            error_msg = f"Unexpected error in get_transcript: {type(e).__name__}: {str(e)}"
+            logger.error(error_msg)
+            return TranscriptResponse(
+                success=False,
+                error=f"Unexpected error: {str(e)}"
+            )
+
+    @router.post("/api/format", response_model=FormatResponse)
+    async def format_transcript(request: FormatRequest, http_request: Request):
+        """Format transcript using LLM"""
+        try:
+            try:
+                raw_transcript = requested_transcript(request)
+            except ValueError as e:
+                return FormatResponse(success=False, error=str(e))
+
+            if request.mode == "fast":
+                return FormatResponse(success=True, formatted_transcript=fast_format(raw_transcript))
+
+            # Check if API key is configured (either in env or provided in request)
+            if not Config.validate_config() and not request.api_key:
+                return FormatResponse(success=False, error=NO_API_KEY_ERROR)
+
+            too_long = length_error(raw_transcript)
+            if too_long:
+                return FormatResponse(success=False, error=too_long)
+
+            client = client_key(request.api_key, http_request.client.host if http_request.client else None)
+            try:
+                admitted_at = await format_admission.acquire(client)
+            except Overloaded as e:
+                return overloaded_response(e)
+            try:
+                formatter = services.request_formatter(request.api_key, request.model)
+                details = {}
+                formatted_text, error = await formatter.format_transcript(
+                    raw_transcript,
+                    use_cache=not request.bypass_cache,
+                    job_id=request.job_id,
+                    details=details,
+                    previous_job_id=request.previous_job_id
+                )
+            finally:
+                format_admission.release(client, admitted_at)
+
+            if error:
+                logger.error(f"Formatting failed: {error}")
+                return FormatResponse(success=False, error=error, job_id=details.get("job_id"),
+                                      routing=details.get("routing"), continuations=details.get("continuations"),
+                                      reused_chunks=details.get("reused_chunks"))
+
+            return FormatResponse(success=True, formatted_transcript=formatted_text, job_id=details.get("job_id"),
+                                  routing=details.get("routing"), continuations=details.get("continuations"),
+                                  reused_chunks=details.get("reused_chunks"))
+
+        except Exception as e:
+            return FormatResponse(
+                success=False,
+                error=f"Unexpected error: {str(e)}"
+            )
+
+    @router.post("/api/format/stream")
+    async def format_transcript_stream(request: FormatRequest, http_request: Request):
+        """Format transcript using LLM, streaming the output as server-sent events"""
+        try:
+            raw_transcript = requested_transcript(request)
+        except ValueError as e:
+            return sse_response(sse_error(str(e)))
+
+        if request.mode == "fast":
+            return sse_response(fast_format_events(raw_transcript))
+        if not Config.validate_config() and not request.api_key:
+            return sse_response(sse_error(NO_API_KEY_ERROR))
+        too_long = length_error(raw_transcript)
+        if too_long:
+            return sse_response(sse_error(too_long))
+
+        client = client_key(request.api_key, http_request.client.host if http_request.client else None)
+        try:
+            admitted_at = await format_admission.acquire(client)
+        except Overloaded as e:
+            return overloaded_response(e)
+
+        formatter = services.request_formatter(request.api_key, request.model)
+        # The slot is held until the response is over, including a client that leaves before it starts
+        return sse_response(
+            formatter.stream_format_transcript(
+                raw_transcript,
+                use_cache=not request.bypass_cache,
+                job_id=request.job_id,
+                previous_job_id=request.previous_job_id
+            ),
+            on_close=lambda: format_admission.release(client, admitted_at)
+        )
+
+    @router.get("/api/format/jobs/{job_id}", response_model=FormatJobResponse)
+    async def get_format_job(job_id: str):
+        """Report the progress of a checkpointed formatting job"""
+        job_store = get_job_store()
+        job = await job_store.aget_job(job_id) if job_store is not None else None
+        if job is None:
+            return FormatJobResponse(success=False, job_id=job_id, error="Formatting job not found or expired.")
+
+        return FormatJobResponse(
+            success=True,
+            job_id=job_id,
+            status=job["status"],
+            model=job["model"],
+            total_chunks=job["total_chunks"],
+            completed_chunks=len(job["outputs"]),
+            error=job["error"]
+        )
+
+    @router.get("/api/format/jobs/{job_id}/events")
+    async def format_job_events(job_id: str):
+        """
+        Follow a formatting job as server-sent events: a snapshot, then
+        chunk_started, chunk_completed and chunk_retried with the elapsed
+        time and ETA, and finally finished
+        """
+        progress = format_progress.get(job_id)
+        if progress is not None:
+            return sse_response(progress.events())
+
+        # Not running in this worker: report what the job store knows
+        job_store = get_job_store()
+        job = await job_store.aget_job(job_id) if job_store is not None else None
+        if job is None:
+            return sse_response(sse_error("Formatting job not found or expired."))
+
+        async def stored_status():
+            yield {
+                "event": "finished" if job["status"] != "running" else "snapshot",
+                "job_id": job_id,
+                "status": job["status"],
+                "total_chunks": job["total_chunks"],
+                "completed_chunks": len(job["outputs"]),
+                "error": job["error"]
+            }
+
+        return sse_response(stored_status())
+
+    @router.post("/api/format/jobs/{job_id}/cancel", response_model=FormatJobResponse)
+    async def cancel_format_job(job_id: str):
+        """Stop a running formatting job; its completed chunks stay checkpointed for resuming"""
+        progress = format_progress.get(job_id)
+        if progress is None or not progress.cancel():
+            return FormatJobResponse(success=False, job_id=job_id, error="Formatting job is not running.")
+        snapshot = progress.snapshot()
+        return FormatJobResponse(
+            success=True,
+            job_id=job_id,
+            status="cancelling",
+            total_chunks=snapshot["total_chunks"],
+            completed_chunks=snapshot["completed_chunks"]
+        )
+
+    @router.post("/api/batch", response_model=BatchResponse)
+    async def submit_batch(request: BatchRequest):
+        """Queue a batch of videos to fetch (and format) in the background"""
+        if request.format and not Config.validate_config() and not request.api_key:
+            return BatchResponse(success=False, error=NO_API_KEY_ERROR)
+
+        batch_jobs = await services.batch_jobs()
+        try:
+            job = batch_jobs.submit(
+                request.youtube_urls,
+                model=request.model,
+                api_key=request.api_key,
+                transcript_format=request.transcript_format,
+                format_transcripts=request.format
+            )
+        except ValueError as e:
+            return BatchResponse(success=False, error=str(e))
+
+        return BatchResponse(success=True, **job.to_dict(include_results=False))
+
+    @router.get("/api/batch/{job_id}", response_model=BatchResponse)
+    async def get_batch(job_id: str, include_results: bool = True):
+        """Poll the status and per-video results of a batch job"""
+        job = (await services.batch_jobs()).get(job_id)
+        if job is None:
+            return BatchResponse(success=False, job_id=job_id, error="Batch job not found or expired.")
+        return BatchResponse(success=True, **job.to_dict(include_results=include_results))
+
+    @router.get("/health")
+    async def health_check():
+        """Health check endpoint"""
+        from utils.llm import get_format_cache
+        from utils.routing import model_router
+        from utils.youtube import get_transcript_cache
+
+        transcript_cache = get_transcript_cache()
+        format_cache = get_format_cache()
+        configured = Config.validate_config()
+        return {
+            "status": "healthy",
+            "service": "verbatim-ai",
+            "openrouter_configured": configured,
+            "config_valid": configured,  # same as openrouter_configured, kept for existing monitors
+            "transcript_cache": transcript_cache.stats() if transcript_cache else None,
+            "format_cache": format_cache.stats() if format_cache else None,
+            "model_routing": model_router.snapshot(),
+            "format_admission": format_admission.snapshot()
+        }
+
+    @router.get("/metrics")
+    async def metrics():
+        """Prometheus metrics for this worker process"""
+        return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+    @router.get("/api/test")
+    async def test_endpoint():
+        """Simple test endpoint"""
+        return {
+            "message": "API is working!"
+        }
+
+    return router
+
+
+def create_app(root_path: str = "", mount_path: str = "", warm_up: bool = True,
+               max_transcript_length: Optional[int] = None) -> FastAPI:
+    """
+    Build the application.
+    root_path: path prefix added by a reverse proxy (see BASE_PATH)
+    mount_path: serve the routes under this prefix, redirecting "/" to it
+    warm_up: open the connection pool and start the batch workers on startup;
+             otherwise every service starts when a request first needs it
+    max_transcript_length: refuse longer transcripts in /api/format and /api/format/stream
+    """
+    services = Services()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        """Open shared resources on startup and release them on shutdown"""
+        job_store = get_job_store()
+        # Keeps this worker's jobs alive and marks the jobs of crashed or restarted workers as
+        # interrupted, so they can be resumed by job_id
+        heartbeat = asyncio.create_task(job_store.keep_alive()) if job_store is not None else None
+        if warm_up:
+            await services.start()
+        yield
+        if heartbeat is not None:
+            heartbeat.cancel()
+        await services.stop()
+
+    # Lifespan events only run for the top-level app, not for mounted sub-applications
+    app = FastAPI(
+        title="Verbatim AI",
+        description="YouTube Transcription and AI Formatting Tool",
+        root_path=root_path,
+        lifespan=lifespan,
+        default_response_class=FastJSONResponse
+    )
+    app.state.services = services
+    if Config.RESPONSE_COMPRESSION_ENABLED:
+        app.add_middleware(
+            CompressionMiddleware,
+            paths=[mount_path + path for path in COMPRESSED_PATHS],
+            minimum_size=Config.RESPONSE_COMPRESSION_MIN_BYTES
+        )
+    app.add_middleware(InFlightMiddleware)
+
+    # Static files, served from memory; index.html refers to them at /static whatever the mount path
+    @app.api_route("/static/{name:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    async def static_asset(name: str, request: Request):
+        response = services.static_assets.response(request, name)
+        if response is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return response
+
+    router = build_router(services, max_transcript_length)
+    if not mount_path:
+        app.include_router(router)
+        return app
+
+    sub_app = FastAPI(
+        title="Verbatim AI",
+        description="YouTube Transcription and AI Formatting Tool",
+        default_response_class=FastJSONResponse
+    )
+    sub_app.include_router(router)
+    app.mount(mount_path, sub_app)
+
+    @app.get("/")
+    async def redirect_to_mount_path():
+        """Redirect root to the mounted application"""
+        return RedirectResponse(url=f"{mount_path}/", status_code=301)
+
+    return app
@@ -15,6 +15,76 @@ class Settings(BaseSettings):
     REQUEST_TIMEOUT: int = 240
     MAX_TRANSCRIPT_LENGTH: int = 50000  # characters
 
+    # YouTube transcript fetching
+    TRANSCRIPT_FETCH_WORKERS: int = 8  # threads dedicated to blocking YouTube fetches
+    TRANSCRIPT_FETCH_TIMEOUT: float = 30.0  # seconds, including time queued for a worker
+
+    # Caching
+    CACHE_DB_PATH: str = ".cache/verbatim.sqlite3"  # shared on-disk tier; empty disables it
+    TRANSCRIPT_CACHE_ENABLED: bool = True
+    TRANSCRIPT_CACHE_TTL: int = 86400  # seconds
+    TRANSCRIPT_CACHE_MAX_ENTRIES: int = 256  # in-process LRU tier
+    TRANSCRIPT_CACHE_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024  # in-process LRU tier; 0 = entry count only
+    TRANSCRIPT_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # on-disk tier
+    FORMAT_CACHE_ENABLED: bool = True  # formatted chunks, keyed by content + model + prompt version
+    FORMAT_CACHE_TTL: int = 7 * 86400  # seconds
+    FORMAT_CACHE_MAX_ENTRIES: int = 512
+    FORMAT_CACHE_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024
+    FORMAT_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Shared HTTP connection pool for OpenRouter
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # seconds an idle connection is kept open
+    HTTP2_ENABLED: bool = False  # requires the 'h2' package (httpx[http2])
+
+    # Chunked formatting
+    CHUNK_CONCURRENCY: int = 4  # chunks sent to the LLM in parallel (1 = sequential)
+    CHUNK_MAX_RETRIES: int = 1  # extra attempts for a failed chunk before giving up
+    LLM_MAX_CONTINUATIONS: int = 3  # follow-up requests for output cut off at max_tokens (0 = none)
+    PREFORMAT_ENABLED: bool = False  # token-saving pre-pass: drop caption noise and overlaps, re-split into sentences
+
+    # Admission control for /api/format and /api/format/stream (LLM mode), per worker process
+    FORMAT_MAX_CONCURRENT: int = 8  # requests formatted at once; 0 = no limit
+    FORMAT_MAX_PER_CLIENT: int = 2  # running or queued per API key (or IP without one); 0 = no limit
+    FORMAT_MAX_QUEUE: int = 16  # requests waiting for a slot; more are refused with 503
+    FORMAT_QUEUE_TIMEOUT: float = 30.0  # seconds a request waits for a slot before a 503
+
+    # LLM call resilience
+    LLM_MAX_RETRIES: int = 3  # retries of a 408/429/5xx or connection failure
+    LLM_RETRY_BASE_DELAY: float = 1.0  # seconds; doubled per retry, with full jitter
+    LLM_RETRY_MAX_DELAY: float = 30.0  # longest backoff, and longest Retry-After honoured
+    LLM_REQUESTS_PER_MINUTE: int = 0  # per model and API key; 0 = no client-side limit
+    LLM_FREE_REQUESTS_PER_MINUTE: int = 20  # OpenRouter's limit for ":free" models
+    LLM_RATE_LIMIT_MAX_WAIT: float = 60.0  # longest wait for a request slot before failing
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failures that open a model's circuit
+    LLM_BREAKER_RESET_TIMEOUT: float = 30.0  # seconds before an open circuit allows a trial call
+
+    # Automatic model routing (model "auto")
+    AUTO_MODEL_CANDIDATES: str = ""  # comma-separated; empty = the models in static/models.md
+    AUTO_MODEL_MAX_ATTEMPTS: int = 3  # candidates tried per chunk before giving up
+    AUTO_MODEL_EWMA_ALPHA: float = 0.3  # weight of the newest call in the latency/error averages
+    AUTO_MODEL_MAX_ERROR_RATE: float = 0.5  # average error rate above which a model is avoided
+
+    # Compression of /api/transcript and /api/format responses (gzip, or brotli when installed)
+    RESPONSE_COMPRESSION_ENABLED: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024  # smaller responses are sent as they are
+
+    # Static files are served from memory; reload them when changed on disk (for development)
+    STATIC_ASSETS_RELOAD: bool = False
+
+    # Resumable formatting jobs (per-chunk checkpoints); empty path disables them
+    FORMAT_JOB_DB_PATH: str = ".cache/jobs.sqlite3"
+    FORMAT_JOB_TTL: int = 7 * 86400  # seconds since a job was last touched
+    FORMAT_JOB_HEARTBEAT_INTERVAL: int = 30  # seconds; a running job silent for 4 intervals is interrupted
+
+    # Batch jobs
+    BATCH_FETCH_WORKERS: int = 4  # videos fetched from YouTube in parallel
+    BATCH_FORMAT_WORKERS: int = 2  # transcripts formatted by the LLM in parallel
+    BATCH_MAX_URLS: int = 50  # per batch request
+    BATCH_MAX_PENDING: int = 500  # videos waiting across all batch jobs
+    BATCH_JOB_TTL: int = 3600  # seconds a completed job's results are kept
+
     # Deployment configuration
     BASE_PATH: str = ""
 
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Offline latency and throughput benchmark.
+
+Runs the FastAPI app in-process against local stand-ins: a fake OpenRouter
+server (scripts/fake_openrouter.py) with configurable latency and generation
+speed, and a YouTubeTranscriptFetcher whose fetches return fixture
+transcripts of several lengths after a configurable delay. For each endpoint
+and concurrency level it reports p50/p95/p99 latency and requests per second.
+
+Caches are off by default so every request reaches the stand-ins, and each
+format request gets a unique transcript so identical requests are not
+coalesced.
+
+Usage:
+    python scripts/benchmark.py
+    python scripts/benchmark.py --concurrency 1 8 32 --requests 64 --endpoints format format_stream
+    python scripts/benchmark.py --save-baseline           # record .cache/benchmark_baseline.json
+    python scripts/benchmark.py --compare                 # compare against it, exit 1 on a regression
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import importlib
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx
+
+from scripts.fake_openrouter import FakeOpenRouterServer, create_app
+
+DEFAULT_BASELINE = ROOT / ".cache" / "benchmark_baseline.json"
+ENDPOINTS = ("transcript", "format", "format_stream")
+
+# Fixture transcripts: name -> (video ID, number of caption segments)
+FIXTURES = {
+    "short": ("benchShort1", 60),
+    "medium": ("benchMedium", 300),
+    "long": ("benchLong01", 1100),
+}
+
+_WORDS = (
+    "so today we are going to talk about how the system works and why it matters "
+    "you know the thing is that most people never really look at what happens under "
+    "the hood but once you see it it makes a lot of sense right let me show you"
+).split()
+
+
+def build_fixtures(seed: int = 1) -> Dict[str, List[str]]:
+    """Deterministic caption-like segments for each fixture, keyed by video ID"""
+    rng = random.Random(seed)
+    fixtures = {}
+    for video_id, segments in FIXTURES.values():
+        fixtures[video_id] = [
+            " ".join(rng.choice(_WORDS) for _ in range(rng.randint(5, 12)))
+            for _ in range(segments)
+        ]
+    return fixtures
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: List[float], errors: int, wall_time: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+        "rps": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+    }
+
+
+def configure_environment(args: argparse.Namespace, workdir: str, base_url: str) -> None:
+    """Point the app at the stand-ins; must run before config is imported"""
+    os.environ["OPENROUTER_API_KEY"] = "benchmark"
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ["BASE_PATH"] = ""
+    os.environ["CACHE_DB_PATH"] = os.path.join(workdir, "cache.sqlite3")
+    os.environ["FORMAT_JOB_DB_PATH"] = os.path.join(workdir, "jobs.sqlite3")
+    os.environ["TRANSCRIPT_CACHE_ENABLED"] = str(args.cache).lower()
+    os.environ["FORMAT_CACHE_ENABLED"] = str(args.cache).lower()
+    # Every request comes from one client; measure the pipeline rather than admission control
+    os.environ.setdefault("FORMAT_MAX_CONCURRENT", "0")
+    os.environ.setdefault("FORMAT_MAX_PER_CLIENT", "0")
+
+
+def install_fixture_fetcher(fixtures: Dict[str, List[str]], latency: float) -> None:
+    """Replace the blocking YouTube fetch with fixture lookups that take `latency` seconds"""
+    from utils.segments import SegmentStore
+    from utils.youtube import NO_TRANSCRIPT_ERROR, Captions, CaptionTrack, YouTubeTranscriptFetcher
+
+    track = CaptionTrack("en", "English", False)
+
+    def fetch_captions(video_id: str, languages: Any = None) -> Tuple[Any, Any]:
+        time.sleep(latency)
+        if video_id not in fixtures:
+            return None, NO_TRANSCRIPT_ERROR
+        texts = fixtures[video_id]
+        # Captions every 3 seconds, as a stand-in for real timings
+        segments = SegmentStore(texts, [index * 3.0 for index in range(len(texts))], [3.0] * len(texts))
+        return Captions(segments, track, [track]), None
+
+    YouTubeTranscriptFetcher.fetch_captions = staticmethod(fetch_captions)
+
+
+def request_for(endpoint: str, index: int, prefix: str, fixtures: Dict[str, List[str]]) -> Tuple[str, Dict[str, Any]]:
+    video_ids = list(fixtures)
+    video_id = video_ids[index % len(video_ids)]
+    if endpoint == "transcript":
+        return f"{prefix}/api/transcript", {
+            "youtube_url": f"https://www.youtube.com/watch?v={video_id}",
+            "transcript_format": "text",
+        }
+    transcript = "\n".join(fixtures[video_id] + [f"benchmark request {index}"])
+    path = "/api/format/stream" if endpoint == "format_stream" else "/api/format"
+    return f"{prefix}{path}", {"raw_transcript": transcript}
+
+
+def succeeded(endpoint: str, response: httpx.Response) -> bool:
+    if response.status_code != 200:
+        return False
+    if endpoint == "format_stream":
+        return "event: done" in response.text
+    return bool(response.json().get("success"))
+
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, concurrency: int, total: int,
+                    prefix: str, fixtures: Dict[str, List[str]]) -> Dict[str, float]:
+    """Send `total` requests from `concurrency` workers and summarize them"""
+    latencies: List[float] = []
+    errors = 0
+    next_index = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for index in next_index:
+            path, body = request_for(endpoint, index, prefix, fixtures)
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                ok = succeeded(endpoint, response)
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_benchmark(app, prefix: str, args: argparse.Namespace, fixtures: Dict[str, List[str]]) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for endpoint in args.endpoints:
+                # One untimed request per endpoint so lazy setup is not measured
+                await run_level(client, endpoint, 1, 1, prefix, fixtures)
+                for concurrency in args.concurrency:
+                    summary = await run_level(client, endpoint, concurrency, args.requests, prefix, fixtures)
+                    results[f"{endpoint}@{concurrency}"] = summary
+                    print(
+                        f"{endpoint:<14} c={concurrency:<4} "
+                        f"p50 {summary['p50_ms']:>9.1f} ms  p95 {summary['p95_ms']:>9.1f} ms  "
+                        f"p99 {summary['p99_ms']:>9.1f} ms  {summary['rps']:>8.2f} req/s  "
+                        f"errors {summary['errors']}"
+                    )
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print changes against the baseline and return the regressions beyond threshold"""
+    regressions = []
+    print(f"\nCompared with baseline from {baseline.get('created_at', 'unknown time')}:")
+    for key, current in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if not previous:
+            continue
+        p95_change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] if previous["p95_ms"] else 0.0
+        rps_change = (current["rps"] - previous["rps"]) / previous["rps"] if previous["rps"] else 0.0
+        print(f"{key:<20} p95 {p95_change:+7.1%}   req/s {rps_change:+7.1%}")
+        if p95_change > threshold:
+            regressions.append(f"{key}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if rps_change < -threshold:
+            regressions.append(f"{key}: {previous['rps']} -> {current['rps']} req/s")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{key}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="main", choices=("main", "api.index"), help="Application module to load")
+    parser.add_argument("--endpoints", nargs="+", default=["transcript", "format"], choices=ENDPOINTS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="Fake OpenRouter seconds to first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=5000, help="Fake generation speed (0 = instant)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of fake LLM calls answered with 429")
+    parser.add_argument("--llm-max-output-tokens", type=int, default=0,
+                        help="Fake output limit; longer outputs need continuations (0 = none)")
+    parser.add_argument("--youtube-latency", type=float, default=0.2, help="Seconds per fixture transcript fetch")
+    parser.add_argument("--cache", action="store_true", help="Enable the transcript and format caches")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare the results with --baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change counted as a regression")
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    fake = FakeOpenRouterServer(create_app(
+        args.llm_latency, args.llm_tokens_per_second, args.llm_error_rate,
+        seed=1, max_output_tokens=args.llm_max_output_tokens
+    ))
+    fake.start()
+    workdir = tempfile.mkdtemp(prefix="verbatim-bench-")
+    configure_environment(args, workdir, fake.base_url)
+
+    # The app resolves static/ and .env relative to the working directory
+    os.chdir(ROOT)
+    app_module = importlib.import_module(args.app)
+    logging.disable(logging.WARNING)
+    prefix = "/verbatim-ai" if args.app == "api.index" else ""
+
+    fixtures = build_fixtures()
+    install_fixture_fetcher(fixtures, args.youtube_latency)
+
+    settings = {
+        key: value for key, value in vars(args).items()
+        if key not in ("baseline", "save_baseline", "compare", "threshold", "output")
+    }
+    print(f"Benchmarking {args.app} against fake OpenRouter at {fake.base_url}")
+    try:
+        results = asyncio.run(run_benchmark(app_module.app, prefix, args, fixtures))
+    finally:
+        fake.stop()
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": settings,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    status = 0
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"No baseline at {args.baseline}; run with --save-baseline first", file=sys.stderr)
+            status = 1
+        else:
+            baseline = json.loads(args.baseline.read_text())
+            if baseline.get("settings") != settings:
+                print("Warning: baseline was recorded with different settings", file=sys.stderr)
+            regressions = compare(results, baseline, args.threshold)
+            if regressions:
+                print("\nRegressions beyond threshold:\n  " + "\n  ".join(regressions))
+                status = 1
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"\nSaved baseline to {args.baseline}")
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
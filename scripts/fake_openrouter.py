@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenRouter chat completions API.
+
+Serves POST /chat/completions with a configurable time to first token and
+generation speed, in both plain and streamed (server-sent events) form, so
+the app can be exercised and benchmarked without network access or API
+credits. The completion echoes the longest paragraph of the prompt (the
+transcript chunk), which keeps output length proportional to the input
+like real formatting does. Output longer than max_tokens is cut off with
+finish_reason "length", and a request that sends the cut-off output back as
+an assistant message gets the rest of it.
+
+Usage:
+    python scripts/fake_openrouter.py --port 8900 --latency 0.5 --tokens-per-second 150
+    OPENROUTER_BASE_URL=http://127.0.0.1:8900 OPENROUTER_API_KEY=fake python main.py
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.chunker import CHARS_PER_TOKEN, estimate_tokens
+
+# Tokens sent per streamed event
+STREAM_TOKENS_PER_EVENT = 4
+
+
+def _completion_text(messages: List[Dict[str, str]], max_tokens: int) -> Tuple[str, str]:
+    """
+    The longest paragraph of the first prompt, less whatever the assistant
+    already wrote, capped at max_tokens.
+    Returns: (text, finish_reason)
+    """
+    prompt = messages[0].get("content", "") if messages else ""
+    paragraphs = [p.strip() for p in prompt.split("\n\n") if p.strip()]
+    text = " ".join(max(paragraphs, key=len).split()) if paragraphs else ""
+    written = "".join(m.get("content", "") for m in messages if m.get("role") == "assistant")
+    remaining = text[len(written):]
+    limit = int(max_tokens * CHARS_PER_TOKEN)
+    return remaining[:limit], "length" if len(remaining) > limit else "stop"
+
+
+def create_app(latency: float = 0.2, tokens_per_second: float = 0.0, error_rate: float = 0.0,
+               seed: Optional[int] = None, max_output_tokens: int = 0) -> FastAPI:
+    """
+    Build the fake API.
+    latency: seconds before the first token
+    tokens_per_second: generation speed after the first token (0 = instant)
+    error_rate: fraction of requests answered with 429 and a Retry-After header
+    max_output_tokens: output limit applied below the requested max_tokens (0 = none)
+    """
+    app = FastAPI(title="Fake OpenRouter")
+    rng = random.Random(seed)
+
+    def generation_time(tokens: int) -> float:
+        return tokens / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if error_rate and rng.random() < error_rate:
+            return JSONResponse(
+                {"error": {"code": 429, "message": "Rate limit exceeded (fake)"}},
+                status_code=429,
+                headers={"Retry-After": "1"}
+            )
+
+        messages = body.get("messages", [])
+        prompt = "\n\n".join(message.get("content", "") for message in messages)
+        max_tokens = body.get("max_tokens") or 4000
+        if max_output_tokens:
+            max_tokens = min(max_tokens, max_output_tokens)
+        text, finish_reason = _completion_text(messages, max_tokens)
+        usage = {
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(text),
+            "total_tokens": estimate_tokens(prompt) + estimate_tokens(text),
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency + generation_time(usage["completion_tokens"]))
+            return {
+                "id": "fake-completion",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish_reason}],
+                "usage": usage,
+            }
+
+        async def events():
+            yield ": OPENROUTER PROCESSING\n\n"
+            await asyncio.sleep(latency)
+            piece = max(1, int(STREAM_TOKENS_PER_EVENT * CHARS_PER_TOKEN))
+            started = time.monotonic()
+            for sent, start in enumerate(range(0, len(text), piece), 1):
+                delta = {"choices": [{"index": 0, "delta": {"content": text[start:start + piece]}}]}
+                yield f"data: {json.dumps(delta)}\n\n"
+                # Pace against the start time so timer overhead does not slow generation down
+                delay = started + generation_time(sent * STREAM_TOKENS_PER_EVENT) - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            final = {"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}], "usage": usage}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class FakeOpenRouterServer:
+    """Run the fake API on a background thread with its own event loop"""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 0):
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOpenRouterServer":
+        self._thread = threading.Thread(target=self.server.run, name="fake-openrouter", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Fake OpenRouter server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Generation speed (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests rejected with 429")
+    parser.add_argument("--max-output-tokens", type=int, default=0, help="Cut off longer outputs (0 = max_tokens only)")
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.tokens_per_second, args.error_rate, max_output_tokens=args.max_output_tokens)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
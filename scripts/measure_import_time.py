@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Cold-start import time of the serverless entry point.
+
+Imports the app module (api/index.py by default) in fresh interpreters, as a
+serverless cold start does, and reports the median import time, the whole
+process time and the slowest modules from `python -X importtime`. Exits 1 if
+the median import exceeds the budget, or if a module that should only load on
+first use (youtube-transcript-api, httpx, the LLM and YouTube services) was
+imported eagerly.
+
+Usage:
+    python scripts/measure_import_time.py
+    python scripts/measure_import_time.py --budget-ms 600 --runs 10
+    python scripts/measure_import_time.py --module main --forbid
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_BUDGET_MS = 800.0
+# Modules the entry point must not import before a request needs them
+LAZY_MODULES = (
+    "youtube_transcript_api",
+    "requests",
+    "httpx",
+    "utils.youtube",
+    "utils.llm",
+    "utils.batch",
+)
+
+_PROBE = """
+import sys, json, time, importlib
+started = time.perf_counter()
+importlib.import_module({module!r})
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "modules": sorted(sys.modules)}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for each line of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = [field.strip() for field in line[len("import time:"):].split("|")]
+        if len(fields) != 3 or not fields[0].isdigit():
+            continue  # the header line
+        rows.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return rows
+
+
+def measure_once(module: str) -> Dict[str, Any]:
+    """Import `module` in a fresh interpreter and time it"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+        capture_output=True,
+        text=True
+    )
+    process_seconds = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        "import_ms": probe["seconds"] * 1000,
+        "process_ms": process_seconds * 1000,
+        "modules": probe["modules"],
+        "importtime": parse_importtime(result.stderr),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api.index", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Median import time allowed")
+    parser.add_argument("--forbid", nargs="*", default=list(LAZY_MODULES),
+                        help="Modules that must not be imported (pass no names to allow all)")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # One untimed run so .pyc compilation is not measured
+    measure_once(args.module)
+    runs = [measure_once(args.module) for _ in range(max(1, args.runs))]
+
+    import_ms = statistics.median(run["import_ms"] for run in runs)
+    process_ms = statistics.median(run["process_ms"] for run in runs)
+    print(f"{args.module}: median import {import_ms:.1f} ms, whole process {process_ms:.1f} ms "
+          f"({len(runs)} runs, budget {args.budget_ms:.0f} ms)")
+
+    # Cumulative time of the top-level imports, from the median run
+    median_run = sorted(runs, key=lambda run: run["import_ms"])[len(runs) // 2]
+    slowest = sorted(median_run["importtime"], key=lambda row: row[2], reverse=True)
+    print("\nSlowest imports (cumulative):")
+    for name, self_us, cumulative_us in slowest[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    status = 0
+    loaded = [module for module in args.forbid if module in median_run["modules"]]
+    if loaded:
+        print(f"\nImported eagerly, should load on first use: {', '.join(loaded)}")
+        status = 1
+    if import_ms > args.budget_ms:
+        print(f"\nOver budget: {import_ms:.1f} ms > {args.budget_ms:.0f} ms")
+        status = 1
+
+    if args.output:
+        args.output.write_text(json.dumps({
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "module": args.module,
+            "budget_ms": args.budget_ms,
+            "import_ms": round(import_ms, 1),
+            "process_ms": round(process_ms, 1),
+            "eager_lazy_modules": loaded,
+            "slowest": [
+                {"module": name, "cumulative_ms": round(cumulative_us / 1000, 1)}
+                for name, _, cumulative_us in slowest[:args.top]
+            ],
+        }, indent=2))
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
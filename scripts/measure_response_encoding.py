@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Measure the CPU time and bytes of transcript responses by serializer and
+content coding.
+
+For transcripts of several lengths (synthetic caption segments, or the
+files given with --file) it builds the /api/transcript response in the
+"json" wire format and reports:
+  - serialization time with the stdlib json module and with orjson, for
+    both the pretty-printed transcript and the response body around it
+  - response bytes uncompressed, gzip and brotli (at the levels used for
+    API responses), with the time each compression takes
+
+Usage:
+    python scripts/measure_response_encoding.py
+    python scripts/measure_response_encoding.py --segments 300 1100 5000 --file transcript.json
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import fastjson
+from utils.compression import DYNAMIC_LEVELS, available_encodings, compress
+from utils.transcript import parse_segments
+
+_WORDS = (
+    "so today we are going to talk about how the system works and why it matters "
+    "you know the thing is that most people never really look at what happens under "
+    "the hood but once you see it it makes a lot of sense right let me show you"
+).split()
+
+
+def synthetic_segments(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(_WORDS) for _ in range(rng.randint(5, 12))) for _ in range(count)]
+
+
+def best_ms(fn: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of fn in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def stdlib_body(segments: List[str]) -> bytes:
+    """The response body as built before: stdlib json for the transcript and the response"""
+    transcript = json.dumps([{"text": text} for text in segments], indent=2, ensure_ascii=False)
+    response = {"success": True, "transcript": transcript, "error": None}
+    return json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_body(segments: List[str]) -> bytes:
+    """The response body as built now: utils.fastjson (orjson when installed)"""
+    transcript = fastjson.dumps([{"text": text} for text in segments], indent=True)
+    response = {"success": True, "transcript": transcript, "error": None}
+    return fastjson.dumps(response).encode("utf-8")
+
+
+def measure(name: str, segments: List[str], repeat: int) -> Dict[str, Any]:
+    body = fast_body(segments)
+    result: Dict[str, Any] = {
+        "name": name,
+        "segments": len(segments),
+        "stdlib_json_ms": round(best_ms(lambda: stdlib_body(segments), repeat), 3),
+        "fast_json_ms": round(best_ms(lambda: fast_body(segments), repeat), 3),
+        "identity_bytes": len(body),
+    }
+    for encoding in available_encodings():
+        result[f"{encoding}_bytes"] = len(compress(body, encoding))
+        result[f"{encoding}_ms"] = round(best_ms(lambda: compress(body, encoding), repeat), 3)
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", nargs="+", type=int, default=[60, 300, 1100, 5000],
+                        help="Synthetic transcript lengths in caption segments")
+    parser.add_argument("--file", action="append", default=[], help="Raw transcript file (json or text format)")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per measurement")
+    args = parser.parse_args()
+
+    print(f"orjson: {'yes' if fastjson.orjson is not None else 'no (stdlib fallback)'} | "
+          f"codings: {', '.join(available_encodings())} | levels: {DYNAMIC_LEVELS}")
+    results = [measure(f"{count} segments", synthetic_segments(count), args.repeat) for count in args.segments]
+    for path in args.file:
+        results.append(measure(path, parse_segments(Path(path).read_text(encoding="utf-8")), args.repeat))
+
+    for r in results:
+        line = (
+            f"{r['name']:<16} serialize {r['stdlib_json_ms']:7.2f} -> {r['fast_json_ms']:6.2f} ms | "
+            f"{r['identity_bytes']:>9,} B"
+        )
+        for encoding in available_encodings():
+            saved = 1 - r[f"{encoding}_bytes"] / r["identity_bytes"]
+            line += f" | {encoding} {r[f'{encoding}_bytes']:>8,} B (-{saved:.0%}) in {r[f'{encoding}_ms']:6.2f} ms"
+        print(line)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compare the size of the transcript wire formats on real transcripts.
+
+Usage:
+    python scripts/measure_transcript_formats.py VIDEO_ID [VIDEO_ID ...]
+    python scripts/measure_transcript_formats.py --file transcript.json [--file other.txt]
+
+For each transcript it reports the bytes of the API response in the legacy
+"json" format and the compact "text" format, and the tokens of the LLM
+prompt payload before (pretty-printed JSON chunks) and after (one segment
+per line), and after the local clean-up that runs before the LLM
+(utils.preformat: noise tags and caption overlaps removed, one sentence per
+line). Tokens are counted with tiktoken when it is installed, otherwise
+estimated the same way the chunker does.
+"""
+import sys
+import json
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.chunker import estimate_tokens
+from utils.preformat import preformat_sentences
+from utils.transcript import parse_segment_store, serialize_segments, to_prompt_text
+from utils.youtube import YouTubeTranscriptFetcher
+
+
+def count_tokens(text: str) -> int:
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except ImportError:
+        return estimate_tokens(text)
+
+
+def measure(name: str, segments) -> dict:
+    legacy = serialize_segments(segments, "json")
+    compact = serialize_segments(segments, "text")
+    # The old chunker re-serialized segments with indent=2, so the legacy prompt payload is the json format
+    compact_prompt = to_prompt_text(segments)
+    preformatted_prompt = "\n".join(preformat_sentences(segments))
+    result = {
+        "name": name,
+        "segments": len(segments),
+        "json_bytes": len(legacy.encode("utf-8")),
+        "text_bytes": len(compact.encode("utf-8")),
+        "json_prompt_tokens": count_tokens(legacy),
+        "text_prompt_tokens": count_tokens(compact_prompt),
+        "preformatted_prompt_tokens": count_tokens(preformatted_prompt),
+    }
+    result["byte_reduction"] = 1 - result["text_bytes"] / result["json_bytes"]
+    result["token_reduction"] = 1 - result["text_prompt_tokens"] / result["json_prompt_tokens"]
+    result["preformat_reduction"] = 1 - result["preformatted_prompt_tokens"] / result["text_prompt_tokens"]
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video_ids", nargs="*", help="YouTube video IDs to fetch")
+    parser.add_argument("--file", action="append", default=[], help="Raw transcript file (json or text format)")
+    args = parser.parse_args()
+
+    results = []
+    for path in args.file:
+        results.append(measure(path, parse_segment_store(Path(path).read_text(encoding="utf-8"))))
+    for video_id in args.video_ids:
+        segments, error = YouTubeTranscriptFetcher.fetch_segments(video_id)
+        if error:
+            print(f"{video_id}: {error}", file=sys.stderr)
+            continue
+        results.append(measure(video_id, segments))
+
+    if not results:
+        parser.print_usage()
+        return 1
+
+    for r in results:
+        print(
+            f"{r['name']}: {r['segments']} segments | "
+            f"bytes {r['json_bytes']:,} -> {r['text_bytes']:,} (-{r['byte_reduction']:.0%}) | "
+            f"prompt tokens {r['json_prompt_tokens']:,} -> {r['text_prompt_tokens']:,} (-{r['token_reduction']:.0%}) "
+            f"-> {r['preformatted_prompt_tokens']:,} preformatted (-{r['preformat_reduction']:.0%})"
+        )
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,10 @@ class VerbatimAI {
         this.bindEvents();
         this.rawTranscript = '';
         this.formattedTranscript = '';
+        // Checkpointed server job of the last multi-chunk format, resumed on retry after a failure
+        this.formatJob = null;
+        // Completed server job of the last format, so re-formatting an edited transcript only redoes changed chunks
+        this.lastFormatJob = null;
         this.settings = this.loadSettings();
         this.loadModels();
     }
@@ -23,6 +27,11 @@ class VerbatimAI {
         this.rawLoading = document.getElementById('raw-transcript-loading');
         this.formattedLoading = document.getElementById('formatted-transcript-loading');
 
+        // Format progress
+        this.formatProgress = document.getElementById('format-progress');
+        this.formatProgressText = document.getElementById('format-progress-text');
+        this.cancelFormatBtn = document.getElementById('cancel-format-btn');
+
         // Copy buttons
         this.copyRawBtn = document.getElementById('copy-raw-btn');
         this.copyFormattedBtn = document.getElementById('copy-formatted-btn');
@@ -65,6 +74,11 @@ class VerbatimAI {
     bindEvents() {
         this.getTranscriptBtn.addEventListener('click', () => this.fetchTranscript());
         this.formatBtn.addEventListener('click', () => this.formatTranscript());
+        this.cancelFormatBtn.addEventListener('click', () => this.cancelFormat());
+        this.rawTranscriptArea.addEventListener('input', () => {
+            this.rawTranscript = this.rawTranscriptArea.value;
+            this.formatBtn.disabled = !this.rawTranscript.trim();
+        });
         this.copyRawBtn.addEventListener('click', () => this.copyToClipboard(this.rawTranscript, 'Raw transcript'));
         this.copyFormattedBtn.addEventListener('click', () => this.copyToClipboard(this.formattedTranscript, 'Formatted transcript'));
         this.errorDismiss.addEventListener('click', () => this.hideError());
@@ -348,6 +362,18 @@ class VerbatimAI {
             defaultOption.selected = true;
             this.modelSelect.appendChild(defaultOption);
 
+            // Let the server pick the fastest healthy model from the list below, per chunk
+            const autoOption = document.createElement('option');
+            autoOption.value = 'auto';
+            autoOption.textContent = 'Auto (fastest available free model)';
+            this.modelSelect.appendChild(autoOption);
+
+            // Clean up and paragraph the captions on the server without an LLM
+            const fastOption = document.createElement('option');
+            fastOption.value = 'fast';
+            fastOption.textContent = 'Fast (instant, no AI)';
+            this.modelSelect.appendChild(fastOption);
+
             // Add models from file
             models.forEach(model => {
                 const option = document.createElement('option');
@@ -376,6 +402,8 @@ class VerbatimAI {
             // Fallback to default models
             this.modelSelect.innerHTML = `
                 <option value="anthropic/claude-3.5-sonnet" selected>Claude 3.5 Sonnet (Default)</option>
+                <option value="auto">Auto (fastest available free model)</option>
+                <option value="fast">Fast (instant, no AI)</option>
                 <option value="anthropic/claude-3-haiku">Claude 3 Haiku</option>
                 <option value="openai/gpt-4o-mini">GPT-4o Mini</option>
             `;
@@ -461,7 +489,8 @@ class VerbatimAI {
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({ youtube_url: url })
+                // One caption segment per line: smaller payload and fewer LLM tokens than JSON
+                body: JSON.stringify({ youtube_url: url, transcript_format: 'text' })
             });
 
             const data = await response.json();
@@ -469,6 +498,8 @@ class VerbatimAI {
             if (data.success) {
                 this.rawTranscript = data.transcript;
                 this.rawTranscriptArea.value = this.rawTranscript;
+                this.formatJob = null;
+                this.lastFormatJob = null;
                 this.copyRawBtn.disabled = false;
                 this.formatBtn.disabled = false;
 
@@ -498,47 +529,221 @@ class VerbatimAI {
 
         this.hideError();
         this.setLoading(false, true);
+        this.formattedTranscript = '';
+        this.copyFormattedBtn.disabled = true;
+        this.formatAbort = new AbortController();
+        this.showFormatProgress('Starting...');
 
         try {
             const selectedModel = this.modelSelect.value;
-            const requestBody = {
-                raw_transcript: this.rawTranscript,
-                model: selectedModel
-            };
+            const requestBody = selectedModel === 'fast'
+                ? { raw_transcript: this.rawTranscript, mode: 'fast' }
+                : { raw_transcript: this.rawTranscript, model: selectedModel };
 
             // Add API key if stored in settings
             if (this.settings.apiKey) {
                 requestBody.api_key = this.settings.apiKey;
             }
 
-            const response = await fetch('api/format', {
+            // Retrying the same transcript and model resumes from the chunks already formatted
+            if (this.formatJob && this.formatJob.transcript === this.rawTranscript && this.formatJob.model === selectedModel) {
+                requestBody.job_id = this.formatJob.id;
+            } else if (this.lastFormatJob && this.lastFormatJob.model === selectedModel) {
+                // An edited transcript: only the chunks that changed since the last format are re-formatted
+                requestBody.previous_job_id = this.lastFormatJob.id;
+            }
+
+            // Stream the formatted text as server-sent events so it renders as it arrives
+            const response = await fetch('api/format/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify(requestBody)
+                body: JSON.stringify(requestBody),
+                signal: this.formatAbort.signal
             });
 
-            const data = await response.json();
+            // Turned away because the server is busy (503) or this client has too many formats running (429)
+            if (response.status === 429 || response.status === 503) {
+                const data = await response.json().catch(() => ({}));
+                this.showError(data.error || `The server is busy. Please try again in ${response.headers.get('Retry-After') || 'a few'} seconds.`);
+                return;
+            }
 
-            if (data.success) {
-                this.formattedTranscript = data.formatted_transcript;
+            if (!response.ok || !response.body) {
+                throw new Error(`Unexpected response status ${response.status}`);
+            }
 
-                // Convert markdown to HTML for better display
-                const htmlContent = this.markdownToHtml(this.formattedTranscript);
-                this.formattedTranscriptDiv.innerHTML = htmlContent;
-                this.copyFormattedBtn.disabled = false;
-            } else {
-                this.showError(data.error || 'Failed to format transcript');
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let failed = false;
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    const event = this.parseSseFrame(frame);
+                    if (event && !this.handleFormatEvent(event)) {
+                        failed = true;
+                    }
+                }
             }
+
+            this.renderFormatted();
+            this.copyFormattedBtn.disabled = failed || !this.formattedTranscript;
         } catch (error) {
-            this.showError('Network error. Please check your connection and try again.');
-            console.error('Error formatting transcript:', error);
+            if (error.name === 'AbortError') {
+                this.renderFormatted();
+                this.showToast('Formatting cancelled');
+            } else {
+                this.showError('Network error. Please check your connection and try again.');
+                console.error('Error formatting transcript:', error);
+            }
         } finally {
+            this.formatAbort = null;
+            this.formatProgress.classList.add('hidden');
             this.setLoading(false, false);
         }
     }
 
+    async cancelFormat() {
+        if (!this.formatAbort) return;
+        this.cancelFormatBtn.disabled = true;
+        this.formatProgressText.textContent = 'Cancelling...';
+
+        // A server job stops between chunks and keeps the finished ones, so formatting again resumes it
+        if (this.formatJob) {
+            try {
+                const response = await fetch(`api/format/jobs/${encodeURIComponent(this.formatJob.id)}/cancel`, { method: 'POST' });
+                const data = await response.json();
+                if (data.success) return;
+            } catch (error) {
+                console.error('Error cancelling format job:', error);
+            }
+        }
+        // No job to cancel (a single chunk) or it already finished: stop reading the stream
+        if (this.formatAbort) {
+            this.formatAbort.abort();
+        }
+    }
+
+    showFormatProgress(text) {
+        this.formatProgressText.textContent = text;
+        this.cancelFormatBtn.disabled = false;
+        this.formatProgress.classList.remove('hidden');
+    }
+
+    updateFormatProgress(event) {
+        if (!this.formatAbort || this.cancelFormatBtn.disabled) return;
+        const parts = event.total_chunks > 1
+            ? [`Chunk ${event.chunk} of ${event.total_chunks}`, `${event.completed_chunks} done`]
+            : ['Formatting'];
+        if (event.elapsed !== undefined) {
+            parts.push(`${this.formatDuration(event.elapsed)} elapsed`);
+        }
+        if (event.eta !== null && event.eta !== undefined) {
+            parts.push(`~${this.formatDuration(event.eta)} left`);
+        }
+        this.formatProgressText.textContent = parts.join(' · ');
+    }
+
+    formatDuration(seconds) {
+        const total = Math.round(seconds);
+        return `${Math.floor(total / 60)}:${String(total % 60).padStart(2, '0')}`;
+    }
+
+    parseSseFrame(frame) {
+        const data = frame
+            .split('\n')
+            .filter(line => line.startsWith('data:'))
+            .map(line => line.slice(5).trim())
+            .join('\n');
+
+        if (!data) return null;
+
+        try {
+            return JSON.parse(data);
+        } catch (error) {
+            console.error('Invalid stream event:', data);
+            return null;
+        }
+    }
+
+    // Returns false when the event reports a failure
+    handleFormatEvent(event) {
+        switch (event.event) {
+            case 'start':
+                this.formatJob = event.job_id
+                    ? { id: event.job_id, transcript: this.rawTranscript, model: event.model }
+                    : null;
+                this.formatChunks = event.total_chunks;
+                if (event.reused_chunks) {
+                    this.showToast(`Re-formatting ${event.total_chunks - event.reused_chunks} of ${event.total_chunks} chunks`);
+                }
+                return true;
+            case 'done':
+                this.lastFormatJob = this.formatJob ? { id: this.formatJob.id, model: this.formatJob.model } : null;
+                this.formatJob = null;
+                if (event.routing && event.routing.length) {
+                    const models = [...new Set(event.routing.map(route => route.model).filter(Boolean))];
+                    this.showToast(`Formatted with ${models.join(', ')}`);
+                }
+                return true;
+            case 'chunk_start':
+                // Separate chunks with a paragraph break
+                if (event.chunk > 1 && this.formattedTranscript) {
+                    this.formattedTranscript += '\n\n';
+                }
+                this.updateFormatProgress({ total_chunks: this.formatChunks, ...event });
+                return true;
+            case 'chunk_end':
+                this.updateFormatProgress({ total_chunks: this.formatChunks, ...event });
+                return true;
+            case 'token':
+                this.formattedTranscript += event.text;
+                this.scheduleRender();
+                return true;
+            case 'error':
+                if (event.cancelled) {
+                    // The checkpointed job is kept, so formatting again picks up where it stopped
+                    this.showToast('Formatting cancelled');
+                    return false;
+                }
+                // The previous job may have expired; the next attempt formats from scratch
+                this.lastFormatJob = null;
+                this.showError(event.error || 'Failed to format transcript');
+                return false;
+            default:
+                return true;
+        }
+    }
+
+    scheduleRender() {
+        if (this.renderPending) return;
+        this.renderPending = true;
+        requestAnimationFrame(() => {
+            this.renderPending = false;
+            this.renderFormatted();
+        });
+    }
+
+    renderFormatted() {
+        if (!this.formattedTranscript) return;
+
+        // Show the output as soon as the first words arrive
+        this.formattedLoading.classList.add('hidden');
+        this.formattedTranscriptDiv.classList.remove('hidden');
+
+        // Convert markdown to HTML for better display
+        this.formattedTranscriptDiv.innerHTML = this.markdownToHtml(this.formattedTranscript);
+    }
+
     markdownToHtml(markdown) {
         // Simple markdown to HTML conversion for Beer CSS
         return markdown
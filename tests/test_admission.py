@@ -0,0 +1,92 @@
+import os
+import json
+import asyncio
+
+# Keep the caches and job store off disk; must be set before config is imported
+os.environ["CACHE_DB_PATH"] = ""
+os.environ["FORMAT_JOB_DB_PATH"] = ""
+
+from app_factory import create_app
+from config import Config
+from utils.admission import format_admission
+
+
+async def post_and_disconnect(app, path: str, body: dict) -> None:
+    """Send a request, then disconnect before the response body is read"""
+    messages = [
+        {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False},
+        {"type": "http.disconnect"},
+    ]
+
+    async def receive():
+        if len(messages) > 1:
+            return messages.pop(0)
+        await asyncio.sleep(0)
+        return messages[0]
+
+    async def send(message):
+        await asyncio.sleep(0)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"host", b"test")],
+        "client": ("203.0.113.7", 50000),
+        "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+
+
+def test_stream_releases_slot_when_client_disconnects_early(monkeypatch):
+    monkeypatch.setattr(format_admission, "max_per_client", 2)
+    app = create_app(warm_up=False)
+    body = {"raw_transcript": "hello there", "model": "test/model", "api_key": "test-key"}
+
+    async def run():
+        for _ in range(5):
+            await post_and_disconnect(app, "/api/format/stream", body)
+
+    asyncio.run(run())
+    assert format_admission.active == 0
+    assert format_admission.snapshot()["clients"] == 0
+
+
+def test_batch_formatting_takes_admission_slots(monkeypatch):
+    from utils.batch import BatchItem, BatchJob, BatchJobManager
+    from utils.llm import LLMFormatter
+
+    monkeypatch.setattr(format_admission, "max_concurrent", 1)
+    monkeypatch.setattr(format_admission, "max_per_client", 0)
+    monkeypatch.setattr(Config, "BATCH_FORMAT_WORKERS", 3)
+    running = []
+
+    async def format_transcript(self, raw_transcript, *args, **kwargs):
+        running.append(format_admission.active)
+        await asyncio.sleep(0.01)
+        return raw_transcript.upper(), None
+
+    monkeypatch.setattr(LLMFormatter, "format_transcript", format_transcript)
+
+    async def run():
+        manager = BatchJobManager(youtube_fetcher=None)
+        await manager.start()
+        job = BatchJob(["a", "b", "c"], None, None, "text", True)
+        for item in job.items:
+            item.transcript = item.url
+            manager._format_queue.put_nowait((job, item))
+        await asyncio.wait_for(manager._format_queue.join(), timeout=5)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert [item.formatted_transcript for item in job.items] == ["A", "B", "C"]
+    # Three workers, but never more than the one slot the server allows
+    assert running == [1, 1, 1]
+    assert format_admission.active == 0
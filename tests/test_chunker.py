@@ -0,0 +1,92 @@
+from utils.chunker import (
+    ModelLimits, TranscriptChunker, estimate_tokens, get_model_limits, split_by_budget, split_sentences
+)
+
+# A model small enough that a few dozen captions need several chunks
+SMALL = ModelLimits(context_tokens=2000, max_output_tokens=120)
+
+
+def captions(count):
+    """Caption lines where every third one ends a sentence"""
+    return [
+        f"caption number {i} says a few words" + ("." if i % 3 == 2 else "")
+        for i in range(count)
+    ]
+
+
+def chunk(lines, limits=SMALL, overhead=0):
+    chunker = TranscriptChunker("test/model", prompt_overhead_tokens=overhead, limits=limits)
+    return chunker, chunker.split("\n".join(lines))
+
+
+def test_estimate_tokens_by_script():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 35) == 10
+    # CJK is about a token per character, far more than its length in English terms
+    assert estimate_tokens("今日はいい天気ですね") == 10
+    assert estimate_tokens("привет") == 3
+    assert estimate_tokens("Tokyo 東京") == 2 + 2
+
+
+def test_model_limits_fall_back_to_the_base_model_then_the_default():
+    assert get_model_limits("openai/gpt-4o-mini:free") == get_model_limits("openai/gpt-4o-mini")
+    assert get_model_limits("unknown/model") == get_model_limits(None)
+
+
+def test_chunks_cover_every_segment_once_in_order():
+    lines = captions(60)
+    _, chunks = chunk(lines)
+
+    assert len(chunks) > 1
+    assert [line for text in chunks for line in text.split("\n")] == lines
+
+
+def test_chunks_fit_the_output_and_input_budgets():
+    chunker, chunks = chunk(captions(60), overhead=1650)
+
+    assert chunker.input_budget < chunker.output_budget
+    for text in chunks:
+        lines = text.split("\n")
+        assert sum(estimate_tokens(line) for line in lines) <= chunker.output_budget
+        assert sum(estimate_tokens(line) + 1 for line in lines) <= chunker.input_budget
+
+
+def test_chunks_close_at_sentence_ends_once_nearly_full():
+    _, chunks = chunk(captions(60))
+
+    for text in chunks[:-1]:
+        assert text.endswith(".")
+
+
+def test_short_transcript_is_one_chunk():
+    lines = captions(3)
+    _, chunks = chunk(lines, limits=get_model_limits("openai/gpt-4o-mini"))
+    assert chunks == ["\n".join(lines)]
+
+
+def test_oversized_segment_is_split_at_sentences_then_words():
+    chunker = TranscriptChunker("test/model", limits=SMALL)
+    sentence = "word " * 200
+    pieces = chunker._split_text(f"Short one. {sentence.strip()}.")
+
+    assert pieces[0] == "Short one."
+    assert " ".join(pieces[1:]) == sentence.strip() + "."
+    assert all(estimate_tokens(piece) <= chunker.output_budget for piece in pieces)
+
+
+def test_cjk_segments_are_split_within_budget():
+    chunker = TranscriptChunker("test/model", limits=SMALL)
+    text = "これは長い字幕です。" * 30
+    chunks = chunker.split(text)
+
+    assert "".join(chunks).replace("\n", "") == text
+    assert all(estimate_tokens(line) <= chunker.output_budget for c in chunks for line in c.split("\n"))
+    assert split_sentences("一つ。二つ！三つ？") == ["一つ。", "二つ！", "三つ？"]
+
+
+def test_split_by_budget_keeps_every_character():
+    text = "東京" * 100
+    pieces = split_by_budget(text, 15)
+    assert "".join(pieces) == text
+    assert max(estimate_tokens(piece) for piece in pieces) <= 15
+
@@ -0,0 +1,70 @@
+import os
+import asyncio
+
+# Keep the caches and job store off disk; must be set before config is imported
+os.environ["CACHE_DB_PATH"] = ""
+os.environ["FORMAT_JOB_DB_PATH"] = ""
+
+from utils.llm import LLMFormatter, _join_continuation
+
+FIRST = "Welcome back to the channel. " * 20 + "Today we are looking at how"
+# The model starts its continuation by repeating the end of what it already wrote
+REPEATED = "Welcome back to the channel. Today we are looking at how"
+CONTINUATION = REPEATED + " transcripts are formatted, one chunk at a time. " * 12
+
+
+def make_formatter(monkeypatch, replies):
+    """A formatter whose completions return replies in order, each as (text, finish_reason)"""
+    formatter = LLMFormatter()
+    formatter.api_key = "test-key"
+    formatter.model = "test/model"
+    queue = list(replies)
+
+    async def post_completion(messages, model, max_retries=None, max_tokens=None):
+        text, finish_reason = queue.pop(0)
+        return text, finish_reason, None
+
+    async def stream_messages(messages, model, max_retries, outcome, max_tokens=None):
+        text, finish_reason = queue.pop(0)
+        # Deltas of uneven sizes, some splitting the repeated text
+        for start in range(0, len(text), 7):
+            await asyncio.sleep(0)
+            yield text[start:start + 7]
+        outcome["finish_reason"] = finish_reason
+
+    monkeypatch.setattr(formatter, "_post_completion", post_completion)
+    monkeypatch.setattr(formatter, "_stream_messages", stream_messages)
+    return formatter
+
+
+async def collect(deltas):
+    return "".join([delta async for delta in deltas])
+
+
+def test_join_drops_repeated_text():
+    previous = "The speaker opens with a question about the weather"
+    assert _join_continuation(previous, "a question about the weather and then moves on") == (
+        "The speaker opens with a question about the weather and then moves on"
+    )
+    # Overlaps shorter than MIN_CONTINUATION_OVERLAP are kept, since they may be genuine
+    assert _join_continuation("said no.", "No way") == "said no. No way"
+
+
+def test_stream_and_request_agree_on_continued_output(monkeypatch):
+    replies = [(FIRST, "length"), (CONTINUATION, "stop")]
+    requested, error = asyncio.run(make_formatter(monkeypatch, replies)._request_completion("prompt"))
+    streamed = asyncio.run(collect(make_formatter(monkeypatch, replies)._stream_completion("prompt")))
+
+    assert error is None
+    assert streamed == requested
+    assert requested.count(REPEATED) == 1
+
+
+def test_short_continuation_is_deduplicated_when_stream_ends(monkeypatch):
+    replies = [(FIRST, "length"), ("Today we are looking at how it ends.", "stop")]
+    requested, _ = asyncio.run(make_formatter(monkeypatch, replies)._request_completion("prompt"))
+    streamed = asyncio.run(collect(make_formatter(monkeypatch, replies)._stream_completion("prompt")))
+
+    assert streamed == requested
+    assert streamed.endswith("looking at how it ends.")
+    assert streamed.count("Today we are looking at how") == 1
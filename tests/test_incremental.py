@@ -0,0 +1,114 @@
+import os
+import json
+import asyncio
+
+# Keep the caches and job store off disk; must be set before config is imported
+os.environ["CACHE_DB_PATH"] = ""
+os.environ["FORMAT_JOB_DB_PATH"] = ""
+
+import utils.chunker as chunker
+import utils.llm as llm
+from utils.chunker import ModelLimits, TranscriptChunker
+from utils.jobstore import FormatJobStore
+from utils.llm import LLMFormatter
+
+# Small enough that the transcript below needs about 18 chunks
+LIMITS = ModelLimits(context_tokens=8000, max_output_tokens=120)
+
+
+def captions(count=180):
+    return [f"caption number {i} says a few words" + ("." if i % 3 == 2 else "") for i in range(count)]
+
+
+def split(lines, previous=None):
+    return TranscriptChunker("test/model", limits=LIMITS).split("\n".join(lines), previous)
+
+
+def kept(chunks, previous):
+    return sum(1 for chunk in chunks if chunk in previous)
+
+
+def test_one_line_edit_keeps_every_other_chunk():
+    lines = captions()
+    previous = split(lines)
+    edited = list(lines)
+    edited[100] = "a corrected caption"
+
+    chunks = split(edited, previous)
+
+    assert len(previous) >= 15
+    assert kept(chunks, previous) == len(previous) - 1
+    assert "\n".join(chunks).split("\n") == edited
+
+
+def test_dropped_first_line_keeps_the_later_chunks():
+    lines = captions()
+    previous = split(lines)
+
+    chunks = split(lines[1:], previous)
+
+    assert kept(chunks, previous) == len(previous) - 1
+    assert chunks[1:] == previous[1:]
+
+
+def test_unrelated_transcript_keeps_nothing():
+    previous = split(captions())
+    chunks = split([f"something else entirely {i}." for i in range(50)], previous)
+    assert kept(chunks, previous) == 0
+
+
+def make_formatter(monkeypatch):
+    store = FormatJobStore(":memory:", ttl=3600)
+    monkeypatch.setattr(llm, "get_job_store", lambda: store)
+    monkeypatch.setattr(chunker, "MODEL_LIMITS", {"test/model": LIMITS})
+    formatter = LLMFormatter()
+    formatter.api_key = "test-key"
+    formatter.model = "test/model"
+    calls = []
+
+    async def complete_cached(template, content, prompt, use_cache):
+        calls.append(content)
+        return content.upper(), None
+
+    monkeypatch.setattr(formatter, "_complete_cached", complete_cached)
+    return formatter, calls
+
+
+def format_text(formatter, raw, previous_job_id=None):
+    details = {}
+    text, error = asyncio.run(formatter.format_transcript(
+        raw, use_cache=False, details=details, previous_job_id=previous_job_id
+    ))
+    assert error is None
+    return text, details
+
+
+def test_reformat_sends_only_the_edited_chunk(monkeypatch):
+    formatter, calls = make_formatter(monkeypatch)
+    lines = captions()
+    first, details = format_text(formatter, "\n".join(lines))
+    total = len(calls)
+    calls.clear()
+
+    edited = list(lines)
+    edited[100] = "a corrected caption"
+    text, again = format_text(formatter, "\n".join(edited), details["job_id"])
+
+    assert len(calls) == 1
+    assert again["reused_chunks"] == total - 1
+    assert text == "\n\n".join(chunk.upper() for chunk in split(edited, split(lines)))
+
+
+def test_same_text_as_json_needs_no_llm_calls(monkeypatch):
+    formatter, calls = make_formatter(monkeypatch)
+    lines = captions()
+    first, details = format_text(formatter, "\n".join(lines))
+    total = len(calls)
+    calls.clear()
+
+    raw_json = json.dumps([{"text": line} for line in lines], indent=2)
+    text, again = format_text(formatter, raw_json, details["job_id"])
+
+    assert calls == []
+    assert again["reused_chunks"] == total
+    assert text == first
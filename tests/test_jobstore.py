@@ -0,0 +1,76 @@
+import os
+import time
+import sqlite3
+
+# Keep the caches and job store off disk; must be set before config is imported
+os.environ["CACHE_DB_PATH"] = ""
+os.environ["FORMAT_JOB_DB_PATH"] = ""
+
+from utils.jobstore import FormatJobStore
+
+
+def open_workers(tmp_path, count=2):
+    """Stores of separate workers sharing one job file"""
+    path = str(tmp_path / "jobs.sqlite3")
+    return [FormatJobStore(path, ttl=3600, heartbeat_interval=10) for _ in range(count)]
+
+
+def age_heartbeat(store, job_id, seconds):
+    store._conn.execute("UPDATE format_jobs SET heartbeat_at = heartbeat_at - ? WHERE id = ?", (seconds, job_id))
+
+
+def test_live_jobs_of_other_workers_are_not_interrupted(tmp_path):
+    first, second = open_workers(tmp_path)
+    job_id = first.create_job("test/model", ["a", "b"])
+
+    assert second.mark_interrupted() == 0
+    assert second.get_job(job_id)["status"] == "running"
+    assert not second.claim(job_id)
+
+
+def test_jobs_with_a_stale_heartbeat_are_interrupted(tmp_path):
+    first, second = open_workers(tmp_path)
+    job_id = first.create_job("test/model", ["a", "b"])
+    age_heartbeat(first, job_id, first.stale_after + 1)
+
+    assert second.mark_interrupted() == 1
+    assert second.get_job(job_id)["status"] == "interrupted"
+    assert second.claim(job_id)
+    assert second.get_job(job_id)["status"] == "running"
+    # The resumed run now belongs to the second worker
+    assert not first.claim(job_id)
+
+
+def test_heartbeat_keeps_own_jobs_alive(tmp_path):
+    first, second = open_workers(tmp_path)
+    job_id = first.create_job("test/model", ["a", "b"])
+    age_heartbeat(first, job_id, first.stale_after + 1)
+
+    first.heartbeat()
+    assert second.mark_interrupted() == 0
+
+
+def test_finished_jobs_can_be_claimed_again(tmp_path):
+    first, second = open_workers(tmp_path)
+    job_id = first.create_job("test/model", ["a", "b"])
+    first.set_status(job_id, "failed", "boom")
+
+    assert second.claim(job_id)
+    job = second.get_job(job_id)
+    assert job["status"] == "running"
+    assert job["error"] is None
+
+
+def test_files_from_before_heartbeats_are_upgraded(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE format_jobs (id TEXT PRIMARY KEY, model TEXT NOT NULL, status TEXT NOT NULL, "
+        "total_chunks INTEGER NOT NULL, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO format_jobs VALUES ('old', 'test/model', 'running', 2, NULL, ?, ?)", (time.time(), time.time()))
+    conn.commit()
+    conn.close()
+
+    store = FormatJobStore(path, ttl=3600)
+    assert store.mark_interrupted() == 1
@@ -0,0 +1,108 @@
+import os
+import asyncio
+import sqlite3
+
+# Keep the caches and job store off disk; must be set before config is imported
+os.environ["CACHE_DB_PATH"] = ""
+os.environ["FORMAT_JOB_DB_PATH"] = ""
+
+import utils.llm as llm
+from utils.jobstore import FormatJobStore
+from utils.llm import LLMFormatter
+
+
+class LockedJobStore(FormatJobStore):
+    """A job store whose checkpoints fail, as a locked SQLite file would"""
+
+    def __init__(self):
+        super().__init__(":memory:", ttl=3600)
+
+    def save_chunk(self, job_id, chunk_number, output):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def make_formatter(monkeypatch, chunks):
+    formatter = LLMFormatter()
+    formatter.api_key = "test-key"
+    formatter.model = "test/model"
+    monkeypatch.setattr(formatter, "_split_transcript_into_chunks", lambda raw, previous=None: list(chunks))
+
+    async def route_stream(prompt):
+        for word in ("formatted ", "text"):
+            await asyncio.sleep(0)
+            yield word
+
+    monkeypatch.setattr(formatter, "_route_stream", route_stream)
+    return formatter
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+def test_stream_ends_with_error_when_checkpoint_fails(monkeypatch):
+    store = LockedJobStore()
+    monkeypatch.setattr(llm, "get_job_store", lambda: store)
+    formatter = make_formatter(monkeypatch, ["one", "two", "three"])
+
+    events = asyncio.run(asyncio.wait_for(
+        collect(formatter.stream_format_transcript("one\ntwo\nthree", use_cache=False)),
+        timeout=5
+    ))
+
+    assert events[-1]["event"] == "error"
+    assert "database is locked" in events[-1]["error"]
+    assert store.get_job(events[0]["job_id"])["status"] == "failed"
+
+
+def test_format_marks_job_failed_when_checkpoint_fails(monkeypatch):
+    store = LockedJobStore()
+    monkeypatch.setattr(llm, "get_job_store", lambda: store)
+    formatter = make_formatter(monkeypatch, ["one", "two", "three"])
+
+    async def complete_cached(template, content, prompt, use_cache):
+        return "formatted text", None
+
+    monkeypatch.setattr(formatter, "_complete_cached", complete_cached)
+    details = {}
+    text, error = asyncio.run(formatter.format_transcript("one\ntwo\nthree", use_cache=False, details=details))
+
+    assert text is None
+    assert "database is locked" in error
+    assert store.get_job(details["job_id"])["status"] == "failed"
+
+
+def test_cancel_stops_every_streamed_chunk_at_once(monkeypatch):
+    store = FormatJobStore(":memory:", ttl=3600)
+    monkeypatch.setattr(llm, "get_job_store", lambda: store)
+    monkeypatch.setattr(llm.Config, "CHUNK_CONCURRENCY", 3)
+    formatter = make_formatter(monkeypatch, ["alpha", "beta", "gamma"])
+    stopped = []
+
+    async def route_stream(prompt):
+        if "alpha" not in prompt:
+            # A model that takes its time before the first token
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                stopped.append(prompt)
+                raise
+        yield "formatted"
+
+    monkeypatch.setattr(formatter, "_route_stream", route_stream)
+
+    async def run():
+        events = []
+        async for event in formatter.stream_format_transcript("alpha\nbeta\ngamma", use_cache=False):
+            events.append(event)
+            if event["event"] == "chunk_end":
+                assert llm.format_progress.get(events[0]["job_id"]).cancel()
+        return events
+
+    events = asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    assert events[-1]["event"] == "error"
+    assert events[-1]["cancelled"]
+    assert events[-1]["chunk"] == 2
+    assert len(stopped) == 2
+    assert store.get_job(events[0]["job_id"])["status"] == "cancelled"
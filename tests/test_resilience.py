@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import utils.metrics as metrics
+import utils.resilience as resilience
+from utils.resilience import CircuitBreaker, TokenBucket, UpstreamGuard, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def use_clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after(" 2.5 ") == 2.5
+    assert parse_retry_after("-3") == 0.0
+
+
+def test_parse_retry_after_http_date():
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= parse_retry_after(format_datetime(later, usegmt=True)) <= 30
+    earlier = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert parse_retry_after(format_datetime(earlier, usegmt=True)) == 0.0
+
+
+def test_parse_retry_after_missing_or_invalid():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+
+
+def test_bucket_allows_a_burst_then_paces(monkeypatch):
+    clock = use_clock(monkeypatch)
+    bucket = TokenBucket(60)
+
+    assert all(bucket.reserve() == 0.0 for _ in range(60))
+    assert bucket.reserve() == 1.0
+    clock.now += 2
+    assert bucket.reserve() == 0.0
+
+
+def test_bucket_release_gives_the_slot_back(monkeypatch):
+    use_clock(monkeypatch)
+    bucket = TokenBucket(1)
+
+    assert bucket.reserve() == 0.0
+    bucket.release()
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 60.0
+
+
+def test_bucket_pause_holds_back_every_caller(monkeypatch):
+    clock = use_clock(monkeypatch)
+    bucket = TokenBucket(60)
+    bucket.pause(10)
+
+    assert bucket.reserve() == 10.0
+    clock.now += 4
+    assert bucket.reserve() == 6.0
+    clock.now += 6
+    assert bucket.reserve() == 0.0
+
+
+def test_breaker_opens_after_consecutive_failures(monkeypatch):
+    use_clock(monkeypatch)
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    assert not breaker.record_failure()
+    breaker.record_success()
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.retry_in() == 30
+
+
+def test_breaker_half_open_allows_one_trial(monkeypatch):
+    clock = use_clock(monkeypatch)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_breaker_failed_trial_reopens(monkeypatch):
+    clock = use_clock(monkeypatch)
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+
+    assert breaker.allow()
+    assert breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.retry_in() == 30
+
+
+def test_breaker_replaces_a_trial_that_never_reported(monkeypatch):
+    clock = use_clock(monkeypatch)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_guard_tracks_a_bounded_number_of_models(monkeypatch):
+    monkeypatch.setattr(resilience, "MAX_TRACKED_MODELS", 3)
+    monkeypatch.setattr(resilience, "MAX_TRACKED_BUCKETS", 3)
+    monkeypatch.setattr(resilience.Config, "LLM_REQUESTS_PER_MINUTE", 60)
+    guard = UpstreamGuard()
+
+    first = guard.breaker("model/0")
+    for i in range(1, 10):
+        guard.breaker(f"model/{i}")
+        guard.bucket(f"model/{i}", "key")
+    assert len(guard._breakers) == 3
+    assert len(guard._buckets) == 3
+    # Recently used models keep their state
+    assert guard.breaker("model/9") is guard.breaker("model/9")
+    assert guard.breaker("model/0") is not first
+
+
+def test_model_labels_are_bounded(monkeypatch):
+    monkeypatch.setattr(metrics, "MAX_MODEL_LABELS", 2)
+    monkeypatch.setattr(metrics, "_model_labels", set())
+
+    assert metrics.model_label("a/one") == "a/one"
+    assert metrics.model_label("a/two") == "a/two"
+    assert metrics.model_label("a/three") == metrics.OTHER_MODEL_LABEL
+    assert metrics.model_label("a/one") == "a/one"
+    assert metrics.model_label(None) == ""
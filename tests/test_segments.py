@@ -0,0 +1,81 @@
+import pytest
+
+from utils.segments import SegmentStore
+
+
+def timed_store():
+    """Captions every 10s, each on screen for 12s, so neighbours overlap by 2s"""
+    texts = [f"segment {i}" for i in range(10)]
+    return SegmentStore(texts, [i * 10.0 for i in range(10)], [12.0] * 10)
+
+
+def texts(store):
+    return store.texts()
+
+
+def test_columns_round_trip():
+    store = timed_store()
+    again = SegmentStore.from_columns(store.to_columns())
+    assert texts(again) == texts(store)
+    assert list(again.starts) == list(store.starts)
+    assert store.entries()[1] == {"text": "segment 1", "start": 10.0, "duration": 12.0}
+
+
+def test_no_range_returns_everything():
+    store = timed_store()
+    assert store.select() is store
+
+
+def test_time_range_includes_segments_on_screen_at_its_edges():
+    store = timed_store()
+    # Segment 2 (20-32s) is still showing at 31s; segment 5 starts at 50s, the exclusive end
+    assert texts(store.select(start_time=31, end_time=50)) == ["segment 2", "segment 3", "segment 4"]
+
+
+def test_time_range_boundaries():
+    store = timed_store()
+    # A segment that ended exactly at start_time is not included
+    assert texts(store.select(start_time=32, end_time=41))[0] == "segment 3"
+    # A segment starting exactly at start_time is included; one starting at end_time is not
+    assert texts(store.select(start_time=40, end_time=50)) == ["segment 3", "segment 4"]
+    assert texts(store.select(start_time=0, end_time=10)) == ["segment 0"]
+    assert texts(store.select(start_time=95)) == ["segment 9"]
+    assert len(store.select(end_time=1000)) == 10
+
+
+def test_segment_range_is_end_exclusive_and_clamped():
+    store = timed_store()
+    assert texts(store.select(start_segment=2, end_segment=4)) == ["segment 2", "segment 3"]
+    assert texts(store.select(start_segment=8, end_segment=100)) == ["segment 8", "segment 9"]
+    assert texts(store.select(end_segment=1)) == ["segment 0"]
+
+
+def test_time_and_segment_ranges_combine():
+    store = timed_store()
+    assert texts(store.select(start_time=15, start_segment=5, end_segment=7)) == ["segment 5", "segment 6"]
+
+
+def test_invalid_ranges_are_rejected():
+    store = timed_store()
+    with pytest.raises(ValueError):
+        store.select(start_time=50, end_time=50)
+    with pytest.raises(ValueError):
+        store.select(start_segment=3, end_segment=3)
+    with pytest.raises(ValueError):
+        store.select(start_segment=-1)
+    with pytest.raises(ValueError):
+        store.select(start_time=500)
+
+
+def test_untimed_transcripts_only_take_segment_ranges():
+    store = SegmentStore(["one", "two", "three"])
+    assert texts(store.select(start_segment=1)) == ["two", "three"]
+    with pytest.raises(ValueError):
+        store.select(start_time=0)
+
+
+def test_slice_keeps_texts_and_timings():
+    part = timed_store().slice(3, 5)
+    assert texts(part) == ["segment 3", "segment 4"]
+    assert list(part.starts) == [30.0, 40.0]
+    assert list(part.durations) == [12.0, 12.0]
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test-share")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.coalesced == 4
+    assert flight.in_flight() == 0
+
+
+def test_leader_error_reaches_every_waiter():
+    flight = SingleFlight("test-error")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == "upstream failed" for result in results)
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("test-keys")
+
+    async def run():
+        return await asyncio.gather(
+            flight.do("a", lambda: asyncio.sleep(0, result="a")),
+            flight.do("b", lambda: asyncio.sleep(0, result="b"))
+        )
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert flight.coalesced == 0
+
+
+def test_next_call_after_completion_runs_again():
+    flight = SingleFlight("test-again")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def run():
+        return await flight.do("key", fetch), await flight.do("key", fetch)
+
+    assert asyncio.run(run()) == (1, 2)
+
+
+def test_caller_that_gives_up_does_not_cancel_the_others():
+    flight = SingleFlight("test-cancel")
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        impatient = asyncio.ensure_future(flight.do("key", fetch))
+        patient = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        impatient.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_stream_followers_replay_from_the_start():
+    flight = SingleFlight("test-stream")
+    runs = []
+
+    async def produce():
+        runs.append(1)
+        for item in range(3):
+            await asyncio.sleep(0.005)
+            yield item
+
+    async def follow(delay):
+        await asyncio.sleep(delay)
+        return [item async for item in flight.stream("key", produce)]
+
+    async def run():
+        return await asyncio.gather(follow(0), follow(0.008))
+
+    assert asyncio.run(run()) == [[0, 1, 2], [0, 1, 2]]
+    assert len(runs) == 1
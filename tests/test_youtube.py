@@ -0,0 +1,45 @@
+import os
+
+# Keep the caches off disk; must be set before config is imported
+os.environ["CACHE_DB_PATH"] = ""
+
+from utils.youtube import CaptionTrack, pick_track
+
+EN_MANUAL = CaptionTrack("en", "English", False)
+EN_GENERATED = CaptionTrack("en", "English (auto-generated)", True)
+EN_GB_MANUAL = CaptionTrack("en-GB", "English (United Kingdom)", False)
+DE_MANUAL = CaptionTrack("de", "German", False)
+JA_GENERATED = CaptionTrack("ja", "Japanese (auto-generated)", True)
+
+
+def test_manual_beats_generated():
+    assert pick_track([EN_GENERATED, EN_MANUAL], ["en"]) == EN_MANUAL
+
+
+def test_exact_code_beats_regional_variant():
+    assert pick_track([EN_GB_MANUAL, EN_MANUAL], ["en"]) == EN_MANUAL
+    assert pick_track([EN_MANUAL, EN_GB_MANUAL], ["en-GB"]) == EN_GB_MANUAL
+
+
+def test_regional_variant_matches_either_way():
+    assert pick_track([EN_GB_MANUAL, DE_MANUAL], ["en"]) == EN_GB_MANUAL
+    assert pick_track([EN_MANUAL, DE_MANUAL], ["en-US"]) == EN_MANUAL
+    assert pick_track([CaptionTrack("EN-gb", "English", False)], ["en-GB"]).language_code == "EN-gb"
+
+
+def test_regional_manual_beats_exact_generated():
+    assert pick_track([EN_GENERATED, EN_GB_MANUAL], ["en"]) == EN_GB_MANUAL
+
+
+def test_earlier_language_wins_even_if_only_generated():
+    assert pick_track([DE_MANUAL, JA_GENERATED], ["ja", "de"]) == JA_GENERATED
+
+
+def test_falls_back_to_first_manual_then_first_generated():
+    assert pick_track([JA_GENERATED, DE_MANUAL], ["fr"]) == DE_MANUAL
+    assert pick_track([JA_GENERATED, EN_GENERATED], ["fr"]) == JA_GENERATED
+    assert pick_track([JA_GENERATED, DE_MANUAL], []) == DE_MANUAL
+
+
+def test_no_tracks():
+    assert pick_track([], ["en"]) is None
@@ -0,0 +1,186 @@
+"""
+Admission control for LLM formatting requests.
+
+Each admitted request holds one slot until its response (or stream) ends.
+Up to FORMAT_MAX_CONCURRENT requests run at once and at most
+FORMAT_MAX_PER_CLIENT of them (running or waiting) may come from one client.
+Requests beyond the global limit wait in a FIFO queue of FORMAT_MAX_QUEUE for
+up to FORMAT_QUEUE_TIMEOUT seconds. Anything else is turned away at once with a
+Retry-After estimate, so an overloaded worker answers quickly instead of
+piling up upstream connections.
+"""
+import math
+import time
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+from config import Config
+from utils.metrics import REGISTRY, CallbackMetric, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest request in the moving average of slot hold times
+HOLD_TIME_ALPHA = 0.2
+# Assumed hold time (seconds) before any request has finished
+INITIAL_HOLD_TIME = 10.0
+
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "verbatim_format_rejected_total",
+    "Formatting requests turned away by admission control, by reason (client_limit, queue_full or queue_timeout)",
+    ("reason",)
+))
+ADMISSION_WAIT = REGISTRY.register(Histogram(
+    "verbatim_format_queue_wait_seconds",
+    "Time formatting requests spent queued for a slot, by outcome (admitted or timeout)",
+    ("outcome",)
+))
+
+
+class Overloaded(Exception):
+    """A request turned away: 429 for a client over its limit, 503 when the server is full"""
+
+    def __init__(self, status_code: int, reason: str, message: str, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def client_key(api_key: Optional[str], host: Optional[str]) -> str:
+    """Identify a client by its API key when it sends one, otherwise by address"""
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return "ip:" + (host or "unknown")
+
+
+class AdmissionController:
+    """
+    Global and per-client concurrency limits with a bounded FIFO wait queue.
+    A limit of 0 disables it.
+    """
+
+    def __init__(self, max_concurrent: int, max_per_client: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_per_client = max_per_client
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        # Requests running or queued, per client
+        self._clients: Dict[str, int] = {}
+        self._hold_time = INITIAL_HOLD_TIME
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free for a new request"""
+        slots = max(1, self.max_concurrent)
+        return max(1, math.ceil(self._hold_time * (self.queued + 1) / slots))
+
+    def _reject(self, status_code: int, reason: str, message: str) -> Overloaded:
+        ADMISSION_REJECTED.inc(reason=reason)
+        retry_after = self.retry_after()
+        logger.warning(f"Formatting request rejected ({reason}); {self.active} running, {self.queued} queued")
+        return Overloaded(status_code, reason, f"{message} Please try again in {retry_after}s.", retry_after)
+
+    async def acquire(self, client: str) -> float:
+        """
+        Wait for a slot and return the time of admission, to be passed to
+        release(). Raises Overloaded when the request is turned away.
+        """
+        if self.max_per_client > 0 and self._clients.get(client, 0) >= self.max_per_client:
+            raise self._reject(
+                429, "client_limit",
+                f"Too many formatting requests at once (at most {self.max_per_client} per client)."
+            )
+
+        self._clients[client] = self._clients.get(client, 0) + 1
+        try:
+            await self._take_slot()
+        except BaseException:
+            self._leave(client)
+            raise
+        return time.monotonic()
+
+    async def _take_slot(self) -> None:
+        if self.max_concurrent <= 0 or (self.active < self.max_concurrent and not self._waiters):
+            self.active += 1
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject(503, "queue_full", "The server is busy formatting other transcripts.")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done():
+                # The slot was handed over just as the wait ended; pass it on
+                self._hand_over()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            ADMISSION_WAIT.observe(time.monotonic() - queued_at, outcome="timeout")
+            raise self._reject(503, "queue_timeout", "Timed out waiting for the server to free up.")
+        ADMISSION_WAIT.observe(time.monotonic() - queued_at, outcome="admitted")
+
+    def _leave(self, client: str) -> None:
+        remaining = self._clients.get(client, 0) - 1
+        if remaining > 0:
+            self._clients[client] = remaining
+        else:
+            self._clients.pop(client, None)
+
+    def release(self, client: str, admitted_at: float) -> None:
+        """Give back the slot taken by acquire()"""
+        held = time.monotonic() - admitted_at
+        self._hold_time += HOLD_TIME_ALPHA * (held - self._hold_time)
+        self._leave(client)
+        self._hand_over()
+
+    def _hand_over(self) -> None:
+        """Pass a freed slot to the longest-waiting request, or return it to the pool"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_per_client": self.max_per_client,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "clients": len(self._clients),
+            "retry_after": self.retry_after()
+        }
+
+
+format_admission = AdmissionController(
+    Config.FORMAT_MAX_CONCURRENT,
+    Config.FORMAT_MAX_PER_CLIENT,
+    Config.FORMAT_MAX_QUEUE,
+    Config.FORMAT_QUEUE_TIMEOUT
+)
+
+REGISTRY.register(CallbackMetric(
+    "verbatim_format_requests",
+    "Formatting requests holding a slot (running) or waiting for one (queued)",
+    "gauge",
+    ("state",),
+    lambda: (
+        (("running",), format_admission.active),
+        (("queued",), format_admission.queued)
+    )
+))
@@ -0,0 +1,217 @@
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from config import Config
+from utils.admission import Overloaded, client_key, format_admission
+from utils.llm import LLMFormatter
+from utils.preformat import preformat_transcript
+from utils.youtube import YouTubeTranscriptFetcher
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItem:
+    """One video in a batch job and its progress through the fetch and format stages"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.video_id: Optional[str] = None
+        self.status = "queued"  # queued -> fetching -> fetched -> formatting -> done | failed
+        self.transcript: Optional[str] = None
+        self.formatted_transcript: Optional[str] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self, include_results: bool = True) -> Dict[str, Any]:
+        item = {
+            "url": self.url,
+            "video_id": self.video_id,
+            "status": self.status,
+            "error": self.error,
+        }
+        if include_results:
+            item["transcript"] = self.transcript
+            item["formatted_transcript"] = self.formatted_transcript
+        return item
+
+
+class BatchJob:
+    """A list of videos fetched (and optionally formatted) in the background"""
+
+    def __init__(self, urls: List[str], model: Optional[str], api_key: Optional[str],
+                 transcript_format: str, format_transcripts: bool):
+        self.id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.items = [BatchItem(url) for url in urls]
+        self.model = model
+        self.api_key = api_key  # kept in memory only, never returned
+        self.transcript_format = transcript_format
+        self.format_transcripts = format_transcripts
+
+    @property
+    def status(self) -> str:
+        if all(item.status in ("done", "failed") for item in self.items):
+            return "completed"
+        if all(item.status == "queued" for item in self.items):
+            return "queued"
+        return "running"
+
+    def to_dict(self, include_results: bool = True) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "total": len(self.items),
+            "counts": counts,
+            "items": [item.to_dict(include_results) for item in self.items],
+        }
+
+
+class BatchJobManager:
+    """
+    Runs batch jobs on two bounded worker pools: fetch workers pull videos off
+    the fetch queue and hand successful transcripts to the format queue,
+    where format workers run the LLM. Throughput scales with the worker
+    counts rather than with how fast a client loops over the API. Format
+    workers take an admission slot per transcript, so batch formatting counts
+    against FORMAT_MAX_CONCURRENT like any /api/format request.
+    """
+
+    def __init__(self, youtube_fetcher: YouTubeTranscriptFetcher):
+        self.youtube_fetcher = youtube_fetcher
+        self.jobs: Dict[str, BatchJob] = {}
+        self._fetch_queue: Optional[asyncio.Queue] = None
+        self._format_queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Start the worker pools (called on application startup)"""
+        self._fetch_queue = asyncio.Queue()
+        self._format_queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._fetch_worker(), name=f"batch-fetch-{i}")
+            for i in range(max(1, Config.BATCH_FETCH_WORKERS))
+        ] + [
+            asyncio.create_task(self._format_worker(), name=f"batch-format-{i}")
+            for i in range(max(1, Config.BATCH_FORMAT_WORKERS))
+        ]
+        logger.info(
+            f"Started batch workers ({Config.BATCH_FETCH_WORKERS} fetch, {Config.BATCH_FORMAT_WORKERS} format)"
+        )
+
+    async def stop(self) -> None:
+        """Cancel the worker pools (called on application shutdown)"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def pending_items(self) -> int:
+        if self._fetch_queue is None or self._format_queue is None:
+            return 0
+        return self._fetch_queue.qsize() + self._format_queue.qsize()
+
+    def submit(self, urls: List[str], model: Optional[str], api_key: Optional[str],
+               transcript_format: str, format_transcripts: bool) -> BatchJob:
+        """Queue a new job. Raises ValueError if the batch is too large or the queue is full."""
+        if self._fetch_queue is None:
+            raise ValueError("Batch workers are not running")
+        if not urls:
+            raise ValueError("No YouTube URLs provided")
+        if len(urls) > Config.BATCH_MAX_URLS:
+            raise ValueError(f"Too many URLs. Maximum is {Config.BATCH_MAX_URLS} per batch.")
+        if self.pending_items() + len(urls) > Config.BATCH_MAX_PENDING:
+            raise ValueError("Batch queue is full. Please try again later.")
+
+        self._prune()
+        job = BatchJob(urls, model, api_key, transcript_format, format_transcripts)
+        self.jobs[job.id] = job
+        for item in job.items:
+            self._fetch_queue.put_nowait((job, item))
+        logger.info(f"Queued batch job {job.id} with {len(urls)} videos")
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        return self.jobs.get(job_id)
+
+    def _prune(self) -> None:
+        """Forget completed jobs older than BATCH_JOB_TTL"""
+        cutoff = time.time() - Config.BATCH_JOB_TTL
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.created_at < cutoff and job.status == "completed"]:
+            del self.jobs[job_id]
+
+    async def _fetch_worker(self) -> None:
+        while True:
+            job, item = await self._fetch_queue.get()
+            try:
+                await self._fetch(job, item)
+            except Exception as e:
+                logger.error(f"Batch job {job.id}: unexpected error fetching {item.url}: {e}")
+                item.status, item.error = "failed", f"Unexpected error: {str(e)}"
+            finally:
+                self._fetch_queue.task_done()
+
+    async def _fetch(self, job: BatchJob, item: BatchItem) -> None:
+        item.video_id = self.youtube_fetcher.extract_video_id(item.url)
+        if not item.video_id:
+            item.status, item.error = "failed", "Invalid YouTube URL. Please provide a valid YouTube video URL."
+            return
+
+        item.status = "fetching"
+        transcript, error = await self.youtube_fetcher.get_transcript_async(item.video_id, job.transcript_format)
+        if error:
+            item.status, item.error = "failed", error
+            return
+
+        item.transcript = transcript
+        if not job.format_transcripts:
+            item.status = "done"
+            return
+        item.status = "fetched"
+        self._format_queue.put_nowait((job, item))
+
+    async def _format_worker(self) -> None:
+        while True:
+            job, item = await self._format_queue.get()
+            try:
+                # Counted against the job's API key like its direct requests; keyless batches share a client
+                client = client_key(job.api_key, "batch")
+                admitted_at = await self._admit(client)
+                try:
+                    await self._format(job, item)
+                finally:
+                    format_admission.release(client, admitted_at)
+            except Exception as e:
+                logger.error(f"Batch job {job.id}: unexpected error formatting {item.url}: {e}")
+                item.status, item.error = "failed", f"Unexpected error: {str(e)}"
+            finally:
+                self._format_queue.task_done()
+
+    @staticmethod
+    async def _admit(client: str) -> float:
+        """Wait for a formatting slot; background work waits out overload instead of failing"""
+        while True:
+            try:
+                return await format_admission.acquire(client)
+            except Overloaded as e:
+                logger.info(f"Batch formatting waiting {e.retry_after}s for a slot ({e.reason})")
+                await asyncio.sleep(e.retry_after)
+
+    async def _format(self, job: BatchJob, item: BatchItem) -> None:
+        item.status = "formatting"
+        formatter = LLMFormatter()
+        if job.api_key:
+            formatter.api_key = job.api_key
+        if job.model:
+            formatter.model = job.model
+        transcript = preformat_transcript(item.transcript) if Config.PREFORMAT_ENABLED else item.transcript
+        formatted_text, error = await formatter.format_transcript(transcript)
+        if error:
+            item.status, item.error = "failed", error
+        else:
+            item.status, item.formatted_transcript = "done", formatted_text
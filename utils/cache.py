@@ -0,0 +1,270 @@
+import os
+import sys
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any
+from utils.metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    In-process LRU cache of strings with a per-entry time-to-live, bounded
+    both by entry count and by the memory its values take (max_bytes, 0 = no limit)
+    """
+
+    def __init__(self, max_entries: int, ttl: float, max_bytes: int = 0):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, size = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        size = sys.getsizeof(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            if self.max_bytes and size > self.max_bytes:
+                # Larger than the whole budget; leave it to the disk tier
+                return
+            self._entries[key] = (value, expires_at, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+                self.bytes -= self._entries.popitem(last=False)[1][2]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    Persistent cache of strings in a SQLite table.
+    WAL mode lets every uvicorn worker share the same file. When the table
+    grows past max_bytes the least recently used entries are evicted.
+    Reads and writes use separate connections, so a read never waits for
+    the write lock (which another worker may hold for up to 5s); a read's
+    access-time update is queued on the writer thread. Calls still block,
+    so async code goes through TieredCache.aget/set_in_background, which run
+    them on this cache's reader and writer threads.
+    """
+
+    def __init__(self, path: str, table: str, max_bytes: int, ttl: float):
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        # One thread each: calls on a connection are serialized by its lock anyway
+        self.reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"cache-{table}-read")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"cache-{table}-write")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+        self._reader_conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        # Running total of the table's size, so a write need not sum the table. Other
+        # workers write to the same file, so it is recounted before anything is evicted.
+        self._bytes = self._count_bytes()
+
+    def _count_bytes(self) -> int:
+        return self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._read_lock:
+            row = self._reader_conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        self.writer.submit(self._touch, key, now, expires_at <= now)
+        return None if expires_at <= now else value
+
+    def _touch(self, key: str, now: float, expired: bool) -> None:
+        """Record a read for LRU eviction, or drop the entry it found expired"""
+        try:
+            with self._lock:
+                if expired:
+                    row = self._conn.execute(
+                        f"SELECT size FROM {self.table} WHERE key = ? AND expires_at <= ?", (key, now)
+                    ).fetchone()
+                    if row is not None:
+                        self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                        self._bytes -= row[0]
+                else:
+                    self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"{self.table} cache access-time update failed: {e}")
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            previous = self._conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, expires_at, now)
+            )
+            self._bytes += size - (previous[0] if previous else 0)
+            if self._bytes > self.max_bytes:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+        total = self._bytes = self._count_bytes()
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        stale_keys = []
+        for key, size in self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed_at ASC"):
+            stale_keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale_keys)
+        self._bytes = self.max_bytes + excess
+        logger.info(f"Evicted {len(stale_keys)} entries from {self.table} cache")
+
+    def close(self) -> None:
+        self.reader.shutdown(wait=True)
+        self.writer.shutdown(wait=True)
+        with self._read_lock:
+            self._reader_conn.close()
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """
+    Two-tier cache: an in-process LRU in front of an optional SQLite tier.
+    Disk hits are promoted into memory. Hit/miss counters are exposed via stats().
+    get/set block on the disk tier; from the event loop use aget and
+    set_in_background, which read on the disk tier's reader thread and write
+    on its writer thread without waiting.
+    """
+
+    def __init__(self, name: str, memory: LRUCache, disk: Optional[SQLiteCache] = None):
+        self.name = name
+        self.memory = memory
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        return self._disk_get(key) if self.disk is not None else self._miss()
+
+    async def aget(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        if self.disk is None:
+            return self._miss()
+        return await asyncio.get_running_loop().run_in_executor(self.disk.reader, self._disk_get, key)
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        try:
+            value = self.disk.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache disk read failed: {e}")
+            value = None
+        if value is None:
+            return self._miss()
+        self.disk_hits += 1
+        self.memory.set(key, value)
+        return value
+
+    def _miss(self) -> None:
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self._disk_set(key, value)
+
+    def set_in_background(self, key: str, value: str) -> None:
+        """set() for the event loop: the value is in memory at once and written to disk in the background"""
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.writer.submit(self._disk_set, key, value)
+
+    def _disk_set(self, key: str, value: str) -> None:
+        try:
+            self.disk.set(key, value)
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache disk write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "disk_enabled": self.disk is not None,
+        }
+
+
+def build_tiered_cache(name: str, max_entries: int, ttl: float, path: str, max_bytes: int,
+                       memory_max_bytes: int = 0) -> TieredCache:
+    """
+    Create a TieredCache, storing the disk tier in table `name` of `path`.
+    max_bytes limits the disk tier and memory_max_bytes the in-process tier.
+    An empty path, or a path that cannot be opened (e.g. a read-only
+    serverless filesystem), gives a memory-only cache.
+    """
+    disk = None
+    if path:
+        try:
+            disk = SQLiteCache(path, name, max_bytes, ttl)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not open {name} cache at {path}, using memory only: {e}")
+    cache = TieredCache(name, LRUCache(max_entries, ttl, memory_max_bytes), disk)
+    register_cache(cache)
+    return cache
@@ -0,0 +1,255 @@
+import re
+import math
+import logging
+from difflib import SequenceMatcher
+from typing import Dict, List, NamedTuple, Optional, Sequence
+from utils.transcript import parse_segments, to_prompt_text
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLimits(NamedTuple):
+    """Token limits of a model: total context window and maximum completion length"""
+    context_tokens: int
+    max_output_tokens: int
+
+
+# Limits as listed by OpenRouter. Free variants share the limits of the base
+# model unless listed separately.
+MODEL_LIMITS: Dict[str, ModelLimits] = {
+    "anthropic/claude-3.5-sonnet": ModelLimits(200000, 8192),
+    "anthropic/claude-3-haiku": ModelLimits(200000, 4096),
+    "openai/gpt-4o-mini": ModelLimits(128000, 16384),
+    "openai/gpt-oss-20b:free": ModelLimits(131072, 8192),
+    "z-ai/glm-4.5-air:free": ModelLimits(131072, 8192),
+    "qwen/qwen3-coder:free": ModelLimits(262144, 8192),
+    "moonshotai/kimi-k2:free": ModelLimits(32768, 8192),
+    "google/gemma-3n-e2b-it:free": ModelLimits(8192, 2048),
+    "deepseek/deepseek-r1-0528:free": ModelLimits(163840, 8192),
+}
+
+# Used for models we know nothing about; matches the old hard-coded max_tokens
+DEFAULT_LIMITS = ModelLimits(32768, 4000)
+
+# Conservative average for English (and other Latin-script) text across common tokenizers
+CHARS_PER_TOKEN = 3.5
+# Other alphabets (Greek, Cyrillic, Hebrew, Arabic, Indic, Thai...) split into more tokens
+NON_LATIN_CHARS_PER_TOKEN = 2.0
+# Formatted output is the input text plus punctuation and paragraph breaks
+OUTPUT_EXPANSION = 1.2
+# Fraction of each limit we allow ourselves to plan for
+SAFETY_MARGIN = 0.9
+# Once a chunk is this full, close it at the next segment that ends a sentence
+SOFT_FILL = 0.85
+
+SENTENCE_ENDINGS = (".", "!", "?", "\u3002", "\uff01", "\uff1f")
+# CJK sentences end with a full-width mark and no space after it
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|(?<=[\u3002\uff01\uff1f])\s*')
+# Scripts written without spaces (CJK, kana, hangul, full-width forms): about one token per character
+_WIDE_CHARS = re.compile(r'[\u2e80-\ua4cf\uac00-\ud7af\uf900-\ufaff\uff00-\uffef\U00020000-\U0003ffff]')
+_NON_LATIN_CHARS = re.compile(r'[\u0370-\u1fff]')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text without a tokenizer, by script"""
+    if not text:
+        return 0
+    if text.isascii():
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    wide = len(_WIDE_CHARS.findall(text))
+    non_latin = len(_NON_LATIN_CHARS.findall(text))
+    latin = len(text) - wide - non_latin
+    return math.ceil(latin / CHARS_PER_TOKEN + non_latin / NON_LATIN_CHARS_PER_TOKEN + wide)
+
+
+def get_model_limits(model: Optional[str]) -> ModelLimits:
+    """Look up a model's limits, falling back to its non-free variant and then the default"""
+    if not model:
+        return DEFAULT_LIMITS
+    if model in MODEL_LIMITS:
+        return MODEL_LIMITS[model]
+    base_model = model.split(":", 1)[0]
+    for known, limits in MODEL_LIMITS.items():
+        if known.split(":", 1)[0] == base_model:
+            return limits
+    return DEFAULT_LIMITS
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text after sentence-ending punctuation"""
+    return [sentence for sentence in _SENTENCE_END.split(text) if sentence]
+
+
+def _char_tokens(char: str) -> float:
+    """The share of a token one character costs in estimate_tokens"""
+    if _WIDE_CHARS.match(char):
+        return 1.0
+    if _NON_LATIN_CHARS.match(char):
+        return 1 / NON_LATIN_CHARS_PER_TOKEN
+    return 1 / CHARS_PER_TOKEN
+
+
+def split_by_budget(text: str, budget: int) -> List[str]:
+    """Cut text with no spaces to break at (such as CJK) into pieces of at most budget tokens"""
+    pieces = []
+    start = 0
+    tokens = 0.0
+    for index, char in enumerate(text):
+        char_tokens = _char_tokens(char)
+        if index > start and tokens + char_tokens > budget:
+            pieces.append(text[start:index])
+            start, tokens = index, 0.0
+        tokens += char_tokens
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+class TranscriptChunker:
+    """
+    Split a raw transcript into chunks that fit a model's limits.
+
+    Each chunk is sized so that both its prompt (instructions + transcript +
+    planned output) fits the context window and its expected formatted output
+    fits the model's completion limit. Chunks break between segments,
+    preferring segments that end a sentence; a segment too large for one
+    chunk is broken at sentences, then words.
+    """
+
+    def __init__(self, model: Optional[str], prompt_overhead_tokens: int = 0, limits: Optional[ModelLimits] = None):
+        self.model = model
+        self.limits = limits or get_model_limits(model)
+        self.prompt_overhead_tokens = prompt_overhead_tokens
+
+    @property
+    def output_budget(self) -> int:
+        """Tokens of transcript text whose formatted output fits one completion"""
+        return int(self.limits.max_output_tokens * SAFETY_MARGIN / OUTPUT_EXPANSION)
+
+    @property
+    def input_budget(self) -> int:
+        """Tokens of serialized transcript that fit the context next to the prompt and output"""
+        available = self.limits.context_tokens * SAFETY_MARGIN
+        return max(1, int(available - self.prompt_overhead_tokens - self.limits.max_output_tokens))
+
+    def split(self, raw_transcript: str, previous_chunks: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Split a raw transcript (any supported format) into compact chunks, one segment per line.
+        With previous_chunks (the chunks of an earlier version of the transcript),
+        every previous chunk whose lines are all still present, unchanged and in
+        order, is kept as it was; only the edited regions are grouped into new chunks.
+        """
+        segments = self._split_oversized(parse_segments(raw_transcript))
+        if previous_chunks:
+            chunks = self._split_reusing(to_prompt_text(segments).split("\n"), previous_chunks)
+        else:
+            chunks = [to_prompt_text(group) for group in self._group(segments)]
+        logger.info(
+            f"Split transcript into {len(chunks)} chunks for {self.model} "
+            f"(output budget {self.output_budget} tokens, input budget {self.input_budget} tokens)"
+        )
+        return chunks
+
+    def _split_reusing(self, lines: List[str], previous_chunks: Sequence[str]) -> List[str]:
+        """Chunk prompt lines, keeping the previous chunks that survive unchanged"""
+        previous_lines = [chunk.split("\n") for chunk in previous_chunks]
+        matcher = SequenceMatcher(None, [line for chunk in previous_lines for line in chunk], lines, autojunk=False)
+        # Old line index -> new line index, for lines in unchanged runs
+        moved: Dict[int, int] = {}
+        for old, new, size in matcher.get_matching_blocks():
+            for offset in range(size):
+                moved[old + offset] = new + offset
+
+        # New line index where a kept chunk starts -> (chunk, index after its last line)
+        kept: Dict[int, tuple] = {}
+        position = 0
+        for chunk, chunk_lines in zip(previous_chunks, previous_lines):
+            first = moved.get(position)
+            if first is not None and all(moved.get(position + k) == first + k for k in range(len(chunk_lines))):
+                kept[first] = (chunk, first + len(chunk_lines))
+            position += len(chunk_lines)
+
+        chunks: List[str] = []
+        edited: List[str] = []
+        index = 0
+        while index < len(lines):
+            if index in kept:
+                chunks.extend(to_prompt_text(group) for group in self._group(edited))
+                edited = []
+                chunk, index = kept[index]
+                chunks.append(chunk)
+            else:
+                edited.append(lines[index])
+                index += 1
+        chunks.extend(to_prompt_text(group) for group in self._group(edited))
+        logger.info(f"Kept {len(kept)} of {len(previous_chunks)} previous chunks unchanged")
+        return chunks
+
+    def _split_oversized(self, segments: List[str]) -> List[str]:
+        """Break any segment that would not fit a chunk on its own into sentence-sized pieces"""
+        result = []
+        for text in segments:
+            if estimate_tokens(text) <= self.output_budget:
+                result.append(text)
+            else:
+                result.extend(self._split_text(text))
+        return result
+
+    def _split_text(self, text: str) -> List[str]:
+        """
+        Split text into pieces within budget, at sentences, then words if a
+        sentence is still too long, then characters for a word (or a CJK
+        sentence) that is still too long
+        """
+        pieces = []
+        for sentence in split_sentences(text):
+            if estimate_tokens(sentence) <= self.output_budget:
+                pieces.append(sentence)
+                continue
+            words = sentence.split(" ")
+            current: List[str] = []
+            for word in words:
+                if current and estimate_tokens(" ".join(current + [word])) > self.output_budget:
+                    pieces.append(" ".join(current))
+                    current = []
+                if estimate_tokens(word) > self.output_budget:
+                    *cut, word = split_by_budget(word, self.output_budget)
+                    pieces.extend(cut)
+                current.append(word)
+            if current:
+                pieces.append(" ".join(current))
+        return pieces
+
+    def _group(self, segments: List[str]) -> List[List[str]]:
+        """Greedily group segments so each group stays within both budgets"""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        output_tokens = 0
+        input_tokens = 0
+
+        for text in segments:
+            # Tokens of the text, before the output expansion already built into output_budget
+            item_output = estimate_tokens(text)
+            # Segments are sent one per line, so the newline costs a token as well
+            item_input = item_output + 1
+
+            over_budget = (
+                output_tokens + item_output > self.output_budget
+                or input_tokens + item_input > self.input_budget
+            )
+            if current and over_budget:
+                groups.append(current)
+                current, output_tokens, input_tokens = [], 0, 0
+
+            current.append(text)
+            output_tokens += item_output
+            input_tokens += item_input
+
+            # Past the soft limit, prefer to close the chunk at the end of a sentence
+            if output_tokens >= self.output_budget * SOFT_FILL and text.rstrip().endswith(SENTENCE_ENDINGS):
+                groups.append(current)
+                current, output_tokens, input_tokens = [], 0, 0
+
+        if current:
+            groups.append(current)
+        return groups
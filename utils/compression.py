@@ -0,0 +1,139 @@
+import gzip
+import logging
+from typing import List, Optional, Sequence, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import Message
+from utils.metrics import COMPRESSED_BYTES, observe_stage
+
+logger = logging.getLogger(__name__)
+
+try:
+    # brotli (in requirements.txt) adds "br", which is noticeably smaller than gzip for text; without it only gzip is offered
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types worth compressing; images other than SVG are already compressed
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+)
+
+# Compression levels: maximum for assets compressed once at startup,
+# moderate for responses compressed on every request
+STATIC_LEVELS = {"br": 11, "gzip": 9}
+DYNAMIC_LEVELS = {"br": 4, "gzip": 5}
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Content codings this process can produce, most preferred first"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Encode data with "br" or "gzip" (level defaults to DYNAMIC_LEVELS)"""
+    level = DYNAMIC_LEVELS[encoding] if level is None else level
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    if encoding == "gzip":
+        # mtime=0 keeps the output deterministic, so identical bodies compress identically
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    raise ValueError(f"Unsupported content coding: {encoding}")
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: Optional[Sequence[str]] = None) -> Optional[str]:
+    """
+    Pick the content coding to send for an Accept-Encoding header: the one the
+    client weights highest, ties going to the first in `available`. Returns
+    None when the response should be sent uncompressed.
+    """
+    if not accept_encoding:
+        return None
+    available = available_encodings() if available is None else available
+
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    best, best_weight = None, 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing the responses of the given paths with the
+    best coding the client accepts, once the body reaches minimum_size bytes.
+    Bodies are buffered until complete, so only list paths that answer with
+    a complete body rather than a stream.
+    """
+
+    def __init__(self, app, paths: Sequence[str], minimum_size: int = 1024):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start["headers"])
+            if (
+                len(body) >= self.minimum_size
+                and "content-encoding" not in headers
+                and is_compressible(headers.get("content-type", ""))
+            ):
+                with observe_stage("compression"):
+                    compressed = compress(body, encoding)
+                COMPRESSED_BYTES.inc(len(body), encoding=encoding, stage="original")
+                COMPRESSED_BYTES.inc(len(compressed), encoding=encoding, stage="compressed")
+                body = compressed
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,44 @@
+import json
+from typing import Any
+from fastapi.responses import JSONResponse
+
+try:
+    # orjson (in requirements.txt) serializes several times faster than the stdlib, which is the fallback
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """
+    Serialize to a JSON string without escaping non-ASCII text. indent=True
+    gives the two-space layout of json.dumps(indent=2); the output is the
+    same whichever serializer is used.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+        except TypeError:
+            pass  # e.g. lone surrogates or non-string keys, which the stdlib accepts
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(content)
+            except TypeError:
+                pass
+        return super().render(content)
@@ -0,0 +1,65 @@
+import logging
+from typing import Optional
+import httpx
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Shared connection pool for upstream (OpenRouter) traffic. It is opened and
+# closed by the FastAPI lifespan; get_http_client() creates it on demand so the
+# formatter still works when used outside the app (scripts, REPL).
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional 'h2' package (pip install httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_client() -> httpx.AsyncClient:
+    """Create the pooled client from the configured limits"""
+    http2 = Config.HTTP2_ENABLED
+    if http2 and not _http2_available():
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=Config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+    )
+    logger.info(
+        f"Opening HTTP connection pool (max_connections={Config.HTTP_MAX_CONNECTIONS}, "
+        f"keepalive={Config.HTTP_MAX_KEEPALIVE_CONNECTIONS}, http2={http2})"
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        http2=http2,
+        timeout=Config.REQUEST_TIMEOUT,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, opening it if needed"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def open_http_client() -> httpx.AsyncClient:
+    """Open the shared client (called on application startup)"""
+    return get_http_client()
+
+
+async def close_http_client() -> None:
+    """Close the shared client and its connections (called on application shutdown)"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        logger.info("Closing HTTP connection pool")
+        await _client.aclose()
+    _client = None
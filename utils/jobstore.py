@@ -0,0 +1,237 @@
+import os
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# A running job whose heartbeat is older than this many intervals lost its worker
+STALE_HEARTBEATS = 4
+
+
+class FormatJobStore:
+    """
+    Durable record of multi-chunk formatting jobs in SQLite.
+    Every chunk's output is checkpointed as soon as it completes, so a job
+    that fails or is interrupted (including by a server restart) can resume
+    from the chunks that are still missing.
+    The file is shared by every worker, so each running job records the worker
+    that owns it and a heartbeat the owner refreshes; only jobs whose
+    heartbeat went stale are taken to be interrupted.
+    Calls block for up to 5s while another worker holds the write lock, so
+    async code uses the a* variants, which run them on the store's own thread.
+    """
+
+    def __init__(self, path: str, ttl: float, heartbeat_interval: float = 30.0):
+        self.path = path
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        # Identifies this process as the owner of the jobs it runs
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        # One thread: calls on the connection are serialized by its lock anyway, and in order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="format-jobs")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS format_jobs ("
+            "id TEXT PRIMARY KEY, model TEXT NOT NULL, status TEXT NOT NULL, "
+            "total_chunks INTEGER NOT NULL, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS format_job_chunks ("
+            "job_id TEXT NOT NULL, idx INTEGER NOT NULL, input TEXT NOT NULL, output TEXT, "
+            "PRIMARY KEY (job_id, idx))"
+        )
+        # Files created before jobs had owners
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(format_jobs)")}
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE format_jobs ADD COLUMN owner TEXT")
+        if "heartbeat_at" not in columns:
+            self._conn.execute("ALTER TABLE format_jobs ADD COLUMN heartbeat_at REAL")
+
+    @property
+    def stale_after(self) -> float:
+        """Seconds without a heartbeat after which a running job counts as interrupted"""
+        return self.heartbeat_interval * STALE_HEARTBEATS
+
+    def create_job(self, model: str, chunks: List[str]) -> str:
+        """Record a new running job with its chunk inputs and return its ID"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO format_jobs (id, model, status, total_chunks, created_at, updated_at, owner, heartbeat_at) "
+                "VALUES (?, ?, 'running', ?, ?, ?, ?, ?)",
+                (job_id, model, len(chunks), now, now, self.owner, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO format_job_chunks (job_id, idx, input) VALUES (?, ?, ?)",
+                [(job_id, i, chunk) for i, chunk in enumerate(chunks, 1)]
+            )
+            self._conn.execute("COMMIT")
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Load a job with its chunk inputs and the outputs completed so far (keyed by chunk number)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, model, status, total_chunks, error, created_at, updated_at FROM format_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            chunk_rows = self._conn.execute(
+                "SELECT idx, input, output FROM format_job_chunks WHERE job_id = ? ORDER BY idx", (job_id,)
+            ).fetchall()
+
+        return {
+            "job_id": row[0],
+            "model": row[1],
+            "status": row[2],
+            "total_chunks": row[3],
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6],
+            "chunks": [chunk_input for _, chunk_input, _ in chunk_rows],
+            "outputs": {idx: output for idx, _, output in chunk_rows if output is not None},
+        }
+
+    def save_chunk(self, job_id: str, chunk_number: int, output: str) -> None:
+        """Checkpoint one completed chunk"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE format_job_chunks SET output = ? WHERE job_id = ? AND idx = ?",
+                (output, job_id, chunk_number)
+            )
+            now = time.time()
+            self._conn.execute("UPDATE format_jobs SET updated_at = ?, heartbeat_at = ? WHERE id = ?", (now, now, job_id))
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE format_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def claim(self, job_id: str) -> bool:
+        """
+        Mark a stored job running in this process, to resume it. False if
+        another run of it (in any worker) is still alive.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE format_jobs SET status = 'running', error = NULL, owner = ?, heartbeat_at = ?, updated_at = ? "
+                "WHERE id = ? AND NOT (status = 'running' AND COALESCE(heartbeat_at, 0) >= ?)",
+                (self.owner, now, now, job_id, now - self.stale_after)
+            )
+        return cursor.rowcount > 0
+
+    def heartbeat(self) -> None:
+        """Show that this process is still running its jobs"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE format_jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'running'",
+                (time.time(), self.owner)
+            )
+
+    def mark_interrupted(self) -> int:
+        """
+        Flag running jobs whose worker stopped sending heartbeats (it crashed or
+        was restarted) so clients know to resume them
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE format_jobs SET status = 'interrupted', updated_at = ? "
+                "WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (now, now - self.stale_after)
+            )
+        return cursor.rowcount
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def acreate_job(self, model: str, chunks: List[str]) -> str:
+        return await self._run(self.create_job, model, chunks)
+
+    async def aget_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self.get_job, job_id)
+
+    async def asave_chunk(self, job_id: str, chunk_number: int, output: str) -> None:
+        await self._run(self.save_chunk, job_id, chunk_number, output)
+
+    async def aset_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        await self._run(self.set_status, job_id, status, error)
+
+    async def aclaim(self, job_id: str) -> bool:
+        return await self._run(self.claim, job_id)
+
+    async def keep_alive(self) -> None:
+        """
+        Until cancelled: refresh the heartbeat of this process's jobs, and mark
+        the jobs of workers that stopped as interrupted
+        """
+        while True:
+            try:
+                await self._run(self.heartbeat)
+                interrupted = await self._run(self.mark_interrupted)
+                if interrupted:
+                    logger.info(f"Marked {interrupted} formatting jobs of stopped workers as interrupted")
+            except sqlite3.Error as e:
+                logger.warning(f"Format job heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def set_status_in_background(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        """set_status() for code that cannot wait, such as cleanup after a cancelled task"""
+        self.executor.submit(self._set_status_logged, job_id, status, error)
+
+    def _set_status_logged(self, job_id: str, status: str, error: Optional[str]) -> None:
+        try:
+            self.set_status(job_id, status, error)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not mark formatting job {job_id} as {status}: {e}")
+
+    def _prune(self, now: float) -> None:
+        """Delete jobs not touched for longer than the TTL"""
+        cutoff = now - self.ttl
+        self._conn.execute(
+            "DELETE FROM format_job_chunks WHERE job_id IN (SELECT id FROM format_jobs WHERE updated_at < ?)",
+            (cutoff,)
+        )
+        self._conn.execute("DELETE FROM format_jobs WHERE updated_at < ?", (cutoff,))
+
+
+_job_store: Optional[FormatJobStore] = None
+_job_store_failed = False
+
+
+def get_job_store() -> Optional[FormatJobStore]:
+    """Return the job store, or None when FORMAT_JOB_DB_PATH is empty or cannot be opened"""
+    global _job_store, _job_store_failed
+    if _job_store is None and not _job_store_failed and Config.FORMAT_JOB_DB_PATH:
+        try:
+            _job_store = FormatJobStore(
+                Config.FORMAT_JOB_DB_PATH, Config.FORMAT_JOB_TTL, Config.FORMAT_JOB_HEARTBEAT_INTERVAL
+            )
+        except (sqlite3.Error, OSError) as e:
+            _job_store_failed = True
+            logger.warning(f"Could not open format job store at {Config.FORMAT_JOB_DB_PATH}, jobs will not be resumable: {e}")
+    return _job_store
@@ -1,11 +1,106 @@
+import time
+import asyncio
+import hashlib
 import httpx
 import json
 import logging
-from typing import Optional, Tuple, List
+import sqlite3
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, List
 from config import Config
+from utils import fastjson
+from utils.cache import TieredCache, build_tiered_cache
+from utils.chunker import TranscriptChunker, estimate_tokens, get_model_limits
+from utils.http import get_http_client
+from utils.jobstore import get_job_store
+from utils.metrics import CHUNKS_PER_REQUEST, LLM_CONTINUATIONS, model_label, observe_stage, record_token_usage
+from utils.progress import CANCELLED_ERROR, FormatProgress, format_progress
+from utils.resilience import RETRYABLE_EXCEPTIONS, RETRYABLE_STATUS_CODES, llm_guard, parse_retry_after
+from utils.routing import AUTO_MODEL, model_router
+from utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the prompt templates change so cached output from the old
+# prompts is no longer reused.
+PROMPT_TEMPLATE_VERSION = "3"
+TEMPERATURE = 0.3
+
+# Sent after a completion was cut off at max_tokens, together with the output so far
+CONTINUATION_PROMPT = (
+    "Your previous reply was cut off by the output length limit. Continue the formatted text "
+    "exactly where it stopped, starting with the very next word. Do not repeat any text you "
+    "already wrote and do not add any commentary."
+)
+# A continuation needs at least this many tokens of room left in the context window
+MIN_CONTINUATION_TOKENS = 256
+# Bounds of the repeated tail dropped when a continuation restarts with text already written
+MAX_CONTINUATION_OVERLAP = 300
+MIN_CONTINUATION_OVERLAP = 20
+
+_format_cache: Optional[TieredCache] = None
+
+
+def get_format_cache() -> Optional[TieredCache]:
+    """Return the formatted-chunk cache, or None when caching is disabled"""
+    global _format_cache
+    if not Config.FORMAT_CACHE_ENABLED:
+        return None
+    if _format_cache is None:
+        _format_cache = build_tiered_cache(
+            "formatted_chunks",
+            max_entries=Config.FORMAT_CACHE_MAX_ENTRIES,
+            ttl=Config.FORMAT_CACHE_TTL,
+            path=Config.CACHE_DB_PATH,
+            max_bytes=Config.FORMAT_CACHE_MAX_BYTES,
+            memory_max_bytes=Config.FORMAT_CACHE_MEMORY_MAX_BYTES
+        )
+    return _format_cache
+
+
+class LLMStreamError(Exception):
+    """Raised when a streamed completion fails"""
+
+
+# Concurrent requests to format the same transcript with the same model share one run
+format_flights = SingleFlight("format")
+
+# Which candidate served each chunk of an "auto" request and how many
+# continuations each chunk needed; set per request, while the chunk number
+# is set by each chunk's task
+_routing_log: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("routing_log", default=None)
+_continuation_counts: ContextVar[Optional[Dict[int, int]]] = ContextVar("continuation_counts", default=None)
+_current_chunk: ContextVar[int] = ContextVar("current_chunk", default=1)
+# Progress of the job being formatted, when it has a job ID
+_progress: ContextVar[Optional[FormatProgress]] = ContextVar("format_progress", default=None)
+
+
+def _join_continuation(previous: str, continuation: str) -> str:
+    """
+    Append a continuation to the output it continues. Text the model repeated
+    from the end of the previous output is dropped first.
+    """
+    longest = min(len(previous), len(continuation), MAX_CONTINUATION_OVERLAP)
+    for size in range(longest, MIN_CONTINUATION_OVERLAP - 1, -1):
+        if previous.endswith(continuation[:size]):
+            continuation = continuation[size:]
+            break
+    return previous + _continuation_seam(previous, continuation)
+
+
+def _continuation_seam(previous: str, continuation: str) -> str:
+    """The continuation with the space models tend to drop after a punctuation mark at the cut put back"""
+    if previous and continuation and previous[-1] in ".,;:!?" and continuation[0].isalnum():
+        return " " + continuation
+    return continuation
+
+
+def _timing(progress: FormatProgress) -> Dict[str, Any]:
+    """The elapsed time and ETA of a job, added to streamed chunk events"""
+    snapshot = progress.snapshot()
+    return {"completed_chunks": snapshot["completed_chunks"], "elapsed": snapshot["elapsed"], "eta": snapshot["eta"]}
+
+
 class LLMFormatter:
     """Handle LLM-based transcript formatting using OpenRouter API"""
     
@@ -16,84 +111,58 @@ class LLMFormatter:
         
     def _get_formatting_prompt(self, raw_transcript: str) -> str:
         """Generate the formatting prompt with the raw transcript"""
-        return f"""You are an expert in text formatting. Your task is to take the raw transcript data below (which contains timing information and text segments) and transform it into clean, readable, and well-formatted text.
+        return f"""You are an expert in text formatting. Your task is to take the raw transcript below (one caption segment, or one pre-cleaned sentence, per line) and transform it into clean, readable, and well-formatted text.
 
-**CRITICAL: You must format ALL the provided text completely. Do not stop partway through. Do not ask if you should continue. Process the entire transcript data provided.**
+**CRITICAL: You must format ALL the provided text completely. Do not stop partway through. Do not ask if you should continue. Process the entire transcript provided.**
 
 **Instructions:**
 
-1. **Extract Text Only:** From the JSON data provided, extract only the "text" content from each segment, ignoring the timing information.
+1. **Read Every Line:** Each line is one caption segment, or one sentence when the captions were cleaned up beforehand. Line breaks are not paragraph breaks, and the sentence boundaries of cleaned-up lines are only guesses: move them wherever the meaning calls for it.
 2. **Add Punctuation and Capitalization:** Add proper punctuation (periods, commas, question marks, exclamation marks) and capitalize the beginning of sentences and proper nouns.
 3. **Create Natural Flow:** Combine the text segments into natural, flowing sentences and paragraphs.
 4. **Create Logical Paragraphs:** Break the text into logical paragraphs based on topic changes or natural breaks in conversation.
 5. **Fix Grammar:** Correct any obvious grammatical errors while preserving the speaker's voice and style.
-6. **Complete Processing:** Format ALL segments in the provided data. Do not stop until you have processed every single text segment.
+6. **Complete Processing:** Format ALL segments in the provided transcript. Do not stop until you have processed every single text segment.
 7. **No Meta-Commentary:** Do not include any notes about continuing, asking for permission, or explaining what you're doing. Just provide the formatted text.
 
-**Raw Transcript Data:**
+**Raw Transcript:**
 
 {raw_transcript}
 
 **Output Requirements:** 
-- Process every single text segment from the JSON data
+- Process every single line of the transcript
 - Provide only the clean, formatted text with proper punctuation, capitalization, and paragraph breaks
 - Do not include headings, summaries, bullet points, or any meta-commentary
 - Complete the entire formatting task in this response
 """
     
-    def _split_transcript_into_chunks(self, raw_transcript: str, max_chunk_size: int = 40000) -> List[str]:
+    def _split_transcript_into_chunks(self, raw_transcript: str, previous_chunks: Optional[List[str]] = None) -> List[str]:
         """
-        Split the raw transcript JSON into manageable chunks while preserving JSON structure
+        Split the raw transcript into chunks sized for the current model's
+        context window and output limit, in the compact one-segment-per-line
+        form sent to the LLM. Chunks of previous_chunks that the transcript
+        still contains unchanged are kept as they were.
         """
-        try:
-            # Parse the JSON to get the transcript segments
-            transcript_data = json.loads(raw_transcript)
-            
-            chunks = []
-            current_chunk = []
-            current_size = 0
-            
-            for segment in transcript_data:
-                segment_json = json.dumps(segment, ensure_ascii=False)
-                segment_size = len(segment_json)
-                
-                # If adding this segment would exceed the limit, save current chunk and start new one
-                if current_size + segment_size > max_chunk_size and current_chunk:
-                    chunk_json = json.dumps(current_chunk, indent=2, ensure_ascii=False)
-                    chunks.append(chunk_json)
-                    current_chunk = []
-                    current_size = 0
-                
-                current_chunk.append(segment)
-                current_size += segment_size
-            
-            # Add the last chunk if it has content
-            if current_chunk:
-                chunk_json = json.dumps(current_chunk, indent=2, ensure_ascii=False)
-                chunks.append(chunk_json)
-            
-            logger.info(f"Split transcript into {len(chunks)} chunks")
-            return chunks
-            
-        except json.JSONDecodeError:
-            # If it's not valid JSON, split by character count
-            logger.warning("Raw transcript is not valid JSON, falling back to character-based splitting")
-            chunks = []
-            for i in range(0, len(raw_transcript), max_chunk_size):
-                chunks.append(raw_transcript[i:i + max_chunk_size])
-            return chunks
+        with observe_stage("chunking", self.model):
+            prompt_overhead = estimate_tokens(self._get_chunk_formatting_prompt("", 1, 2))
+            # An "auto" chunk must fit whichever candidate it is routed to
+            limits = model_router.limits() if self.model == AUTO_MODEL else None
+            chunker = TranscriptChunker(self.model, prompt_overhead_tokens=prompt_overhead, limits=limits)
+            chunks = chunker.split(raw_transcript, previous_chunks)
+        CHUNKS_PER_REQUEST.observe(len(chunks), model=model_label(self.model))
+        return chunks
 
     def _get_chunk_formatting_prompt(self, chunk_transcript: str, chunk_number: int, total_chunks: int) -> str:
         """Generate the formatting prompt for a specific chunk"""
         chunk_info = f"(Chunk {chunk_number} of {total_chunks})" if total_chunks > 1 else ""
         
-        return f"""You are an expert in text formatting. Your task is to take the raw transcript data below and transform it into clean, readable, and well-formatted text.
+        return f"""You are an expert in text formatting. Your task is to take the raw transcript below (one caption segment, or one pre-cleaned sentence, per line) and transform it into clean, readable, and well-formatted text.
 
 **CRITICAL: You must format ALL the provided text in this chunk completely. Do not stop partway through. Do not ask if you should continue. Process every single text segment in this chunk.**
 
 **Instructions:**
 
-1. **Extract Text Only:** From the JSON data provided, extract only the "text" content from each segment, ignoring the timing information.
+1. **Read Every Line:** Each line is one caption segment, or one sentence when the captions were cleaned up beforehand. Line breaks are not paragraph breaks, and the sentence boundaries of cleaned-up lines are only guesses: move them wherever the meaning calls for it.
 2. **Add Punctuation and Capitalization:** Add proper punctuation (periods, commas, question marks, exclamation marks) and capitalize the beginning of sentences and proper nouns.
 3. **Create Natural Flow:** Combine the text segments into natural, flowing sentences and paragraphs.
 4. **Create Logical Paragraphs:** Break the text into logical paragraphs based on topic changes or natural breaks in conversation.
@@ -102,125 +171,839 @@ class LLMFormatter:
 7. **Chunk Processing:** This is {chunk_info}. Format this chunk as if it's a continuous part of a larger transcript. Do not add introductions or conclusions specific to this chunk.
 8. **No Meta-Commentary:** Do not include any notes about continuing, asking for permission, or explaining what you're doing. Just provide the formatted text.
 
-**Raw Transcript Data {chunk_info}:**
+**Raw Transcript {chunk_info}:**
 
 {chunk_transcript}
 
 **Output Requirements:** 
-- Process every single text segment from this chunk's JSON data
+- Process every single line of this chunk
 - Provide only the clean, formatted text with proper punctuation, capitalization, and paragraph breaks
 - Do not include headings, summaries, bullet points, or any meta-commentary
 - Complete the entire chunk formatting task in this response
 - Do not ask to continue or provide partial results
 """
 
-    async def _format_single_chunk(self, chunk: str, chunk_number: int, total_chunks: int) -> Tuple[Optional[str], Optional[str]]:
+    def _request_headers(self) -> Dict[str, str]:
+        """Headers for OpenRouter chat completion requests"""
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "http://localhost:8000",
+            "X-Title": "Verbatim AI"
+        }
+
+    def _request_payload(self, messages: List[Dict[str, str]], stream: bool = False, model: Optional[str] = None,
+                         max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Body for an OpenRouter chat completion request to `model` (default: self.model).
+        max_tokens defaults to the model's output limit.
+        """
+        model = model or self.model
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens or get_model_limits(model).max_output_tokens,
+            "temperature": TEMPERATURE
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    @staticmethod
+    def _continuation_messages(prompt: str, output: str) -> List[Dict[str, str]]:
+        """Conversation asking the model to carry on from output that was cut off"""
+        return [
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": output},
+            {"role": "user", "content": CONTINUATION_PROMPT}
+        ]
+
+    @staticmethod
+    def _continuation_max_tokens(model: str, messages: List[Dict[str, str]]) -> Optional[int]:
+        """
+        Output budget of a continuation: the model's output limit, reduced to the
+        room the longer conversation leaves in its context window. None when
+        too little room is left to continue.
+        """
+        limits = get_model_limits(model)
+        used = sum(estimate_tokens(message["content"]) for message in messages)
+        room = min(limits.max_output_tokens, limits.context_tokens - used)
+        return room if room >= MIN_CONTINUATION_TOKENS else None
+
+    def _record_continuations(self, model: str, count: int) -> None:
+        """Count continuation requests against the model and the current chunk"""
+        if not count:
+            return
+        LLM_CONTINUATIONS.inc(count, model=model_label(model))
+        counts = _continuation_counts.get()
+        if counts is not None:
+            chunk = _current_chunk.get()
+            counts[chunk] = counts.get(chunk, 0) + count
+
+    async def _request_completion(self, prompt: str, model: Optional[str] = None,
+                                  max_retries: Optional[int] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Complete a prompt. An output cut off at max_tokens (finish_reason
+        "length") is continued with up to LLM_MAX_CONTINUATIONS follow-up
+        requests that send the output so far back to the same model, instead
+        of formatting the whole prompt again.
+        model defaults to self.model and max_retries to LLM_MAX_RETRIES.
+        Returns: (completion_text, error_message)
+        """
+        model = model or self.model
+        messages = [{"role": "user", "content": prompt}]
+        text, finish_reason, error = await self._post_completion(messages, model, max_retries)
+        continuations = 0
+        try:
+            while error is None and finish_reason == "length":
+                if continuations >= Config.LLM_MAX_CONTINUATIONS:
+                    logger.warning(f"{model} output still cut off after {continuations} continuations")
+                    break
+                messages = self._continuation_messages(prompt, text)
+                max_tokens = self._continuation_max_tokens(model, messages)
+                if max_tokens is None:
+                    logger.warning(f"{model} output was cut off with no room left in the context window to continue it")
+                    break
+                continuations += 1
+                logger.info(f"{model} output was cut off at max_tokens; requesting continuation {continuations}")
+                more, finish_reason, error = await self._post_completion(messages, model, max_retries, max_tokens)
+                if error is None:
+                    text = _join_continuation(text, more)
+        finally:
+            self._record_continuations(model, continuations)
+
+        if error:
+            return None, error
+        return text, None
+
+    async def _post_completion(self, messages: List[Dict[str, str]], model: str, max_retries: Optional[int] = None,
+                               max_tokens: Optional[int] = None) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """
+        Send one chat completion request over the shared connection pool.
+        Rate limits, server errors and connection failures are retried with
+        jittered backoff, honouring Retry-After (see utils.resilience).
+        Returns: (completion_text, finish_reason, error_message)
+        """
+        client = get_http_client()
+        retries = 0
+        while True:
+            error = await llm_guard.acquire(model, self.api_key)
+            if error:
+                return None, None, error
+
+            with observe_stage("llm_call", model) as stage:
+                try:
+                    response = await client.post(
+                        f"{self.base_url}/chat/completions",
+                        headers=self._request_headers(),
+                        json=self._request_payload(messages, model=model, max_tokens=max_tokens),
+                        timeout=Config.REQUEST_TIMEOUT
+                    )
+                except RETRYABLE_EXCEPTIONS as e:
+                    stage.outcome = "connection_error"
+                    llm_guard.record_failure(model)
+                    delay = llm_guard.retry_delay(model, retries + 1, type(e).__name__, None, max_retries)
+                    if delay is None:
+                        raise
+                else:
+                    if response.status_code == 200:
+                        llm_guard.record_success(model)
+                        result = response.json()
+                        record_token_usage(model, result.get("usage"))
+                        choice = result["choices"][0]
+                        return choice["message"]["content"] or "", choice.get("finish_reason"), None
+
+                    stage.outcome = f"http_{response.status_code}"
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    llm_guard.record_response(model, self.api_key, response.status_code, retry_after)
+                    delay = None
+                    if response.status_code in RETRYABLE_STATUS_CODES:
+                        delay = llm_guard.retry_delay(model, retries + 1, stage.outcome, retry_after, max_retries)
+                    if delay is None:
+                        error_detail = response.text
+                        return None, None, f"API error ({response.status_code}): {error_detail}"
+
+            retries += 1
+            await asyncio.sleep(delay)
+
+    async def _stream_completion(self, prompt: str, model: Optional[str] = None,
+                                 max_retries: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of _request_completion: yields content deltas as
+        they arrive, then carries on with continuation streams while the
+        output is cut off at max_tokens. Text a continuation repeats is dropped
+        as _request_completion drops it, so both give the same output.
+        Raises LLMStreamError if the API returns an error before or during a stream.
+        """
+        model = model or self.model
+        outcome: Dict[str, Any] = {}
+        parts: List[str] = []
+        async for delta in self._stream_messages([{"role": "user", "content": prompt}], model, max_retries, outcome):
+            parts.append(delta)
+            yield delta
+
+        continuations = 0
+        try:
+            while outcome.get("finish_reason") == "length":
+                if continuations >= Config.LLM_MAX_CONTINUATIONS:
+                    logger.warning(f"{model} output still cut off after {continuations} continuations")
+                    break
+                output = "".join(parts)
+                messages = self._continuation_messages(prompt, output)
+                max_tokens = self._continuation_max_tokens(model, messages)
+                if max_tokens is None:
+                    logger.warning(f"{model} output was cut off with no room left in the context window to continue it")
+                    break
+                continuations += 1
+                logger.info(f"{model} output was cut off at max_tokens; streaming continuation {continuations}")
+                outcome = {}
+                # The start of a continuation is held back until it is long enough to tell
+                # whether the model repeated text, so the result matches _request_completion
+                head: Optional[str] = ""
+                async for delta in self._stream_messages(messages, model, max_retries, outcome, max_tokens):
+                    if head is not None:
+                        head += delta
+                        if len(head) < MAX_CONTINUATION_OVERLAP:
+                            continue
+                        delta, head = _join_continuation(output, head)[len(output):], None
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+                if head:
+                    delta = _join_continuation(output, head)[len(output):]
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        finally:
+            self._record_continuations(model, continuations)
+
+    async def _stream_messages(self, messages: List[Dict[str, str]], model: str, max_retries: Optional[int],
+                               outcome: Dict[str, Any], max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Stream one chat completion, yielding content deltas as they arrive and
+        writing the finish_reason of the final event to outcome["finish_reason"].
+        Failures before the first delta are retried like _post_completion;
+        once output has been yielded the stream cannot be restarted.
+        """
+        client = get_http_client()
+        retries = 0
+        yielded = False
+        while True:
+            error = await llm_guard.acquire(model, self.api_key)
+            if error:
+                raise LLMStreamError(error)
+
+            with observe_stage("llm_call", model) as stage:
+                try:
+                    async with client.stream(
+                        "POST",
+                        f"{self.base_url}/chat/completions",
+                        headers=self._request_headers(),
+                        json=self._request_payload(messages, stream=True, model=model, max_tokens=max_tokens),
+                        timeout=Config.REQUEST_TIMEOUT
+                    ) as response:
+                        if response.status_code != 200:
+                            stage.outcome = f"http_{response.status_code}"
+                            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                            llm_guard.record_response(model, self.api_key, response.status_code, retry_after)
+                            delay = None
+                            if response.status_code in RETRYABLE_STATUS_CODES:
+                                delay = llm_guard.retry_delay(model, retries + 1, stage.outcome, retry_after, max_retries)
+                            if delay is None:
+                                error_detail = (await response.aread()).decode("utf-8", errors="replace")
+                                raise LLMStreamError(f"API error ({response.status_code}): {error_detail}")
+                        else:
+                            async for line in response.aiter_lines():
+                                # Lines starting with ':' are keep-alive comments (e.g. ": OPENROUTER PROCESSING")
+                                if not line.startswith("data:"):
+                                    continue
+                                data = line[len("data:"):].strip()
+                                if data == "[DONE]":
+                                    break
+
+                                event = fastjson.loads(data)
+                                if "error" in event:
+                                    llm_guard.record_failure(model)
+                                    raise LLMStreamError(f"API error: {event['error'].get('message', event['error'])}")
+                                # The final event carries the token usage of the whole completion
+                                record_token_usage(model, event.get("usage"))
+                                choices = event.get("choices") or [{}]
+                                if choices[0].get("finish_reason"):
+                                    outcome["finish_reason"] = choices[0]["finish_reason"]
+                                delta = (choices[0].get("delta") or {}).get("content")
+                                if delta:
+                                    yielded = True
+                                    yield delta
+                            llm_guard.record_success(model)
+                            return
+                except RETRYABLE_EXCEPTIONS as e:
+                    stage.outcome = "connection_error"
+                    llm_guard.record_failure(model)
+                    delay = None if yielded else llm_guard.retry_delay(model, retries + 1, type(e).__name__, None, max_retries)
+                    if delay is None:
+                        raise
+
+            retries += 1
+            await asyncio.sleep(delay)
+
+    def _log_route(self, model: Optional[str], attempts: List[Dict[str, Any]]) -> None:
+        """Record which candidate served the current chunk of an "auto" request"""
+        routing_log = _routing_log.get()
+        if routing_log is not None:
+            routing_log.append({
+                "chunk": _current_chunk.get(),
+                "model": model,
+                "failed": [attempt for attempt in attempts if attempt["error"]],
+            })
+
+    async def _route_completion(self, prompt: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Complete a prompt with self.model or, for "auto", with the fastest healthy
+        candidate, falling back to the next candidate when a call fails.
+        Routed calls are not retried on the same model; the fallback replaces the retry.
+        Returns: (completion_text, error_message)
+        """
+        if self.model != AUTO_MODEL:
+            return await self._request_completion(prompt)
+
+        attempts: List[Dict[str, Any]] = []
+        error = None
+        for model in model_router.ranked()[:max(1, Config.AUTO_MODEL_MAX_ATTEMPTS)]:
+            started = time.perf_counter()
+            try:
+                text, error = await self._request_completion(prompt, model, max_retries=0)
+            except Exception as e:
+                text, error = None, f"{type(e).__name__}: {e}"
+            model_router.record(model, time.perf_counter() - started, error is None)
+            attempts.append({"model": model, "error": error})
+            if error is None:
+                self._log_route(model, attempts)
+                return text, None
+            logger.warning(f"Auto routing: {model} failed, trying the next candidate: {error}")
+
+        self._log_route(None, attempts)
+        return None, f"All candidate models failed. Last error: {error}"
+
+    async def _route_stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of _route_completion. A candidate that fails
+        before its first delta is replaced by the next one; after output has
+        been streamed the failure is raised.
+        """
+        if self.model != AUTO_MODEL:
+            async for delta in self._stream_completion(prompt):
+                yield delta
+            return
+
+        attempts: List[Dict[str, Any]] = []
+        error = None
+        for model in model_router.ranked()[:max(1, Config.AUTO_MODEL_MAX_ATTEMPTS)]:
+            started = time.perf_counter()
+            yielded = False
+            try:
+                async for delta in self._stream_completion(prompt, model, max_retries=0):
+                    yielded = True
+                    yield delta
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                model_router.record(model, time.perf_counter() - started, False)
+                attempts.append({"model": model, "error": error})
+                if yielded:
+                    self._log_route(None, attempts)
+                    raise
+                logger.warning(f"Auto routing: {model} failed, trying the next candidate: {error}")
+                continue
+
+            model_router.record(model, time.perf_counter() - started, True)
+            attempts.append({"model": model, "error": None})
+            self._log_route(model, attempts)
+            return
+
+        self._log_route(None, attempts)
+        raise LLMStreamError(f"All candidate models failed. Last error: {error}")
+
+    def _cache_key(self, template: str, content: str) -> str:
+        """Content address of a formatting result: input text, model, temperature and prompt version"""
+        material = json.dumps(
+            [PROMPT_TEMPLATE_VERSION, template, self.model, TEMPERATURE, content],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def _complete_cached(self, template: str, content: str, prompt: str, use_cache: bool) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Run a completion, reusing a cached result for identical content when allowed.
+        Returns: (completion_text, error_message)
+        """
+        cache = get_format_cache() if use_cache else None
+        if cache is None:
+            return await self._route_completion(prompt)
+
+        key = self._cache_key(template, content)
+        cached = await cache.aget(key)
+        if cached is not None:
+            logger.info(f"Format cache hit ({template}, {len(content)} chars)")
+            return cached, None
+
+        formatted_text, error = await self._route_completion(prompt)
+        if formatted_text is not None:
+            cache.set_in_background(key, formatted_text)
+        return formatted_text, error
+
+    async def _format_single_chunk(self, chunk: str, chunk_number: int, total_chunks: int, use_cache: bool = True) -> Tuple[Optional[str], Optional[str]]:
         """Format a single chunk of transcript"""
+        _current_chunk.set(chunk_number)
         try:
             prompt = self._get_chunk_formatting_prompt(chunk, chunk_number, total_chunks)
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                        "HTTP-Referer": "http://localhost:8000",
-                        "X-Title": "Verbatim AI"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {
-                                "role": "user",
-                                "content": prompt
-                            }
-                        ],
-                        "max_tokens": 4000,
-                        "temperature": 0.3
-                    },
-                    timeout=Config.REQUEST_TIMEOUT
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    formatted_text = result["choices"][0]["message"]["content"]
-                    return formatted_text, None
-                else:
-                    error_detail = response.text
-                    return None, f"API error ({response.status_code}): {error_detail}"
-                    
+            return await self._complete_cached("chunk", chunk, prompt, use_cache)
         except httpx.TimeoutException:
             return None, f"Request timed out for chunk {chunk_number}."
         except Exception as e:
             return None, f"Error formatting chunk {chunk_number}: {str(e)}"
 
-    async def format_transcript(self, raw_transcript: str) -> Tuple[Optional[str], Optional[str]]:
+    async def _format_chunk_with_retries(self, chunk: str, chunk_number: int, total_chunks: int, use_cache: bool = True) -> Tuple[Optional[str], Optional[str]]:
+        """Format a single chunk, retrying it on its own if it fails"""
+        attempts = max(0, Config.CHUNK_MAX_RETRIES) + 1
+        error = None
+
+        for attempt in range(1, attempts + 1):
+            logger.info(f"Processing chunk {chunk_number} of {total_chunks} (attempt {attempt}/{attempts})")
+            formatted_chunk, error = await self._format_single_chunk(chunk, chunk_number, total_chunks, use_cache)
+            if not error:
+                return formatted_chunk, None
+            logger.warning(f"Chunk {chunk_number} failed on attempt {attempt}/{attempts}: {error}")
+            progress = _progress.get()
+            if progress is not None and attempt < attempts:
+                progress.chunk_retried(chunk_number, attempt + 1, error)
+
+        return None, error
+
+    async def _format_chunks(self, chunks: List[str], use_cache: bool = True,
+                             completed: Optional[Dict[int, str]] = None,
+                             on_chunk_done: Optional[Callable[[int, str], Awaitable[None]]] = None) -> Tuple[Optional[List[str]], Optional[str]]:
+        """
+        Format chunks concurrently, at most Config.CHUNK_CONCURRENCY at a time.
+        Chunks already in `completed` (keyed by chunk number) are skipped, and
+        on_chunk_done is called as each remaining chunk finishes.
+        Results are returned in the original chunk order. The first chunk that
+        still fails after its retries cancels the remaining work.
+        Returns: (formatted_chunks, error_message)
+        """
+        completed = completed or {}
+        total_chunks = len(chunks)
+        semaphore = asyncio.Semaphore(max(1, Config.CHUNK_CONCURRENCY))
+
+        async def run(chunk_number: int, chunk: str) -> Tuple[Optional[str], Optional[str]]:
+            async with semaphore:
+                progress = _progress.get()
+                if progress is not None:
+                    progress.chunk_started(chunk_number)
+                formatted_chunk, error = await self._format_chunk_with_retries(chunk, chunk_number, total_chunks, use_cache)
+                if progress is not None and not error:
+                    progress.chunk_completed(chunk_number)
+                return formatted_chunk, error
+
+        tasks = {
+            asyncio.create_task(run(i, chunk)): i
+            for i, chunk in enumerate(chunks, 1)
+            if i not in completed
+        }
+        formatted_chunks: List[Optional[str]] = [completed.get(i) for i in range(1, total_chunks + 1)]
+        pending = set(tasks)
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    chunk_number = tasks[task]
+                    formatted_chunk, error = task.result()
+                    if error:
+                        return None, f"Error processing chunk {chunk_number}: {error}"
+                    formatted_chunks[chunk_number - 1] = formatted_chunk
+                    if on_chunk_done is not None:
+                        await on_chunk_done(chunk_number, formatted_chunk)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return formatted_chunks, None
+
+    async def _load_or_split(self, raw_transcript: str, job_id: Optional[str],
+                             previous_job_id: Optional[str] = None) -> Tuple[List[str], Dict[int, str], Optional[str]]:
+        """
+        Return the chunks to format, the outputs already checkpointed for them and the job ID.
+        With a job_id the stored job is resumed; otherwise the transcript is split
+        and, if it needs several chunks, recorded as a new job in the job store.
+        With a previous_job_id (a job that formatted an earlier version of the
+        transcript) the chunks that did not change are kept, and their formatted
+        output is carried over into the new job, so only edited chunks are formatted.
+        Raises ValueError if a job cannot be resumed (including while it is still
+        running) or reused.
+        """
+        store = get_job_store()
+        if job_id:
+            job = await self._load_job(store, job_id)
+            if not await store.aclaim(job_id):
+                raise ValueError(f"Formatting job {job_id} is still running. Wait for it to finish before resuming it.")
+            logger.info(f"Resuming formatting job {job_id}: {len(job['outputs'])} of {job['total_chunks']} chunks already done")
+            return job["chunks"], job["outputs"], job_id
+
+        if previous_job_id:
+            previous = await self._load_job(store, previous_job_id)
+            chunks = self._split_transcript_into_chunks(raw_transcript, previous["chunks"])
+            previous_outputs = {
+                previous["chunks"][number - 1]: output for number, output in previous["outputs"].items()
+            }
+            reused = {
+                number: previous_outputs[chunk]
+                for number, chunk in enumerate(chunks, 1)
+                if chunk in previous_outputs
+            }
+            logger.info(f"Re-formatting {len(chunks) - len(reused)} of {len(chunks)} chunks (previous job {previous_job_id})")
+            if reused or len(chunks) > 1:
+                job_id = await store.acreate_job(self.model, chunks)
+                for number, output in reused.items():
+                    await store.asave_chunk(job_id, number, output)
+            return chunks, reused, job_id
+
+        chunks = self._split_transcript_into_chunks(raw_transcript)
+        if len(chunks) > 1 and store is not None:
+            job_id = await store.acreate_job(self.model, chunks)
+        return chunks, {}, job_id
+
+    async def _load_job(self, store, job_id: str) -> Dict[str, Any]:
+        """A stored job started with this formatter's model (ValueError otherwise)"""
+        job = await store.aget_job(job_id) if store is not None else None
+        if job is None:
+            raise ValueError(f"Formatting job {job_id} was not found or has expired.")
+        if job["model"] != self.model:
+            raise ValueError(f"Formatting job {job_id} was started with model {job['model']}. Use the same model.")
+        return job
+
+    def _flight_key(self, raw_transcript: str, use_cache: bool, job_id: Optional[str],
+                    previous_job_id: Optional[str]) -> Tuple[Any, ...]:
+        """Requests with the same key share one run"""
+        # The API key is part of the key so one caller's auth error is never handed to another
+        return (
+            hashlib.sha256(raw_transcript.encode("utf-8")).hexdigest(),
+            self.model,
+            hashlib.sha256(self.api_key.encode("utf-8")).hexdigest(),
+            use_cache,
+            job_id,
+            previous_job_id
+        )
+
+    async def format_transcript(self, raw_transcript: str, use_cache: bool = True, job_id: Optional[str] = None,
+                                details: Optional[Dict[str, Any]] = None,
+                                previous_job_id: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
         """
-        Format transcript using OpenRouter API with chunking support for long transcripts
+        Format transcript using OpenRouter API with chunking support for long transcripts.
+        Chunks formatted before with the same model and prompt are served from
+        the format cache unless use_cache is False. Identical concurrent
+        requests (same transcript, model and API key) share one run.
+        Multi-chunk transcripts are checkpointed in the job store; pass the
+        job_id of a failed or interrupted job to resume it, or the
+        previous_job_id of a job that formatted an earlier version of the
+        transcript to re-format only the chunks that changed. When a details
+        dict is given, the job ID is written to details["job_id"], the number
+        of chunks carried over from the previous job to details["reused_chunks"], the number
+        of continuations sent for output cut off at max_tokens to
+        details["continuations"] and, for the "auto" model, the model that
+        served each chunk to details["routing"].
         Returns: (formatted_text, error_message)
         """
         if not self.api_key:
             return None, "OpenRouter API key not configured"
-        
+
+        async def run() -> Tuple[Optional[str], Optional[str], Dict[str, Any]]:
+            # The details travel with the result, so every coalesced caller receives them
+            run_details: Dict[str, Any] = {}
+            text, error = await self._format_transcript(raw_transcript, use_cache, job_id, run_details, previous_job_id)
+            return text, error, run_details
+
+        formatted_text, error, run_details = await format_flights.do(
+            self._flight_key(raw_transcript, use_cache, job_id, previous_job_id),
+            run
+        )
+        if details is not None:
+            details.update(run_details)
+            if "routing" in details:
+                details["routing"] = sorted(details["routing"], key=lambda route: route["chunk"])
+            details["continuations"] = sum(details.pop("chunk_continuations", {}).values())
+        return formatted_text, error
+
+    async def _format_transcript(self, raw_transcript: str, use_cache: bool, job_id: Optional[str],
+                                 details: Dict[str, Any],
+                                 previous_job_id: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """Format transcript, splitting it into checkpointed chunks when it is too long for one request"""
         try:
-            # Check if we need to split the transcript
-            if len(raw_transcript) <= Config.MAX_TRANSCRIPT_LENGTH:
+            # Split the transcript if it does not fit the model in one request
+            reusing = bool(previous_job_id) and not job_id
+            chunks, completed, job_id = await self._load_or_split(raw_transcript, job_id, previous_job_id)
+            details["job_id"] = job_id
+            if reusing:
+                details["reused_chunks"] = len(completed)
+            details["chunk_continuations"] = {}
+            _continuation_counts.set(details["chunk_continuations"])
+            if self.model == AUTO_MODEL:
+                details["routing"] = []
+                _routing_log.set(details["routing"])
+
+            if len(chunks) == 1 and not job_id:
                 # Process as single chunk
                 logger.info("Processing transcript as single chunk")
-                prompt = self._get_formatting_prompt(raw_transcript)
-                
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{self.base_url}/chat/completions",
-                        headers={
-                            "Authorization": f"Bearer {self.api_key}",
-                            "Content-Type": "application/json",
-                            "HTTP-Referer": "http://localhost:8000",
-                            "X-Title": "Verbatim AI"
-                        },
-                        json={
-                            "model": self.model,
-                            "messages": [
-                                {
-                                    "role": "user",
-                                    "content": prompt
-                                }
-                            ],
-                            "max_tokens": 4000,
-                            "temperature": 0.3
-                        },
-                        timeout=Config.REQUEST_TIMEOUT
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        formatted_text = result["choices"][0]["message"]["content"]
-                        return formatted_text, None
-                    else:
-                        error_detail = response.text
-                        return None, f"API error ({response.status_code}): {error_detail}"
+                prompt = self._get_formatting_prompt(chunks[0])
+                return await self._complete_cached("single", chunks[0], prompt, use_cache)
             else:
                 # Process in chunks
-                logger.info(f"Transcript too long ({len(raw_transcript)} chars), splitting into chunks")
-                chunks = self._split_transcript_into_chunks(raw_transcript)
-                formatted_chunks = []
-                
-                for i, chunk in enumerate(chunks, 1):
-                    logger.info(f"Processing chunk {i} of {len(chunks)}")
-                    formatted_chunk, error = await self._format_single_chunk(chunk, i, len(chunks))
-                    
-                    if error:
-                        return None, f"Error processing chunk {i}: {error}"
-                    
-                    formatted_chunks.append(formatted_chunk)
-                
+                logger.info(f"Processing {len(chunks)} chunks with {self.model} (job {job_id})")
+                store = get_job_store() if job_id else None
+                progress = format_progress.start(job_id, len(chunks), len(completed)) if job_id else None
+                _progress.set(progress)
+                work = self._format_chunks(
+                    chunks,
+                    use_cache,
+                    completed=completed,
+                    on_chunk_done=(lambda i, text: store.asave_chunk(job_id, i, text)) if store else None
+                )
+                try:
+                    formatted_chunks, error = await (progress.run(work) if progress else work)
+                except asyncio.CancelledError:
+                    if progress is None or not progress.cancel_requested:
+                        if progress:
+                            store.set_status_in_background(job_id, "interrupted")
+                            progress.finish("interrupted")
+                        raise
+                    logger.info(f"Formatting job {job_id} cancelled")
+                    await store.aset_status(job_id, "cancelled", CANCELLED_ERROR)
+                    progress.finish("cancelled", CANCELLED_ERROR)
+                    return None, CANCELLED_ERROR
+                except Exception as e:
+                    if store:
+                        await self._record_failure(store, job_id, str(e))
+                    if progress:
+                        progress.finish("failed", str(e))
+                    raise
+
+                if error:
+                    if store:
+                        await self._record_failure(store, job_id, error)
+                    if progress:
+                        progress.finish("failed", error)
+                    return None, error
+
+                if store:
+                    await store.aset_status(job_id, "completed")
+                if progress:
+                    progress.finish("completed")
+
                 # Combine all formatted chunks
                 combined_result = "\n\n".join(formatted_chunks)
                 logger.info(f"Successfully processed all {len(chunks)} chunks")
                 return combined_result, None
-                
+
+        except ValueError as e:
+            return None, str(e)
         except httpx.TimeoutException:
             return None, "Request timed out. Please try again."
         except Exception as e:
-            return None, f"Error formatting transcript: {str(e)}"
\ No newline at end of file
+            return None, f"Error formatting transcript: {str(e)}"
+
+    async def stream_format_transcript(self, raw_transcript: str, use_cache: bool = True,
+                                       job_id: Optional[str] = None,
+                                       previous_job_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Format transcript while streaming the output as it is generated.
+        Up to Config.CHUNK_CONCURRENCY chunks are formatted at once, but events
+        are relayed in chunk order: start (with the job_id, and with
+        previous_job_id the number of reused_chunks carried over), chunk_start,
+        token, chunk_end (with the model that produced the chunk and the
+        continuations it needed), then done (with the total number of
+        continuations) or error. Tokens of a chunk that finished while an
+        earlier one was being relayed arrive together.
+        Cached and previously checkpointed chunks are emitted as a single token event.
+        Identical concurrent streams share one run, as format_transcript does.
+        """
+        if not self.api_key:
+            yield {"event": "error", "error": "OpenRouter API key not configured"}
+            return
+
+        async for event in format_flights.stream(
+            self._flight_key(raw_transcript, use_cache, job_id, previous_job_id),
+            lambda: self._stream_format_transcript(raw_transcript, use_cache, job_id, previous_job_id)
+        ):
+            yield event
+
+    async def _stream_format_transcript(self, raw_transcript: str, use_cache: bool, job_id: Optional[str],
+                                        previous_job_id: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+        """The events of stream_format_transcript for one run"""
+        reusing = bool(previous_job_id) and not job_id
+        try:
+            chunks, completed, job_id = await self._load_or_split(raw_transcript, job_id, previous_job_id)
+        except ValueError as e:
+            yield {"event": "error", "error": str(e)}
+            return
+
+        store = get_job_store() if job_id else None
+        if len(chunks) == 1 and not job_id:
+            plan = [("single", chunks[0], self._get_formatting_prompt(chunks[0]))]
+        else:
+            plan = [
+                ("chunk", chunk, self._get_chunk_formatting_prompt(chunk, i, len(chunks)))
+                for i, chunk in enumerate(chunks, 1)
+            ]
+
+        total_chunks = len(plan)
+        cache = get_format_cache() if use_cache else None
+        continuations: Dict[int, int] = {}
+        _continuation_counts.set(continuations)
+        routing: Optional[List[Dict[str, Any]]] = None
+        if self.model == AUTO_MODEL:
+            routing = []
+            _routing_log.set(routing)
+        start = {"event": "start", "total_chunks": total_chunks, "model": self.model, "job_id": job_id}
+        if reusing:
+            start["reused_chunks"] = len(completed)
+        yield start
+
+        progress = format_progress.start(job_id, total_chunks, len(completed)) if job_id else None
+        semaphore = asyncio.Semaphore(max(1, Config.CHUNK_CONCURRENCY))
+
+        async def produce(chunk_number: int, template: str, content: str, prompt: str,
+                          queue: "asyncio.Queue[Tuple[str, Any]]") -> None:
+            """
+            Format one chunk into its queue: ("token", text)..., then ("end", fields),
+            ("error", message) or, when the job is cancelled, ("cancelled", None)
+            """
+            async with semaphore:
+                try:
+                    await produce_chunk(chunk_number, template, content, prompt, queue)
+                except asyncio.CancelledError:
+                    queue.put_nowait(("cancelled", None))
+                    raise
+                except Exception as e:
+                    # Any failure (the model, the cache or the job store) ends the relay with an error
+                    if isinstance(e, httpx.TimeoutException):
+                        queue.put_nowait(("error", f"Request timed out for chunk {chunk_number}."))
+                    else:
+                        queue.put_nowait(("error", f"Error processing chunk {chunk_number}: {str(e)}"))
+
+        async def produce_chunk(chunk_number: int, template: str, content: str, prompt: str,
+                                queue: "asyncio.Queue[Tuple[str, Any]]") -> None:
+            _current_chunk.set(chunk_number)
+            if progress is not None:
+                progress.chunk_started(chunk_number)
+            key = self._cache_key(template, content)
+            cached = await cache.aget(key) if cache is not None else None
+            if cached is not None:
+                logger.info(f"Format cache hit for streamed chunk {chunk_number}")
+                parts = [cached]
+                queue.put_nowait(("token", cached))
+            else:
+                parts = []
+                async for delta in self._route_stream(prompt):
+                    parts.append(delta)
+                    queue.put_nowait(("token", delta))
+
+            formatted_chunk = "".join(parts)
+            if cache is not None and cached is None and parts:
+                cache.set_in_background(key, formatted_chunk)
+            if store:
+                await store.asave_chunk(job_id, chunk_number, formatted_chunk)
+            if progress is not None:
+                progress.chunk_completed(chunk_number)
+            if cached is not None:
+                queue.put_nowait(("end", {"cached": True}))
+                return
+            routes = [route for route in routing or () if route["chunk"] == chunk_number]
+            queue.put_nowait(("end", {
+                "cached": False,
+                "model": routes[-1]["model"] if routes else self.model,
+                "continuations": continuations.get(chunk_number, 0)
+            }))
+
+        queues: Dict[int, "asyncio.Queue[Tuple[str, Any]]"] = {}
+        tasks: List["asyncio.Task[None]"] = []
+        for chunk_number, (template, content, prompt) in enumerate(plan, 1):
+            if chunk_number not in completed:
+                queues[chunk_number] = asyncio.Queue()
+                tasks.append(asyncio.create_task(produce(chunk_number, template, content, prompt, queues[chunk_number])))
+                if progress is not None:
+                    # Cancelling the job stops every chunk at once, even one waiting on a slow model
+                    progress.track(tasks[-1])
+
+        try:
+            for chunk_number in range(1, total_chunks + 1):
+                if progress is not None and progress.cancel_requested:
+                    yield await self._cancel_stream(progress, store, chunk_number)
+                    return
+                chunk_start = {"event": "chunk_start", "chunk": chunk_number, "total_chunks": total_chunks}
+                if progress is not None and chunk_number not in completed:
+                    chunk_start.update(_timing(progress))
+                yield chunk_start
+
+                if chunk_number in completed:
+                    yield {"event": "token", "chunk": chunk_number, "text": completed[chunk_number]}
+                    yield {"event": "chunk_end", "chunk": chunk_number, "cached": True}
+                    continue
+
+                queue = queues[chunk_number]
+                while True:
+                    kind, value = await queue.get()
+                    if kind == "token":
+                        yield {"event": "token", "chunk": chunk_number, "text": value}
+                        if progress is not None and progress.cancel_requested:
+                            # Chunks cut off mid-way are not checkpointed; resuming formats them again
+                            yield await self._cancel_stream(progress, store, chunk_number)
+                            return
+                    elif kind == "cancelled":
+                        yield await self._cancel_stream(progress, store, chunk_number)
+                        return
+                    elif kind == "error":
+                        if store:
+                            await self._record_failure(store, job_id, value)
+                        if progress is not None:
+                            progress.finish("failed", value)
+                        yield {"event": "error", "chunk": chunk_number, "error": value, "job_id": job_id}
+                        return
+                    else:
+                        chunk_end = {"event": "chunk_end", "chunk": chunk_number, **value}
+                        if progress is not None:
+                            chunk_end.update(_timing(progress))
+                        yield chunk_end
+                        break
+
+            if store:
+                await store.aset_status(job_id, "completed")
+            if progress is not None:
+                progress.finish("completed")
+            done = {
+                "event": "done",
+                "total_chunks": total_chunks,
+                "job_id": job_id,
+                "continuations": sum(continuations.values())
+            }
+            if routing is not None:
+                done["routing"] = sorted(routing, key=lambda route: route["chunk"])
+            yield done
+        finally:
+            for task in tasks:
+                task.cancel()
+            # The client went away mid-stream; the job stays resumable
+            if progress is not None and progress.status == "running":
+                store.set_status_in_background(job_id, "interrupted")
+                progress.finish("interrupted")
+
+    async def _record_failure(self, store, job_id: str, error: str) -> None:
+        """Mark a job failed; the job store itself may be what failed, so that is only logged"""
+        try:
+            await store.aset_status(job_id, "failed", error)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not mark formatting job {job_id} as failed: {e}")
+
+    async def _cancel_stream(self, progress: FormatProgress, store, chunk_number: int) -> Dict[str, Any]:
+        """Record a cancelled streamed job and return its error event"""
+        logger.info(f"Formatting job {progress.job_id} cancelled at chunk {chunk_number}")
+        await store.aset_status(progress.job_id, "cancelled", CANCELLED_ERROR)
+        progress.finish("cancelled", CANCELLED_ERROR)
+        return {"event": "error", "chunk": chunk_number, "error": CANCELLED_ERROR, "job_id": progress.job_id, "cancelled": True}
@@ -0,0 +1,347 @@
+import math
+import asyncio
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+# Content type of the Prometheus text exposition format (Starlette appends the charset)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds; spans regex work (sub-millisecond) up to slow multi-minute LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+CHUNK_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """Base for a labelled metric; values are kept per label combination"""
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label combination: [bucket counts..., sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+
+        lines = []
+        for key, state in values:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Metric whose samples are read from live application state at scrape time"""
+
+    def __init__(self, name: str, documentation: str, type_name: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[LabelValues, float]]]):
+        super().__init__(name, documentation, labelnames)
+        self.type_name = type_name
+        self._collect = collect
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in self._collect()]
+
+
+class Registry:
+    """Ordered set of metrics rendered together for a scrape"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Caches and single-flight groups report their own counters; they are read at scrape time
+_caches: List[Any] = []
+_flights: List[Any] = []
+
+
+def register_cache(cache: Any) -> None:
+    """Expose a cache with .name and .stats() (see utils.cache.TieredCache)"""
+    _caches.append(cache)
+
+
+def register_single_flight(flight: Any) -> None:
+    """Expose a single-flight group with .name, .in_flight() and .coalesced"""
+    _flights.append(flight)
+
+
+def _cache_lookups() -> Iterator[Tuple[LabelValues, float]]:
+    for cache in _caches:
+        stats = cache.stats()
+        yield (cache.name, "memory_hit"), stats["memory_hits"]
+        yield (cache.name, "disk_hit"), stats["disk_hits"]
+        yield (cache.name, "miss"), stats["misses"]
+
+
+def _cache_hit_ratios() -> Iterator[Tuple[LabelValues, float]]:
+    for cache in _caches:
+        yield (cache.name,), cache.stats()["hit_ratio"]
+
+
+# Requests may name any model, so only this many distinct models get series of their own
+MAX_MODEL_LABELS = 50
+OTHER_MODEL_LABEL = "other"
+_model_labels: Set[str] = set()
+
+
+def model_label(model: Optional[str]) -> str:
+    """A model as a label value: the first MAX_MODEL_LABELS models keep their name, later ones share "other" """
+    if not model:
+        return ""
+    if model not in _model_labels:
+        if len(_model_labels) >= MAX_MODEL_LABELS:
+            return OTHER_MODEL_LABEL
+        _model_labels.add(model)
+    return model
+
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "verbatim_stage_duration_seconds",
+    "Latency of each processing stage (video_id, transcript_fetch, preformat, chunking, llm_call, fast_format, compression)",
+    ("stage", "model", "outcome")
+))
+CHUNKS_PER_REQUEST = REGISTRY.register(Histogram(
+    "verbatim_chunks_per_request",
+    "Number of chunks a transcript was split into for formatting",
+    ("model",),
+    buckets=CHUNK_BUCKETS
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "verbatim_llm_tokens_total",
+    "Tokens reported by OpenRouter, by model and kind (prompt or completion)",
+    ("model", "kind")
+))
+LLM_CONTINUATIONS = REGISTRY.register(Counter(
+    "verbatim_llm_continuations_total",
+    "Follow-up requests sent because a completion was cut off at max_tokens, by model",
+    ("model",)
+))
+COMPRESSED_BYTES = REGISTRY.register(Counter(
+    "verbatim_response_compression_bytes_total",
+    "Bytes of compressed API responses before and after compression, by content coding",
+    ("encoding", "stage")
+))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "verbatim_http_requests_in_flight",
+    "HTTP requests currently being handled, including open streams"
+))
+REGISTRY.register(CallbackMetric(
+    "verbatim_operations_in_flight",
+    "Distinct upstream operations in flight after coalescing identical requests",
+    "gauge",
+    ("operation",),
+    lambda: (((flight.name,), flight.in_flight()) for flight in _flights)
+))
+REGISTRY.register(CallbackMetric(
+    "verbatim_coalesced_requests_total",
+    "Requests served by joining an identical in-flight operation",
+    "counter",
+    ("operation",),
+    lambda: (((flight.name,), flight.coalesced) for flight in _flights)
+))
+REGISTRY.register(CallbackMetric(
+    "verbatim_cache_lookups_total",
+    "Cache lookups by result (memory_hit, disk_hit or miss)",
+    "counter",
+    ("cache", "result"),
+    _cache_lookups
+))
+REGISTRY.register(CallbackMetric(
+    "verbatim_cache_hit_ratio",
+    "Fraction of cache lookups served from either tier since startup",
+    "gauge",
+    ("cache",),
+    _cache_hit_ratios
+))
+
+
+class StageTimer:
+    """Outcome holder for observe_stage; set .outcome before the block ends"""
+
+    def __init__(self, outcome: str = "success"):
+        self.outcome = outcome
+
+
+@contextmanager
+def observe_stage(stage: str, model: Optional[str] = None) -> Iterator[StageTimer]:
+    """
+    Time a block as one observation of STAGE_SECONDS.
+    The outcome defaults to "success", "cancelled" if the caller went away,
+    or "error" if the block raises; callers that report errors as return
+    values set timer.outcome themselves.
+    """
+    timer = StageTimer()
+    started = time.perf_counter()
+    try:
+        yield timer
+    except (asyncio.CancelledError, GeneratorExit):
+        if timer.outcome == "success":
+            timer.outcome = "cancelled"
+        raise
+    except BaseException:
+        if timer.outcome == "success":
+            timer.outcome = "error"
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage, model=model_label(model), outcome=timer.outcome)
+
+
+def record_token_usage(model: str, usage: Optional[Dict[str, Any]]) -> None:
+    """Count the prompt and completion tokens from an OpenRouter usage block"""
+    if not usage:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = usage.get(f"{kind}_tokens")
+        if tokens:
+            LLM_TOKENS.inc(tokens, model=model_label(model), kind=kind)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+class InFlightMiddleware:
+    """
+    ASGI middleware tracking HTTP requests in flight. Written as plain ASGI
+    rather than with @app.middleware so streamed responses count until the
+    stream ends, not just until the headers are sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            HTTP_IN_FLIGHT.dec()
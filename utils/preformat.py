@@ -0,0 +1,167 @@
+"""
+Deterministic, CPU-only clean-up of caption segments.
+
+Auto-generated captions repeat the tail of one caption at the start of the
+next, carry [Music]/[Applause] markers and split sentences into fragments
+of a few words. preformat_transcript() removes the noise and re-segments
+the words into one sentence per line before the transcript is sent to the
+LLM, which saves prompt tokens; fast_format() goes on to build paragraphs
+and is a complete (if plainer) formatting with no LLM call at all.
+"""
+import re
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
+from utils.metrics import observe_stage
+from utils.segments import SegmentStore
+from utils.transcript import parse_segment_store
+
+# Non-speech markers added by YouTube's captioning
+_NOISE_TAG = re.compile(
+    r"[\[(]\s*(?:music|applause|laughter|laughs|laughing|cheering|cheers|inaudible|silence|"
+    r"noise|background noise|crosstalk|foreign|__)\s*[\])]|[♪♫]+",
+    re.IGNORECASE
+)
+# Reported as the model of fast-mode output
+FAST_MODE = "fast"
+
+# ">>" marks a change of speaker in auto-generated captions
+_SPEAKER_CHANGE = ">>"
+
+# A gap between captions this long (seconds) ends a sentence, a longer one a paragraph
+SENTENCE_PAUSE = 1.0
+PARAGRAPH_PAUSE = 2.5
+# Sentences without punctuation are cut at the first opener past SOFT_SENTENCE_WORDS,
+# and at MAX_SENTENCE_WORDS regardless
+SOFT_SENTENCE_WORDS = 18
+MAX_SENTENCE_WORDS = 40
+PARAGRAPH_SENTENCES = 5
+PARAGRAPH_WORDS = 120
+# Shortest and longest repeated runs of words treated as caption overlap
+MIN_OVERLAP_WORDS = 2
+MAX_OVERLAP_WORDS = 30
+
+_SENTENCE_OPENERS = frozenset({
+    "so", "but", "and", "now", "okay", "ok", "because", "then", "well", "anyway", "actually", "also",
+})
+_TERMINAL = (".", "!", "?")
+
+
+class _Word(NamedTuple):
+    text: str
+    sentence_break: bool  # a sentence may not continue across the gap before this word
+    paragraph_break: bool
+
+
+def _normalize(word: str) -> str:
+    return word.strip(".,!?;:\"'").lower()
+
+
+def _overlap(history: List[str], words: List[str]) -> int:
+    """Number of leading words of a caption that repeat the end of the text before it"""
+    longest = min(len(history), len(words), MAX_OVERLAP_WORDS)
+    for size in range(longest, MIN_OVERLAP_WORDS - 1, -1):
+        if [_normalize(word) for word in history[-size:]] == [_normalize(word) for word in words[:size]]:
+            return size
+    return 0
+
+
+def _words(store: SegmentStore) -> List[_Word]:
+    """The caption words in order, without noise tags or repeated overlaps, with pause breaks"""
+    words: List[_Word] = []
+    history: List[str] = []
+    previous_end: Optional[float] = None
+    for index in range(len(store)):
+        text = store.text(index)
+        speaker_change = _SPEAKER_CHANGE in text
+        tokens = _NOISE_TAG.sub(" ", text.replace(_SPEAKER_CHANGE, " ")).split()
+
+        gap = 0.0
+        if store.has_timings:
+            start = store.starts[index]
+            if previous_end is not None:
+                gap = start - previous_end
+            previous_end = max(previous_end or 0.0, start + store.durations[index])
+
+        tokens = tokens[_overlap(history, tokens):]
+        if not tokens:
+            continue
+        paragraph_break = speaker_change or gap >= PARAGRAPH_PAUSE
+        for position, token in enumerate(tokens):
+            first = position == 0
+            words.append(_Word(
+                token,
+                sentence_break=first and (paragraph_break or gap >= SENTENCE_PAUSE),
+                paragraph_break=first and paragraph_break
+            ))
+        history = (history + tokens)[-MAX_OVERLAP_WORDS:]
+    return words
+
+
+def _finish_sentence(words: List[str]) -> str:
+    text = " ".join("I" + word[1:] if _normalize(word) in ("i", "i'm", "i've", "i'll", "i'd") else word
+                    for word in words)
+    text = text[0].upper() + text[1:]
+    return text if text.endswith(_TERMINAL) else text.rstrip(",;:") + "."
+
+
+def _sentences(words: List[_Word]) -> List[tuple]:
+    """(sentence, starts_paragraph) pairs"""
+    sentences = []
+    current: List[str] = []
+    paragraph = True
+    for word in words:
+        cut = current and (
+            word.sentence_break
+            or len(current) >= MAX_SENTENCE_WORDS
+            or (len(current) >= SOFT_SENTENCE_WORDS and _normalize(word.text) in _SENTENCE_OPENERS)
+        )
+        if cut:
+            sentences.append((_finish_sentence(current), paragraph))
+            current, paragraph = [], False
+        paragraph = paragraph or word.paragraph_break
+        current.append(word.text)
+        if word.text.endswith(_TERMINAL):
+            sentences.append((_finish_sentence(current), paragraph))
+            current, paragraph = [], False
+    if current:
+        sentences.append((_finish_sentence(current), paragraph))
+    return sentences
+
+
+def preformat_sentences(store: SegmentStore) -> List[str]:
+    """Clean segments and re-segment them into sentences"""
+    return [sentence for sentence, _ in _sentences(_words(store))]
+
+
+def preformat_transcript(raw_transcript: str) -> str:
+    """
+    Clean a raw transcript (any supported format) for the LLM: noise tags and
+    repeated overlaps removed and fragments merged, one sentence per line
+    """
+    with observe_stage("preformat"):
+        return "\n".join(preformat_sentences(parse_segment_store(raw_transcript)))
+
+
+def fast_format(raw_transcript: str) -> str:
+    """
+    Format a raw transcript without an LLM: cleaned sentences grouped into
+    paragraphs at long pauses, speaker changes, or every few sentences
+    """
+    with observe_stage("fast_format"):
+        paragraphs: List[List[str]] = []
+        words = 0
+        for sentence, starts_paragraph in _sentences(_words(parse_segment_store(raw_transcript))):
+            if not paragraphs or starts_paragraph or len(paragraphs[-1]) >= PARAGRAPH_SENTENCES or words >= PARAGRAPH_WORDS:
+                paragraphs.append([])
+                words = 0
+            paragraphs[-1].append(sentence)
+            words += sentence.count(" ") + 1
+        return "\n\n".join(" ".join(paragraph) for paragraph in paragraphs)
+
+
+async def fast_format_events(raw_transcript: str) -> AsyncIterator[Dict[str, Any]]:
+    """fast_format() as the events of a streamed format (see LLMFormatter.stream_format_transcript)"""
+    yield {"event": "start", "total_chunks": 1, "model": FAST_MODE, "job_id": None}
+    yield {"event": "chunk_start", "chunk": 1, "total_chunks": 1}
+    yield {"event": "token", "chunk": 1, "text": fast_format(raw_transcript)}
+    yield {"event": "chunk_end", "chunk": 1, "cached": False, "model": FAST_MODE, "continuations": 0}
+    yield {"event": "done", "total_chunks": 1, "job_id": None, "continuations": 0}
@@ -0,0 +1,161 @@
+"""
+Live progress of multi-chunk formatting jobs.
+
+The worker process running a job publishes chunk started / completed /
+retried events with the elapsed time and an ETA. Clients follow them with
+GET /api/format/jobs/{job_id}/events and can cancel the job instead of
+resubmitting it. Progress lives in memory, so it is visible from the
+worker that runs the job; the job store keeps the durable status.
+"""
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Set, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Finished jobs stay visible this long, so a client that subscribes late still sees the outcome
+FINISHED_TTL = 300.0
+
+CANCELLED_ERROR = "Formatting was cancelled. Send the job_id again to resume it."
+
+
+class FormatProgress:
+    """Progress of one running job, fanned out to any number of subscribers"""
+
+    def __init__(self, job_id: str, total_chunks: int, done_chunks: int = 0):
+        self.job_id = job_id
+        self.total_chunks = total_chunks
+        # Chunks checkpointed before this run; they do not count towards the ETA
+        self.done_before = done_chunks
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.completed: Set[int] = set()
+        self.running: Set[int] = set()
+        self.retries = 0
+        self.cancel_requested = False
+        self._task: Optional["asyncio.Future[Any]"] = None
+        # Tasks working on the job's chunks, for jobs that are not run through run()
+        self._chunk_tasks: Set["asyncio.Future[Any]"] = set()
+        self._subscribers: List["asyncio.Queue[Optional[Dict[str, Any]]]"] = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        remaining = self.total_chunks - self.done_before - len(self.completed)
+        eta = None
+        if self.status == "running" and self.completed:
+            # Throughput so far, which already reflects how many chunks run in parallel
+            eta = round(elapsed / len(self.completed) * remaining, 1)
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total_chunks": self.total_chunks,
+            "completed_chunks": self.done_before + len(self.completed),
+            "running_chunks": sorted(self.running),
+            "retries": self.retries,
+            "elapsed": round(elapsed, 1),
+            "eta": eta,
+        }
+
+    def _publish(self, event: str, **fields: Any) -> None:
+        message = {"event": event, **fields, **self.snapshot()}
+        for queue in self._subscribers:
+            queue.put_nowait(message)
+
+    def chunk_started(self, chunk_number: int) -> None:
+        self.running.add(chunk_number)
+        self._publish("chunk_started", chunk=chunk_number)
+
+    def chunk_completed(self, chunk_number: int) -> None:
+        self.running.discard(chunk_number)
+        self.completed.add(chunk_number)
+        self._publish("chunk_completed", chunk=chunk_number)
+
+    def chunk_retried(self, chunk_number: int, attempt: int, error: str) -> None:
+        self.retries += 1
+        self._publish("chunk_retried", chunk=chunk_number, attempt=attempt, error=error)
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        """Record the outcome (completed, failed, cancelled or interrupted) and end every subscription"""
+        if self.finished_at is not None:
+            return
+        self.status, self.error = status, error
+        self.finished_at = time.monotonic()
+        self.running.clear()
+        self._publish("finished", error=error)
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+
+    def cancel(self) -> bool:
+        """Ask the job to stop; False if it is no longer running"""
+        if self.status != "running":
+            return False
+        self.cancel_requested = True
+        self._publish("cancelling")
+        if self._task is not None:
+            self._task.cancel()
+        for task in list(self._chunk_tasks):
+            task.cancel()
+        return True
+
+    async def run(self, work: Awaitable[T]) -> T:
+        """Await work as a task that cancel() can stop"""
+        self._task = asyncio.ensure_future(work)
+        try:
+            return await self._task
+        finally:
+            self._task = None
+
+    def track(self, task: "asyncio.Future[Any]") -> None:
+        """Have cancel() stop a task working on one of the job's chunks"""
+        self._chunk_tasks.add(task)
+        task.add_done_callback(self._chunk_tasks.discard)
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """A snapshot, then every event until the job finishes"""
+        queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            yield {"event": "snapshot", **self.snapshot()}
+            if self.finished_at is not None:
+                yield {"event": "finished", "error": self.error, **self.snapshot()}
+                return
+            while True:
+                message = await queue.get()
+                if message is None:
+                    return
+                yield message
+        finally:
+            self._subscribers.remove(queue)
+
+
+class ProgressRegistry:
+    """Progress of the jobs run by this process, by job ID"""
+
+    def __init__(self):
+        self._jobs: Dict[str, FormatProgress] = {}
+
+    def start(self, job_id: str, total_chunks: int, done_chunks: int = 0) -> FormatProgress:
+        self._prune()
+        previous = self._jobs.get(job_id)
+        if previous is not None:
+            previous.finish("interrupted")
+        progress = FormatProgress(job_id, total_chunks, done_chunks)
+        self._jobs[job_id] = progress
+        return progress
+
+    def get(self, job_id: str) -> Optional[FormatProgress]:
+        return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - FINISHED_TTL
+        for job_id, progress in list(self._jobs.items()):
+            if progress.finished_at is not None and progress.finished_at < cutoff:
+                del self._jobs[job_id]
+
+
+format_progress = ProgressRegistry()
@@ -0,0 +1,281 @@
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+import httpx
+from config import Config
+from utils.metrics import REGISTRY, CallbackMetric, Counter, model_label
+
+logger = logging.getLogger(__name__)
+
+# Upstream responses worth retrying: rate limits, timeouts and server-side failures
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Connection-level failures worth retrying; read timeouts are not, since the
+# request may still be running upstream and REQUEST_TIMEOUT is already long
+RETRYABLE_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+# Models and API keys come from the client, so only the most recently used are tracked
+MAX_TRACKED_MODELS = 256
+MAX_TRACKED_BUCKETS = 1024
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+LLM_RETRIES = REGISTRY.register(Counter(
+    "verbatim_llm_retries_total",
+    "LLM calls retried after a retryable failure, by model and reason",
+    ("model", "reason")
+))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given (1-based) retry attempt"""
+    ceiling = min(Config.LLM_RETRY_MAX_DELAY, Config.LLM_RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+
+class TokenBucket:
+    """
+    Request rate limiter refilled continuously at `rate_per_minute`, holding
+    at most a minute's worth of requests. A 429 pauses the bucket so every
+    caller sharing it backs off, not just the one that was rejected.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, float(rate_per_minute))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take one request slot and return how long to wait before using it"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.paused_until - now)
+
+    def release(self) -> None:
+        """Give back a slot that was reserved but not used"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker: after LLM_BREAKER_FAILURE_THRESHOLD consecutive
+    failures the model is skipped for LLM_BREAKER_RESET_TIMEOUT seconds, then
+    a single trial call decides whether it closes again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Start of the half-open trial call; a trial that never reports back
+        # (e.g. its request was cancelled) is replaced after reset_timeout
+        self.trial_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        now = time.monotonic()
+        if state == "half_open" and (self.trial_started is None or now - self.trial_started >= self.reset_timeout):
+            self.trial_started = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True if this opened the breaker"""
+        self.failures += 1
+        reopened = self.trial_started is not None
+        self.trial_started = None
+        if reopened or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+
+def _get_or_create(table: "OrderedDict[K, V]", key: K, create: Callable[[], V], limit: int) -> V:
+    """Look up an entry, creating it if needed and dropping the least recently used beyond limit"""
+    value = table.get(key)
+    if value is None:
+        value = table[key] = create()
+        if len(table) > limit:
+            table.popitem(last=False)
+    else:
+        table.move_to_end(key)
+    return value
+
+
+class UpstreamGuard:
+    """
+    Rate limiting and circuit breaking shared by every LLM call in the process.
+    Buckets and breakers are kept for the MAX_TRACKED_BUCKETS and
+    MAX_TRACKED_MODELS most recently used keys and models.
+    """
+
+    def __init__(self):
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict()
+
+    def _rate_for(self, model: str) -> int:
+        if model.endswith(":free") and Config.LLM_FREE_REQUESTS_PER_MINUTE > 0:
+            return Config.LLM_FREE_REQUESTS_PER_MINUTE
+        return Config.LLM_REQUESTS_PER_MINUTE
+
+    def bucket(self, model: str, api_key: str) -> Optional[TokenBucket]:
+        rate = self._rate_for(model)
+        if rate <= 0:
+            return None
+        key = (model, hashlib.sha256(api_key.encode("utf-8")).hexdigest())
+        return _get_or_create(self._buckets, key, lambda: TokenBucket(rate), MAX_TRACKED_BUCKETS)
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        return _get_or_create(
+            self._breakers,
+            model,
+            lambda: CircuitBreaker(Config.LLM_BREAKER_FAILURE_THRESHOLD, Config.LLM_BREAKER_RESET_TIMEOUT),
+            MAX_TRACKED_MODELS
+        )
+
+    async def acquire(self, model: str, api_key: str) -> Optional[str]:
+        """
+        Wait for a request slot for this model and key.
+        Returns an error message instead of waiting when the model's circuit
+        is open or the wait would exceed LLM_RATE_LIMIT_MAX_WAIT.
+        """
+        breaker = self.breaker(model)
+        if breaker.state == "open":
+            return self._unavailable(model, breaker)
+
+        bucket = self.bucket(model, api_key)
+        wait = bucket.reserve() if bucket is not None else 0.0
+        if wait > Config.LLM_RATE_LIMIT_MAX_WAIT:
+            bucket.release()
+            return f"Rate limit reached for {model}. Please try again in {int(wait) + 1}s."
+        if wait > 0:
+            logger.info(f"Waiting {wait:.1f}s for a {model} request slot")
+            await asyncio.sleep(wait)
+
+        # Checked last so a half-open breaker's single trial is not used up while waiting
+        if not breaker.allow():
+            if bucket is not None:
+                bucket.release()
+            return self._unavailable(model, breaker)
+        return None
+
+    @staticmethod
+    def _unavailable(model: str, breaker: CircuitBreaker) -> str:
+        return (
+            f"Model {model} is temporarily unavailable after repeated failures. "
+            f"Try again in {int(breaker.retry_in()) + 1}s or choose another model."
+        )
+
+    def record_response(self, model: str, api_key: str, status_code: int, retry_after: Optional[float]) -> None:
+        """
+        Account for an unsuccessful response: a 429 holds back every caller of
+        this model and key, server errors count towards opening the circuit
+        """
+        if status_code == 429:
+            bucket = self.bucket(model, api_key)
+            if bucket is not None:
+                bucket.pause(retry_after if retry_after is not None else backoff_delay(1))
+        elif status_code == 408 or status_code >= 500:
+            self.record_failure(model)
+
+    def record_success(self, model: str) -> None:
+        self.breaker(model).record_success()
+
+    def record_failure(self, model: str) -> None:
+        """Record a server-side or connection failure of a model"""
+        if self.breaker(model).record_failure():
+            logger.warning(
+                f"Circuit opened for {model} after repeated failures; "
+                f"skipping it for {Config.LLM_BREAKER_RESET_TIMEOUT}s"
+            )
+
+    def retry_delay(self, model: str, attempt: int, reason: str, retry_after: Optional[float],
+                    max_retries: Optional[int] = None) -> Optional[float]:
+        """
+        Delay before retry number `attempt`, or None when no retry should be made
+        (retries exhausted, or Retry-After asks for longer than LLM_RETRY_MAX_DELAY).
+        max_retries defaults to LLM_MAX_RETRIES.
+        """
+        max_retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        if attempt > max_retries:
+            return None
+        if retry_after is not None:
+            if retry_after > Config.LLM_RETRY_MAX_DELAY:
+                return None
+            delay = retry_after + random.uniform(0, Config.LLM_RETRY_BASE_DELAY)
+        else:
+            delay = backoff_delay(attempt)
+        LLM_RETRIES.inc(model=model_label(model), reason=reason)
+        logger.warning(f"Retrying {model} in {delay:.1f}s after {reason} (retry {attempt}/{max_retries})")
+        return delay
+
+    def circuit_states(self):
+        # Models past MAX_MODEL_LABELS share one series, which is open if any of them is
+        states: Dict[str, int] = {}
+        for model, breaker in list(self._breakers.items()):
+            label = model_label(model)
+            states[label] = max(states.get(label, 0), 0 if breaker.state == "closed" else 1)
+        for label, state in states.items():
+            yield (label,), state
+
+
+llm_guard = UpstreamGuard()
+
+REGISTRY.register(CallbackMetric(
+    "verbatim_llm_circuit_open",
+    "1 while a model's circuit breaker is open or half-open",
+    "gauge",
+    ("model",),
+    llm_guard.circuit_states
+))
@@ -0,0 +1,120 @@
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from config import Config
+from utils.chunker import ModelLimits, get_model_limits
+from utils.resilience import llm_guard
+
+logger = logging.getLogger(__name__)
+
+# Model name that asks for routing across the candidate models
+AUTO_MODEL = "auto"
+
+# An avoided model's error rate halves every this many seconds without calls,
+# so it is tried again once it had time to recover
+ERROR_RATE_HALF_LIFE = 300.0
+
+# Candidates used when AUTO_MODEL_CANDIDATES is empty: the models offered in the UI
+MODELS_FILE = Path(__file__).resolve().parent.parent / "static" / "models.md"
+
+
+def load_candidates() -> List[str]:
+    """Candidate models from AUTO_MODEL_CANDIDATES, or else from static/models.md"""
+    if Config.AUTO_MODEL_CANDIDATES.strip():
+        return [model.strip() for model in Config.AUTO_MODEL_CANDIDATES.split(",") if model.strip()]
+    try:
+        lines = MODELS_FILE.read_text(encoding="utf-8").splitlines()
+    except OSError as e:
+        logger.warning(f"Could not read {MODELS_FILE}, auto routing falls back to {Config.DEFAULT_MODEL}: {e}")
+        return [Config.DEFAULT_MODEL]
+    return [line.strip() for line in lines if line.strip() and "/" in line]
+
+
+class ModelStats:
+    """Exponentially weighted moving averages of one model's call latency and error rate"""
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self._error_rate = 0.0
+        self.updated = time.monotonic()
+        self.calls = 0
+
+    @property
+    def error_rate(self) -> float:
+        idle = time.monotonic() - self.updated
+        return self._error_rate * 0.5 ** (idle / ERROR_RATE_HALF_LIFE)
+
+    def record(self, seconds: float, ok: bool, alpha: float) -> None:
+        self.calls += 1
+        self._error_rate = alpha * (0.0 if ok else 1.0) + (1 - alpha) * self.error_rate
+        self.updated = time.monotonic()
+        # Failures often return quickly, so only successful calls say how fast a model is
+        if ok:
+            self.latency = seconds if self.latency is None else alpha * seconds + (1 - alpha) * self.latency
+
+
+class ModelRouter:
+    """
+    Ranks the candidate models for "auto" requests. Healthy models (error
+    rate under AUTO_MODEL_MAX_ERROR_RATE and circuit not open) come first,
+    fastest first, with models not yet measured tried before measured ones
+    so every candidate gets a latency sample. Unhealthy models follow, least
+    failing first, as a last resort.
+    """
+
+    def __init__(self):
+        self._candidates: Optional[List[str]] = None
+        self._stats: Dict[str, ModelStats] = {}
+
+    @property
+    def candidates(self) -> List[str]:
+        if self._candidates is None:
+            self._candidates = load_candidates()
+            logger.info(f"Auto model routing across {len(self._candidates)} candidates")
+        return self._candidates
+
+    def stats(self, model: str) -> ModelStats:
+        if model not in self._stats:
+            self._stats[model] = ModelStats()
+        return self._stats[model]
+
+    def is_healthy(self, model: str) -> bool:
+        return (
+            self.stats(model).error_rate < Config.AUTO_MODEL_MAX_ERROR_RATE
+            and llm_guard.breaker(model).state != "open"
+        )
+
+    def ranked(self) -> List[str]:
+        healthy = [model for model in self.candidates if self.is_healthy(model)]
+        unhealthy = [model for model in self.candidates if model not in healthy]
+        healthy.sort(key=lambda model: (self.stats(model).latency is not None, self.stats(model).latency or 0.0))
+        unhealthy.sort(key=lambda model: self.stats(model).error_rate)
+        return healthy + unhealthy
+
+    def record(self, model: str, seconds: float, ok: bool) -> None:
+        self.stats(model).record(seconds, ok, Config.AUTO_MODEL_EWMA_ALPHA)
+
+    def limits(self) -> ModelLimits:
+        """The tightest limits of any candidate, so a chunk fits whichever model it is routed to"""
+        all_limits = [get_model_limits(model) for model in self.candidates]
+        return ModelLimits(
+            min(limits.context_tokens for limits in all_limits),
+            min(limits.max_output_tokens for limits in all_limits)
+        )
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Current ranking with each model's averages, for /health"""
+        return [
+            {
+                "model": model,
+                "healthy": self.is_healthy(model),
+                "latency_ewma": round(self.stats(model).latency, 3) if self.stats(model).latency is not None else None,
+                "error_rate_ewma": round(self.stats(model).error_rate, 3),
+                "calls": self.stats(model).calls,
+            }
+            for model in self.ranked()
+        ]
+
+
+model_router = ModelRouter()
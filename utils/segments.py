@@ -0,0 +1,134 @@
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class SegmentStore:
+    """
+    Caption segments held in columns: start times and durations in two
+    float arrays, and every text in one string with an offset per segment.
+    A long video is then a handful of objects instead of a dict per caption,
+    and a time range is found by bisecting the start times.
+    Segments without timings (e.g. a transcript pasted as plain text) have
+    empty time arrays; only segment ranges apply to them.
+    """
+
+    __slots__ = ("starts", "durations", "_text", "_offsets")
+
+    def __init__(self, texts: Iterable[str] = (), starts: Optional[Iterable[float]] = None,
+                 durations: Optional[Iterable[float]] = None):
+        texts = list(texts)
+        self._text = "".join(texts)
+        self._offsets = array("L", [0])
+        position = 0
+        for text in texts:
+            position += len(text)
+            self._offsets.append(position)
+        self.starts = array("d", starts if starts is not None else ())
+        self.durations = array("d", durations if durations is not None else ())
+        if self.starts and (len(self.starts) != len(texts) or len(self.durations) != len(texts)):
+            raise ValueError("starts and durations must have one value per segment")
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]]) -> "SegmentStore":
+        """Build from {"text", "start", "duration"} dicts (youtube-transcript-api raw data)"""
+        texts, starts, durations = [], [], []
+        for entry in entries:
+            texts.append(str(entry.get("text", "")))
+            starts.append(float(entry.get("start", 0.0)))
+            durations.append(float(entry.get("duration", 0.0)))
+        return cls(texts, starts, durations)
+
+    @property
+    def has_timings(self) -> bool:
+        return len(self.starts) > 0
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def text(self, index: int) -> str:
+        return self._text[self._offsets[index]:self._offsets[index + 1]]
+
+    def texts(self) -> List[str]:
+        return [self.text(index) for index in range(len(self))]
+
+    def slice(self, start: int, stop: int) -> "SegmentStore":
+        """Segments start..stop-1, as a new store"""
+        start, stop = max(0, start), min(len(self), stop)
+        if start >= stop:
+            return SegmentStore()
+        store = SegmentStore.__new__(SegmentStore)
+        base = self._offsets[start]
+        store._text = self._text[base:self._offsets[stop]]
+        store._offsets = array("L", (offset - base for offset in self._offsets[start:stop + 1]))
+        store.starts = self.starts[start:stop] if self.has_timings else array("d")
+        store.durations = self.durations[start:stop] if self.has_timings else array("d")
+        return store
+
+    def time_index(self, seconds: float) -> int:
+        """Index of the first segment still on screen at `seconds` (captions may overlap)"""
+        index = bisect_left(self.starts, seconds)
+        # Earlier segments can still be showing; step back over those that end after `seconds`
+        while index > 0 and self.starts[index - 1] + self.durations[index - 1] > seconds:
+            index -= 1
+        return index
+
+    def select(self, start_time: Optional[float] = None, end_time: Optional[float] = None,
+               start_segment: Optional[int] = None, end_segment: Optional[int] = None) -> "SegmentStore":
+        """
+        The segments in a time range (seconds: those on screen at any point in
+        [start_time, end_time)) and/or a segment range (indexes, end exclusive).
+        Raises ValueError for an empty or inconsistent range.
+        """
+        if start_time is None and end_time is None and start_segment is None and end_segment is None:
+            return self
+
+        first, stop = 0, len(self)
+        if start_segment is not None or end_segment is not None:
+            first = start_segment if start_segment is not None else 0
+            stop = end_segment if end_segment is not None else len(self)
+            if first < 0 or stop < 0:
+                raise ValueError("Segment ranges must not be negative.")
+            if start_segment is not None and end_segment is not None and first >= stop:
+                raise ValueError("start_segment must be less than end_segment.")
+
+        if start_time is not None or end_time is not None:
+            if not self.has_timings:
+                raise ValueError("This transcript has no timestamps, so it can only be cut by segment range.")
+            if start_time is not None and end_time is not None and start_time >= end_time:
+                raise ValueError("start_time must be less than end_time.")
+            if start_time is not None:
+                first = max(first, self.time_index(start_time))
+            if end_time is not None:
+                stop = min(stop, bisect_left(self.starts, end_time))
+
+        selected = self.slice(first, stop)
+        if not len(selected):
+            raise ValueError(f"No transcript segments in the requested range (the transcript has {len(self)} segments).")
+        return selected
+
+    def entries(self, timestamps: bool = True) -> List[Dict[str, Any]]:
+        """The segments as {"text"} dicts, with "start" and "duration" when timestamps is set"""
+        if not (timestamps and self.has_timings):
+            return [{"text": text} for text in self.texts()]
+        return [
+            {"text": self.text(index), "start": self.starts[index], "duration": self.durations[index]}
+            for index in range(len(self))
+        ]
+
+    def to_columns(self) -> Dict[str, Any]:
+        """JSON-ready columns, as stored in the transcript cache"""
+        columns: Dict[str, Any] = {"text": self._text, "offsets": self._offsets.tolist()}
+        if self.has_timings:
+            columns["start"] = [round(value, 3) for value in self.starts]
+            columns["duration"] = [round(value, 3) for value in self.durations]
+        return columns
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Any]) -> "SegmentStore":
+        store = cls.__new__(cls)
+        store._text = columns["text"]
+        store._offsets = array("L", columns["offsets"])
+        store.starts = array("d", columns.get("start", ()))
+        store.durations = array("d", columns.get("duration", ()))
+        return store
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+from utils.metrics import register_single_flight
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _SharedStream:
+    """The items of one in-flight stream, kept for every caller following it"""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.listeners = 0
+        self.task: Optional["asyncio.Future[None]"] = None
+        self._changed = asyncio.Event()
+
+    async def pump(self, items: AsyncIterator[Any]) -> None:
+        try:
+            async for item in items:
+                self.items.append(item)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[Any]:
+        """Every item from the start, then each new one until the stream ends"""
+        position = 0
+        while True:
+            if position < len(self.items):
+                position += 1
+                yield self.items[position - 1]
+            elif self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one upstream operation.
+    The first caller starts the work; callers arriving while it is in flight
+    wait on the same task and receive its result or exception. The task is
+    shielded, so a caller that gives up does not cancel it for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._streams: Dict[Hashable, _SharedStream] = {}
+        self.coalesced = 0
+        register_single_flight(self)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced duplicate {self.name} request onto the in-flight one")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved when every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    async def stream(self, key: Hashable, fn: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Coalesce concurrent streams that share a key. The first caller starts
+        fn() in a task; every caller receives all of its items from the start.
+        The stream is cancelled once the last caller has gone away.
+        """
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = _SharedStream()
+            shared.task = asyncio.ensure_future(shared.pump(fn()))
+            self._streams[key] = shared
+            shared.task.add_done_callback(lambda done: self._forget_stream(key, shared))
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced duplicate {self.name} stream onto the in-flight one")
+
+        shared.listeners += 1
+        try:
+            async for item in shared.follow():
+                yield item
+        finally:
+            shared.listeners -= 1
+            if shared.listeners == 0 and not shared.finished:
+                # Nobody is left to follow it; a later caller starts afresh
+                self._forget_stream(key, shared)
+                shared.task.cancel()
+
+    def _forget_stream(self, key: Hashable, shared: _SharedStream) -> None:
+        if self._streams.get(key) is shared:
+            del self._streams[key]
+
+    def in_flight(self) -> int:
+        return len(self._in_flight) + len(self._streams)
@@ -0,0 +1,52 @@
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from fastapi.responses import StreamingResponse
+from utils import fastjson
+
+
+def encode_sse(event: Dict[str, Any]) -> str:
+    """Encode an event dict (with an 'event' name) as a server-sent event frame"""
+    return f"event: {event['event']}\ndata: {fastjson.dumps(event)}\n\n"
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that calls on_close once it is over, however it ended.
+    Cleanup in the body generator is not enough: when the client disconnects
+    before the first chunk is sent, the generator never starts and its
+    finally block never runs.
+    """
+
+    def __init__(self, *args: Any, on_close: Optional[Callable[[], None]] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                on_close, self.on_close = self.on_close, None
+                on_close()
+
+
+def sse_response(events: AsyncIterator[Dict[str, Any]],
+                 on_close: Optional[Callable[[], None]] = None) -> StreamingResponse:
+    """Stream event dicts to the client as text/event-stream, calling on_close when the response is over"""
+    async def body():
+        async for event in events:
+            yield encode_sse(event)
+
+    return ClosingStreamingResponse(
+        body(),
+        on_close=on_close,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # stop nginx from buffering the stream
+        }
+    )
+
+
+async def sse_error(message: str) -> AsyncIterator[Dict[str, Any]]:
+    """A stream consisting of a single error event"""
+    yield {"event": "error", "error": message}
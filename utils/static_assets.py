@@ -0,0 +1,152 @@
+import os
+import re
+import hashlib
+import logging
+import mimetypes
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from fastapi import Request
+from fastapi.responses import Response
+from config import Config
+from utils.compression import STATIC_LEVELS, available_encodings, compress, is_compressible, negotiate_encoding
+
+logger = logging.getLogger(__name__)
+
+# Versioned URLs (?v=<hash>) change whenever the file does, so they can be cached for good;
+# anything else is revalidated with its ETag on every use
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Smaller files gain nothing worth the Content-Encoding header
+MIN_COMPRESS_BYTES = 256
+
+# /static/... references in HTML, which are rewritten to versioned URLs
+_STATIC_REFERENCE = re.compile(r'''(["'])/static/([^"'?#]+)\1''')
+
+mimetypes.add_type("text/markdown", ".md")
+mimetypes.add_type("text/javascript", ".js")
+
+
+class StaticAsset:
+    """One file held in memory with its content hash and precompressed variants"""
+
+    def __init__(self, path: Path, body: bytes, mtime: float):
+        self.path = path
+        self.body = body
+        self.mtime = mtime
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        # Starlette adds the charset to text/* types itself
+        if content_type == "image/svg+xml":
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        self.variants: Dict[str, bytes] = {}
+        if is_compressible(content_type) and len(body) >= MIN_COMPRESS_BYTES:
+            for encoding in available_encodings():
+                encoded = compress(body, encoding, STATIC_LEVELS[encoding])
+                if len(encoded) < len(body):
+                    self.variants[encoding] = encoded
+
+    def etag(self, encoding: Optional[str]) -> str:
+        # Each coding is a different representation, so it gets its own (strong) ETag
+        return f'"{self.version}-{encoding}"' if encoding else f'"{self.version}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if an If-None-Match header names any representation of this content"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            tag = tag[2:] if tag.startswith("W/") else tag
+            if tag.strip('"').split("-")[0] == self.version:
+                return True
+        return False
+
+
+class StaticAssetStore:
+    """
+    The files under a directory, read and compressed once and served from
+    memory with ETags and Cache-Control headers. HTML pages have their
+    /static/... references rewritten to versioned URLs, so assets loaded by
+    a page are cached by the browser until they change, while the page
+    itself is revalidated (a 304 when nothing changed).
+    Set STATIC_ASSETS_RELOAD to pick up edited files without a restart.
+    """
+
+    def __init__(self, directory: Path, url_prefix: str = "/static"):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self._assets: Optional[Dict[str, StaticAsset]] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Read and compress every file (called on startup, or on first use)"""
+        assets: Dict[str, StaticAsset] = {}
+        if self.directory.is_dir():
+            for path in sorted(self.directory.rglob("*")):
+                if path.is_file() and not any(part.startswith(".") for part in path.relative_to(self.directory).parts):
+                    stat = path.stat()
+                    assets[path.relative_to(self.directory).as_posix()] = StaticAsset(path, path.read_bytes(), stat.st_mtime)
+
+        for name, asset in list(assets.items()):
+            if name.endswith(".html"):
+                assets[name] = StaticAsset(asset.path, self._version_references(asset.body, assets), asset.mtime)
+
+        self._assets = assets
+        compressed = sum(1 for asset in assets.values() if asset.variants)
+        logger.info(f"Loaded {len(assets)} static assets ({compressed} precompressed as {', '.join(available_encodings())})")
+
+    def _version_references(self, html: bytes, assets: Dict[str, StaticAsset]) -> bytes:
+        def versioned(match: re.Match) -> str:
+            quote, name = match.group(1), match.group(2)
+            if name not in assets:
+                return match.group(0)
+            return f"{quote}{self.url_prefix}/{name}?v={assets[name].version}{quote}"
+
+        return _STATIC_REFERENCE.sub(versioned, html.decode("utf-8")).encode("utf-8")
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        with self._lock:
+            if self._assets is None or (Config.STATIC_ASSETS_RELOAD and self._changed(name)):
+                self.load()
+            return self._assets.get(name)
+
+    def _changed(self, name: str) -> bool:
+        asset = self._assets.get(name)
+        path = self.directory / name
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return asset is not None
+        return asset is None or mtime != asset.mtime
+
+    def response(self, request: Request, name: str) -> Optional[Response]:
+        """
+        Response for a GET/HEAD of an asset, or None if there is no such file.
+        Sends 304 when the client's cached copy is current, and the best
+        precompressed variant the client accepts.
+        """
+        asset = self.get(name)
+        if asset is None:
+            return None
+
+        version = request.query_params.get("v")
+        cache_control = IMMUTABLE_CACHE_CONTROL if version == asset.version else REVALIDATE_CACHE_CONTROL
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"), tuple(asset.variants))
+        headers = {"ETag": asset.etag(encoding), "Cache-Control": cache_control}
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        if asset.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        body = asset.variants[encoding] if encoding else asset.body
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(content=body, media_type=asset.content_type, headers=headers)
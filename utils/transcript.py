@@ -0,0 +1,106 @@
+import re
+from typing import List, Optional, Sequence, Union
+from utils import fastjson
+from utils.segments import SegmentStore
+
+# Wire formats for raw transcripts:
+#   json - the original pretty-printed [{"text": ...}] list
+#   text - one caption segment per line, with no JSON overhead
+# With timestamps, json segments also carry "start" and "duration" (seconds)
+# and text lines start with the caption's time, e.g. "[1:02:03] ..."
+TRANSCRIPT_FORMATS = ("json", "text")
+DEFAULT_TRANSCRIPT_FORMAT = "json"
+
+# "[12:34] " or "[1:02:03.5] " at the start of a text line
+_TIMESTAMP_PREFIX = re.compile(r"^\[(?:(\d+):)?(\d{1,2}):(\d{2}(?:\.\d+)?)\]\s*")
+
+
+def _single_line(text: str) -> str:
+    """Collapse line breaks inside a caption so it fits on one line"""
+    return " ".join(text.split())
+
+
+def format_timestamp(seconds: float) -> str:
+    """12:34 below an hour, 1:02:03 from an hour on"""
+    total = int(seconds)
+    hours, minutes, secs = total // 3600, total // 60 % 60, total % 60
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+def serialize_segments(segments: Union[SegmentStore, Sequence[str]], transcript_format: str = DEFAULT_TRANSCRIPT_FORMAT,
+                       timestamps: bool = False) -> str:
+    """
+    Serialize segments in the requested wire format. Timestamps are only
+    written for a SegmentStore that has timings.
+    """
+    if transcript_format not in TRANSCRIPT_FORMATS:
+        raise ValueError(f"Unknown transcript format: {transcript_format}")
+    store = segments if isinstance(segments, SegmentStore) else None
+    timestamps = timestamps and store is not None and store.has_timings
+    if transcript_format == "json":
+        entries = store.entries(timestamps) if store is not None else [{"text": text} for text in segments]
+        return fastjson.dumps(entries, indent=True)
+    if timestamps:
+        return "\n".join(
+            f"[{format_timestamp(store.starts[index])}] {_single_line(store.text(index))}"
+            for index in range(len(store))
+        )
+    texts = store.texts() if store is not None else segments
+    return "\n".join(_single_line(text) for text in texts)
+
+
+def _parse_timestamp(match: "re.Match") -> float:
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def parse_segment_store(raw_transcript: str) -> SegmentStore:
+    """
+    Read segments from a raw transcript in any supported format.
+    A JSON list of {"text": ...} objects (or of strings) is read as segments,
+    with their timings when every object has a "start"; anything else is
+    treated as text with one segment per non-empty line, timed when every
+    line starts with a timestamp.
+    """
+    stripped = raw_transcript.strip()
+    if stripped.startswith("["):
+        try:
+            data = fastjson.loads(stripped)
+        except ValueError:
+            data = None
+        if isinstance(data, list):
+            if all(isinstance(item, dict) for item in data):
+                if data and all("start" in item for item in data):
+                    return SegmentStore.from_entries(data)
+                return SegmentStore(str(item.get("text", "")) for item in data)
+            if all(isinstance(item, str) for item in data):
+                return SegmentStore(data)
+
+    texts: List[str] = []
+    starts: List[Optional[float]] = []
+    for line in raw_transcript.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = _TIMESTAMP_PREFIX.match(line)
+        text = line[match.end():] if match else line
+        if not text:
+            continue
+        texts.append(text)
+        starts.append(_parse_timestamp(match) if match else None)
+
+    if not texts or any(start is None for start in starts):
+        return SegmentStore(texts)
+    # Text lines only carry start times; each segment lasts until the next one starts
+    durations = [max(0.0, later - start) for start, later in zip(starts, starts[1:])] + [0.0]
+    return SegmentStore(texts, starts, durations)
+
+
+def parse_segments(raw_transcript: str) -> List[str]:
+    """Read segment texts from a raw transcript in any supported format"""
+    return parse_segment_store(raw_transcript).texts()
+
+
+def to_prompt_text(segments: Sequence[str]) -> str:
+    """Compact form sent to the LLM: one segment per line"""
+    return serialize_segments(segments, "text")
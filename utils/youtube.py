@@ -1,12 +1,161 @@
 import re
+import asyncio
 import logging
-from typing import Optional, Tuple
-from youtube_transcript_api import YouTubeTranscriptApi
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from config import Config
+from utils import fastjson
+from utils.cache import TieredCache, build_tiered_cache
+from utils.metrics import observe_stage
+from utils.segments import SegmentStore
+from utils.singleflight import SingleFlight
+from utils.transcript import DEFAULT_TRANSCRIPT_FORMAT, serialize_segments
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# youtube-transcript-api is blocking, so fetches run on a dedicated, bounded
+# thread pool instead of the event loop (or the default executor shared with
+# everything else).
+_fetch_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_fetch_executor() -> ThreadPoolExecutor:
+    global _fetch_executor
+    if _fetch_executor is None:
+        _fetch_executor = ThreadPoolExecutor(
+            max_workers=max(1, Config.TRANSCRIPT_FETCH_WORKERS),
+            thread_name_prefix="transcript-fetch"
+        )
+    return _fetch_executor
+
+
+def shutdown_fetch_executor() -> None:
+    """Stop the transcript fetch pool (called on application shutdown)"""
+    global _fetch_executor
+    if _fetch_executor is not None:
+        _fetch_executor.shutdown(wait=False, cancel_futures=True)
+        _fetch_executor = None
+
+
+# Transcripts are cached per video and caption track, and each video's track
+# listing is cached as well, so popular videos are served without going back
+# to YouTube whatever languages a request prefers.
+DEFAULT_LANGUAGES = ['en', 'en-US']
+_transcript_cache: Optional[TieredCache] = None
+
+
+def get_transcript_cache() -> Optional[TieredCache]:
+    """Return the transcript cache, or None when caching is disabled"""
+    global _transcript_cache
+    if not Config.TRANSCRIPT_CACHE_ENABLED:
+        return None
+    if _transcript_cache is None:
+        _transcript_cache = build_tiered_cache(
+            "transcripts",
+            max_entries=Config.TRANSCRIPT_CACHE_MAX_ENTRIES,
+            ttl=Config.TRANSCRIPT_CACHE_TTL,
+            path=Config.CACHE_DB_PATH,
+            max_bytes=Config.TRANSCRIPT_CACHE_MAX_BYTES,
+            memory_max_bytes=Config.TRANSCRIPT_CACHE_MEMORY_MAX_BYTES
+        )
+    return _transcript_cache
+
+
+class CaptionTrack(NamedTuple):
+    """One caption track of a video, as listed by YouTube"""
+    language_code: str
+    language: str
+    is_generated: bool
+
+    @property
+    def key(self) -> str:
+        return f"{self.language_code}:{'generated' if self.is_generated else 'manual'}"
+
+
+class Captions(NamedTuple):
+    """The segments of the track picked for a request, with the video's track listing"""
+    segments: SegmentStore
+    track: CaptionTrack
+    tracks: List[CaptionTrack]
+
+
+NO_TRANSCRIPT_ERROR = "No transcript found for this video. The video may not have captions available."
+
+
+def _primary_subtag(language_code: str) -> str:
+    return language_code.lower().split("-", 1)[0]
+
+
+def pick_track(tracks: Sequence[CaptionTrack], languages: Sequence[str]) -> Optional[CaptionTrack]:
+    """
+    The track to serve for a language preference list (most preferred first).
+    For each language in turn a manual track beats an auto-generated one, and
+    an exact language code beats a regional variant ("en" matches "en-GB").
+    Without any match the first manual track, then the first generated one,
+    is used. None when the video has no tracks.
+    """
+    for language in languages:
+        wanted = language.lower()
+        for generated in (False, True):
+            candidates = [track for track in tracks if track.is_generated == generated]
+            for track in candidates:
+                if track.language_code.lower() == wanted:
+                    return track
+            for track in candidates:
+                if _primary_subtag(track.language_code) == _primary_subtag(wanted):
+                    return track
+    for generated in (False, True):
+        for track in tracks:
+            if track.is_generated == generated:
+                return track
+    return None
+
+
+def _segments_cache_key(video_id: str, track: CaptionTrack) -> str:
+    return f"{video_id}:{track.key}"
+
+
+def _tracks_cache_key(video_id: str) -> str:
+    return f"{video_id}:tracks"
+
+
+def _load_cached_segments(value: str) -> Optional[SegmentStore]:
+    """Segments from a cache entry, or None for entries written before timings were kept"""
+    data = fastjson.loads(value)
+    if not isinstance(data, dict):
+        return None  # a plain list of texts: refetch so time ranges work
+    return SegmentStore.from_columns(data)
+
+
+def _load_cached_tracks(value: str) -> List[CaptionTrack]:
+    return [CaptionTrack(**track) for track in fastjson.loads(value)]
+
+
+def _cache_captions(video_id: str, captions: Captions) -> None:
+    cache = get_transcript_cache()
+    if cache is None:
+        return
+    cache.set_in_background(_tracks_cache_key(video_id), fastjson.dumps([track._asdict() for track in captions.tracks]))
+    cache.set_in_background(_segments_cache_key(video_id, captions.track), fastjson.dumps(captions.segments.to_columns()))
+
+
+def _error_message(video_id: str, e: Exception) -> str:
+    """User-facing message for a failed fetch"""
+    detail = f"{type(e).__name__}: {str(e)}"
+    logger.error(f"Error fetching transcript for {video_id}: {detail}")
+    if "No transcripts" in detail or "TranscriptsDisabled" in detail or "NoTranscriptFound" in detail:
+        return NO_TRANSCRIPT_ERROR
+    if "VideoUnavailable" in detail or "unavailable" in detail.lower():
+        return "Video is unavailable or does not exist."
+    return f"Error fetching transcript: {str(e)}"
+
+
+# Concurrent requests for the same video and track share one YouTube fetch
+transcript_flights = SingleFlight("transcript")
+
+
 class YouTubeTranscriptFetcher:
     """Handle YouTube video transcript fetching"""
 
@@ -18,62 +167,148 @@ class YouTubeTranscriptFetcher:
             r'youtube\.com/watch\?.*v=([a-zA-Z0-9_-]{11})',
         ]
 
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
-        return None
+        with observe_stage("video_id") as stage:
+            for pattern in patterns:
+                match = re.search(pattern, url)
+                if match:
+                    return match.group(1)
+            stage.outcome = "invalid"
+            return None
 
     @staticmethod
-    def get_transcript(video_id: str) -> Tuple[Optional[str], Optional[str]]:
+    def fetch_captions(video_id: str, languages: Optional[Sequence[str]] = None) -> Tuple[Optional[Captions], Optional[str]]:
         """
-        Fetch transcript for a YouTube video using the correct API
-        Returns: (transcript_text, error_message)
+        Fetch the caption segments of a YouTube video: list its tracks once,
+        pick the best one for the language preference locally (see pick_track)
+        and download only that track.
+        Returns: (captions, error_message)
         """
-        logger.info(f"Attempting to fetch transcript for video ID: {video_id}")
+        languages = languages or DEFAULT_LANGUAGES
+        logger.info(f"Attempting to fetch transcript for video ID: {video_id} (languages {', '.join(languages)})")
+
+        # Imported here so the app starts without loading youtube-transcript-api (and requests)
+        from youtube_transcript_api import YouTubeTranscriptApi
 
         try:
-            # Create an instance of YouTubeTranscriptApi
-            ytt_api = YouTubeTranscriptApi()
-
-            # First, try to list available transcripts
-            try:
-                transcript_list = ytt_api.list(video_id)
-                logger.info(f"Available transcripts for {video_id}:")
-                for transcript in transcript_list:
-                    logger.info(f"  - Language: {transcript.language_code} ({transcript.language}), Generated: {transcript.is_generated}")
-            except Exception as list_error:
-                logger.warning(f"Could not list transcripts: {str(list_error)}")
-
-            # Try to fetch the transcript (prioritize English, then any available language)
-            try:
-                # Try English first
-                fetched_transcript = ytt_api.fetch(video_id, languages=['en', 'en-US'])
-            except:
-                # If English not available, try any available language
-                fetched_transcript = ytt_api.fetch(video_id)
-
-            # Convert to raw data format
-            transcript_data = fetched_transcript.to_raw_data()
-            # Remove 'start' and 'duration' from each segment
-            simplified_transcript = [{"text": seg["text"]} for seg in transcript_data]
-
-            logger.info(f"Successfully fetched transcript with {len(simplified_transcript)} segments")
-
-            # Format as pretty-printed string for display
-            import json
-            raw_transcript_str = json.dumps(simplified_transcript, indent=2, ensure_ascii=False)
-
-            return raw_transcript_str, None
+            transcripts = list(YouTubeTranscriptApi().list(video_id))
+            tracks = [
+                CaptionTrack(transcript.language_code, transcript.language, transcript.is_generated)
+                for transcript in transcripts
+            ]
+            logger.info(f"Available transcripts for {video_id}: {', '.join(track.key for track in tracks) or 'none'}")
+
+            track = pick_track(tracks, languages)
+            if track is None:
+                return None, NO_TRANSCRIPT_ERROR
+
+            # Keep the text and timing of each segment in columns
+            fetched_transcript = transcripts[tracks.index(track)].fetch()
+            segments = SegmentStore.from_entries(fetched_transcript.to_raw_data())
+
+            logger.info(f"Successfully fetched transcript ({track.key}) with {len(segments)} segments")
+            return Captions(segments, track, tracks), None
 
         except Exception as e:
-            error_msg = f"Error fetching transcript for {video_id}: {type(e).__name__}: {str(e)}"
-            logger.error(error_msg)
-
-            # Check for specific error types and provide user-friendly messages
-            if "No transcripts" in str(e) or "TranscriptsDisabled" in str(e):
-                return None, "No transcript found for this video. The video may not have captions available."
-            elif "VideoUnavailable" in str(e) or "unavailable" in str(e).lower():
-                return None, "Video is unavailable or does not exist."
-            else:
-                return None, f"Error fetching transcript: {str(e)}"
\ No newline at end of file
+            return None, _error_message(video_id, e)
+
+    @staticmethod
+    def fetch_segments(video_id: str, languages: Optional[Sequence[str]] = None) -> Tuple[Optional[SegmentStore], Optional[str]]:
+        """
+        Fetch the caption segments of a YouTube video (see fetch_captions)
+        Returns: (segments, error_message)
+        """
+        captions, error = YouTubeTranscriptFetcher.fetch_captions(video_id, languages)
+        return (captions.segments if captions else None), error
+
+    @staticmethod
+    def get_transcript(video_id: str, transcript_format: str = DEFAULT_TRANSCRIPT_FORMAT,
+                       timestamps: bool = False, languages: Optional[Sequence[str]] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Fetch transcript for a YouTube video, serialized in the requested format
+        ("json" or "text", see utils.transcript)
+        Returns: (transcript_text, error_message)
+        """
+        segments, error = YouTubeTranscriptFetcher.fetch_segments(video_id, languages)
+        if error:
+            return None, error
+        return serialize_segments(segments, transcript_format, timestamps), None
+
+    @staticmethod
+    async def _fetch_in_executor(video_id: str, languages: Sequence[str]) -> Tuple[Optional[Captions], Optional[str]]:
+        """Run the blocking fetch on the bounded pool, storing successes in the cache"""
+        loop = asyncio.get_running_loop()
+        try:
+            captions, error = await asyncio.wait_for(
+                loop.run_in_executor(_get_fetch_executor(), YouTubeTranscriptFetcher.fetch_captions, video_id, languages),
+                timeout=Config.TRANSCRIPT_FETCH_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out after {Config.TRANSCRIPT_FETCH_TIMEOUT}s fetching transcript for {video_id}")
+            return None, "Timed out fetching the transcript from YouTube. Please try again."
+
+        if captions is not None:
+            _cache_captions(video_id, captions)
+        return captions, error
+
+    @staticmethod
+    async def get_captions_async(video_id: str, languages: Optional[Sequence[str]] = None) -> Tuple[Optional[Captions], Optional[str]]:
+        """
+        Fetch the captions of a video without blocking the event loop.
+        Runs the fetch on the bounded fetch pool; the timeout covers both
+        time spent queued for a worker and the fetch itself.
+        When the video's track listing is cached, the track is picked from it
+        and served from the transcript cache if possible, so any language
+        preference that resolves to a cached track needs no YouTube request.
+        Concurrent requests for the same video and track share a single fetch.
+        Returns: (captions, error_message)
+        """
+        languages = list(languages or DEFAULT_LANGUAGES)
+        with observe_stage("transcript_fetch") as stage:
+            flight_key = f"{video_id}:{','.join(languages)}"
+            cache = get_transcript_cache()
+            cached_tracks = await cache.aget(_tracks_cache_key(video_id)) if cache is not None else None
+            if cached_tracks is not None:
+                tracks = _load_cached_tracks(cached_tracks)
+                track = pick_track(tracks, languages)
+                if track is None:
+                    stage.outcome = "error"
+                    return None, NO_TRANSCRIPT_ERROR
+                cached = await cache.aget(_segments_cache_key(video_id, track))
+                segments = _load_cached_segments(cached) if cached is not None else None
+                if segments is not None:
+                    logger.info(f"Transcript cache hit for {video_id} ({track.key})")
+                    stage.outcome = "cache_hit"
+                    return Captions(segments, track, tracks), None
+                flight_key = f"{video_id}:{track.key}"
+
+            captions, error = await transcript_flights.do(
+                flight_key,
+                lambda: YouTubeTranscriptFetcher._fetch_in_executor(video_id, languages)
+            )
+            if error:
+                stage.outcome = "error"
+                return None, error
+            return captions, None
+
+    @staticmethod
+    async def get_segments_async(video_id: str, languages: Optional[Sequence[str]] = None) -> Tuple[Optional[SegmentStore], Optional[str]]:
+        """
+        Fetch the segments of a video without blocking the event loop (see get_captions_async)
+        Returns: (segments, error_message)
+        """
+        captions, error = await YouTubeTranscriptFetcher.get_captions_async(video_id, languages)
+        return (captions.segments if captions else None), error
+
+    @staticmethod
+    async def get_transcript_async(video_id: str, transcript_format: str = DEFAULT_TRANSCRIPT_FORMAT,
+                                   timestamps: bool = False,
+                                   languages: Optional[Sequence[str]] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Fetch a transcript without blocking the event loop (see get_captions_async),
+        serialized in the requested format
+        Returns: (transcript_text, error_message)
+        """
+        segments, error = await YouTubeTranscriptFetcher.get_segments_async(video_id, languages)
+        if error:
+            return None, error
+        return serialize_segments(segments, transcript_format, timestamps), None